@@ -0,0 +1,118 @@
+from fnmatch import fnmatchcase
+
+from src.RSIRI.log import NPY_MAGIC, open_csv_log, open_log, read_npy_header
+
+
+def log_columns(file_name):
+    """ Column names of a binary or CSV log. """
+    with open(file_name, "rb") as log_file:
+        if log_file.read(len(NPY_MAGIC)) == NPY_MAGIC:
+            log_file.seek(0)
+            return [field[0] for field in read_npy_header(log_file)[0]]
+        log_file.seek(0)
+        return log_file.readline().decode("utf8").rstrip("\r\n").split(",")
+
+
+def select_columns(names, patterns):
+    """Column names matching any of the patterns, in log order.
+
+    :param names: Column names of a log
+    :param patterns: Names or shell style patterns, e.g. "RKorr.X", "RKorr.*" or "*.A1"
+    :return: list of column names
+    """
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    return [name for name in names if any(fnmatchcase(name, pattern) for pattern in patterns)]
+
+
+def load_log(file_name, columns=None, mmap=True):
+    """Loads a binary or CSV log into typed columns.
+
+    Binary logs are memory mapped by default, so only the columns used are read from disk.
+    :param file_name: Binary log (log.npy) or CSV log with a create_log header row
+    :param columns: Column names or patterns, see select_columns, all columns when None
+    :param mmap: Memory map binary logs
+    :return: dict of column name to array
+    """
+    names = log_columns(file_name)
+    if columns is not None:
+        names = select_columns(names, columns)
+        if "IPOC" not in names:
+            names.insert(0, "IPOC")
+    with open(file_name, "rb") as log_file:
+        binary = log_file.read(len(NPY_MAGIC)) == NPY_MAGIC
+    if binary:
+        return open_log(file_name, names, mmap)
+    return open_csv_log(file_name, names)
+
+
+def ipoc_gaps(ipoc, cycle_rate=4):
+    """Finds cycles missing from a log.
+
+    Uses NumPy when available, otherwise compares the IPOCs one by one.
+    :param ipoc: IPOC column
+    :param cycle_rate: RSI cycle rate in ms, the expected IPOC increment
+    :return: list of (index, ipoc, missing) tuples, missing cycles before the record at index
+    """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    if numpy is not None:
+        ipoc = numpy.asarray(ipoc, dtype=numpy.int64)
+        steps = numpy.diff(ipoc)
+        indices = numpy.flatnonzero(steps != cycle_rate) + 1
+        return [(int(i), int(ipoc[i]), int(steps[i - 1] // cycle_rate - 1)) for i in indices]
+    ipoc = [int(value) for value in ipoc]
+    return [(i, ipoc[i], (ipoc[i] - ipoc[i - 1]) // cycle_rate - 1)
+            for i in range(1, len(ipoc)) if ipoc[i] - ipoc[i - 1] != cycle_rate]
+
+
+def gap_statistics(ipoc, cycle_rate=4):
+    """ Counts of the logged, missing and out of order cycles of an IPOC column. """
+    gaps = ipoc_gaps(ipoc, cycle_rate)
+    return {"records": len(ipoc),
+            "gaps": sum(1 for gap in gaps if gap[2] > 0),
+            "missing": sum(gap[2] for gap in gaps if gap[2] > 0),
+            "out_of_order": sum(1 for gap in gaps if gap[2] < 0),
+            "longest_gap": max([gap[2] for gap in gaps] or [0])}
+
+
+def resample(columns, step=4, ipoc="IPOC"):
+    """Resamples logged columns onto a uniform IPOC grid.
+
+    Numeric columns are linearly interpolated, string columns take the last logged value.
+    Out of order records are dropped. Needs NumPy.
+    :param columns: dict of column name to array, as returned by load_log
+    :param step: Grid spacing in ms, the cycle rate fills the gaps and multiples of it downsample
+    :param ipoc: Name of the IPOC column
+    :return: dict of column name to array, the IPOC column holds the grid
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("Resampling needs NumPy") from None
+
+    times = np.asarray(columns[ipoc], dtype=np.int64)
+    if len(times) == 0:
+        return {name: np.asarray(values)[:0] for name, values in columns.items()}
+    # Keep the records whose IPOC increases
+    keep = np.concatenate(([True], times[1:] > np.maximum.accumulate(times)[:-1]))
+    times = times[keep]
+    grid = np.arange(times[0], times[-1] + 1, step, dtype=np.int64)
+    result = {ipoc: grid.astype(np.uint64)}
+    previous = np.searchsorted(times, grid, side="right") - 1
+    for name, values in columns.items():
+        if name == ipoc:
+            continue
+        values = np.asarray(values)[keep]
+        if values.dtype.kind in "fiu":
+            result[name] = np.interp(grid, times, values.astype(float))
+        else:
+            result[name] = values[previous]
+    return result
+
+
+if __name__ == '__main__':
+    pass
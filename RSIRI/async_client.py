@@ -0,0 +1,186 @@
+import asyncio
+
+from src.RSIRI.async_server import create_rsi_server
+from src.RSIRI.base_client import BaseRSIClient, JOINT_AXES, POSE_AXES
+
+
+class AsyncRSIClient(BaseRSIClient):
+    """asyncio RSI Client Object.
+
+    Runs the RSI server on the event loop of the caller instead of a separate process, every
+    telegram is answered from the datagram callback before other tasks run. Usable as an async
+    context manager, which starts, stops and closes the client.
+
+    Keyword arguments:
+    file - RSI config file or compiled RSIConfig
+    cycle_rate - RSI cycle rate in ms (default 4)
+    cache_dir - Directory caching compiled config files, see load_config (default None)
+    queue_size - Telegrams held for each async iterator, the oldest is dropped when full (default 250)
+    precision - Digits after the decimal point of sent numbers, see number_format (default None)
+    """
+
+    def __init__(self, file, cycle_rate=4, cache_dir=None, queue_size=250, precision=None):
+        super().__init__(file, cycle_rate, cache_dir, precision)
+        self.status = {"State": False, "Logging": False, "Error": ""}
+        self.queue_size = queue_size
+        self.transport = None
+        self.protocol = None
+        self.ipoc = 0
+        # Futures of next_cycle and queues of the telegram iterators
+        self.waiters = []
+        self.queues = []
+
+    async def __aenter__(self):
+        try:
+            await self.start()
+        except OSError:
+            self.close()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.shutdown()
+        self.close()
+
+    def __aiter__(self):
+        return self.telegrams()
+
+    async def start(self):
+        """
+        Start answering RSI messages on the running event loop
+        :return:
+        """
+        self.watchdog.reset()
+        self.transport, self.protocol = await create_rsi_server(self.config, self.send, self.receive, self.status,
+                                                                self.timing, None, self.trajectory, self.motion,
+                                                                self.commands, self.servo, self.telemetry,
+                                                                self.watchdog, self.cycle)
+        self.status["State"] = True
+
+    async def shutdown(self, timeout=None):
+        """
+        Ramp the corrections to zero, see Watchdog, then stop answering RSI messages
+        :param timeout: Seconds to wait for the ramp (default None, the watchdog stop time)
+        :return:
+        """
+        if self.transport is not None:
+            self.watchdog.request_stop()
+            end = asyncio.get_running_loop().time() + (self.watchdog.stop_time if timeout is None else timeout)
+            while not self.watchdog.finished and asyncio.get_running_loop().time() < end:
+                await asyncio.sleep(self.watchdog.cycle_rate / 1000)
+        self.stop()
+
+    def stop(self):
+        """
+        Stop answering RSI messages immediately, pending next_cycle calls are cancelled
+        :return:
+        """
+        self.status["State"] = False
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            waiter.cancel()
+
+    def cycle(self, server):
+        """ Called by RSIProtocol after each reply, wakes next_cycle callers and telegram iterators. """
+        self.ipoc = int(server.ipoc)
+        if not self.waiters and not self.queues:
+            return
+        values = self.receive.copy()
+        waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(values)
+        for queue in self.queues:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(values)
+
+    def next_cycle(self):
+        """
+        Wait for the next telegram
+        :return: Awaitable of the receive values dict of the telegram, after its reply was sent
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        return waiter
+
+    async def telegrams(self):
+        """
+        Async iterator over the receive values dict of every telegram
+        :return:
+        """
+        queue = asyncio.Queue(self.queue_size)
+        self.queues.append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.queues.remove(queue)
+
+    async def stream_trajectory(self, key, corrections, end=True, policy="hold", wait=True):
+        """Queue per cycle corrections, the server sends exactly one row per telegram.
+
+        Queues as many rows as there is room for each cycle, so trajectories longer than the queue
+        can be streamed without blocking the event loop.
+        :param key: Send variable the corrections are applied to, "RKorr" or "AKorr"
+        :param corrections: Sequence of rows, one value per attribute of key (e.g. X, Y, Z, A, B, C)
+        :param end: The trajectory ends with these rows, pass False to append more rows later
+        :param policy: When the queue runs empty before the end, "hold" repeats the last row, "zero" sends zeros
+        :param wait: Return once every row was sent instead of once every row was queued
+        :return: Number of rows queued
+        """
+        rows = list(corrections)
+        count = 0
+        while count < len(rows):
+            room = self.trajectory.capacity - self.trajectory.progress()["queued"]
+            if room <= 0:
+                await self.next_cycle()
+                continue
+            count += self.trajectory.push(key, rows[count:count + room], False, policy)
+        if end:
+            self.trajectory.push(key, [], True, policy)
+        while wait and self.trajectory.progress()["queued"] > 0:
+            await self.next_cycle()
+        return count
+
+    async def move(self, key, target, rate, acceleration=None, jerk=None, profile="trapezoidal"):
+        """Run a move to completion, see MotionBuffer.move.
+
+        :return: Progress of the finished move, see MotionBuffer.progress, or an error message
+        """
+        error = self.start_move(key, target, rate, acceleration, jerk, profile)
+        if error is not None:
+            return error
+        while True:
+            progress = self.motion.progress()
+            if progress["done"] or not progress["active"]:
+                return progress
+            await self.next_cycle()
+
+    async def move_basic_ptp(self, coord, rate, acceleration=None, jerk=None, profile="trapezoidal"):
+        """Move to a cartesian position, returns once the target is reached.
+
+        :param coord: Target X, Y, Z, A, B, C
+        :param rate: Largest correction per cycle
+        :param acceleration: Largest change of correction per cycle (default rate / 25)
+        :param jerk: Largest change of acceleration per cycle, s-curve profile only (default acceleration / 10)
+        :param profile: "trapezoidal" or "s-curve"
+        :return: Progress of the finished move
+        """
+        return await self.move("RKorr", dict(zip(POSE_AXES, coord)), rate, acceleration, jerk, profile)
+
+    async def move_joints(self, a1, a2, a3, a4, a5, a6, rate, acceleration=None, jerk=None, profile="trapezoidal"):
+        """Move to a joint position, returns once the target is reached.
+
+        See move_basic_ptp.
+        :return: Progress of the finished move
+        """
+        values = dict(zip(JOINT_AXES, (a1, a2, a3, a4, a5, a6)))
+        return await self.move("AKorr", values, rate, acceleration, jerk, profile)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+
+from src.RSIRI.server import RSIServer
+
+logger = logging.getLogger(__name__)
+
+
+class TransportNetwork:
+    """Network interface of an asyncio datagram transport, used by RSIServer in place of Network.
+
+    Keyword arguments:
+    transport - asyncio DatagramTransport, set by RSIProtocol once the endpoint is created (default None)
+    """
+
+    def __init__(self, transport=None):
+        self.transport = transport
+        self.controller_ip = None
+
+    def send(self, message):
+        """Send message to the address of the last received message.
+
+        Keyword arguments:
+        message - encoded message, str messages are encoded as utf8
+        """
+        if isinstance(message, str):
+            message = message.encode("utf8")
+        self.transport.sendto(message, self.controller_ip)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+class RSIProtocol(asyncio.DatagramProtocol):
+    """asyncio datagram protocol answering each RSI message as soon as it is received.
+
+    The reply is sent from datagram_received, before any other task of the event loop runs.
+
+    Keyword arguments:
+    server - RSIServer created with a TransportNetwork
+    callback - Called with the server after each reply (default None)
+    """
+
+    def __init__(self, server, callback=None):
+        self.server = server
+        self.callback = callback
+
+    def connection_made(self, transport):
+        self.server.network.transport = transport
+        if self.server.watchdog is not None:
+            self.server.watchdog.start()
+        logger.debug("RSI Server Waiting")
+
+    def datagram_received(self, data, addr):
+        server = self.server
+        server.network.controller_ip = addr
+        server.handle_robot_data(data)
+        server.send_reply()
+        # The stop ramp is done
+        if server.watchdog is not None and server.watchdog.finished:
+            server.network.close()
+        if self.callback is not None:
+            self.callback(server)
+
+    def connection_lost(self, exc):
+        if self.server.trace is not None:
+            self.server.trace.stop()
+
+    def error_received(self, exc):
+        logger.warning("RSI network error: %s", exc)
+
+
+async def create_rsi_server(config_file, receive, send, status, timing=None, log=None, trajectory=None, motion=None,
+                            commands=None, servo=None, telemetry=None, watchdog=None, callback=None,
+                            local_ip="0.0.0.0"):
+    """Create an RSI server endpoint on the running event loop.
+
+    Takes the RSIServer arguments, see RSIServer.
+    :param callback: Called with the server after each reply
+    :param local_ip: IP address of the local network socket, the port is taken from the config
+    :return: transport, RSIProtocol
+    """
+    server = RSIServer(config_file, receive, send, status, timing, log, trajectory, motion, commands, servo,
+                       telemetry, watchdog, TransportNetwork())
+    loop = asyncio.get_running_loop()
+    return await loop.create_datagram_endpoint(lambda: RSIProtocol(server, callback),
+                                               local_addr=(local_ip, server.config.port))
+
+
+if __name__ == '__main__':
+    pass
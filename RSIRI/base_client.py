@@ -0,0 +1,337 @@
+from src.RSIRI.commands import CommandBuffer
+from src.RSIRI.config import load_config
+from src.RSIRI.motion import MotionBuffer, MOVES
+from src.RSIRI.servo import ServoBuffer
+from src.RSIRI.state import SharedState
+from src.RSIRI.telemetry import TelemetryRing
+from src.RSIRI.timing import CycleTimer
+from src.RSIRI.trajectory import TrajectoryBuffer
+from src.RSIRI.watchdog import Watchdog
+
+# Attributes of the cartesian and joint move targets
+POSE_AXES = ("X", "Y", "Z", "A", "B", "C")
+JOINT_AXES = ("A1", "A2", "A3", "A4", "A5", "A6")
+
+
+class BaseRSIClient:
+    """Interface to the RSI variables shared by RSIClient and AsyncRSIClient.
+
+    Compiles the config and creates the shared memory blocks read by the RSI server. How the
+    server is run, in its own process or on an event loop, is left to the subclass.
+
+    Keyword arguments:
+    file - RSI config file or compiled RSIConfig
+    cycle_rate - RSI cycle rate in ms (default 4)
+    cache_dir - Directory caching compiled config files, see load_config (default None)
+    precision - Digits after the decimal point of sent numbers, see number_format (default None)
+    """
+
+    def __init__(self, file, cycle_rate=4, cache_dir=None, precision=None):
+        self.file = file
+        self.config = load_config(file, cache_dir, precision)
+        self.ip, self.port, self.sen_type, self.only_send = \
+            self.config.ip, self.config.port, self.config.sen_type, self.config.only_send
+        # Send and receive values are shared through fixed layout shared memory blocks
+        self.send = SharedState(self.config.send_values)
+        self.receive = SharedState(self.config.receive_values)
+        self.timing = CycleTimer(cycle_rate)
+        self.trajectory = TrajectoryBuffer(self.send.layout)
+        self.motion = MotionBuffer(self.send.layout, self.receive.layout)
+        self.commands = CommandBuffer(self.send.layout)
+        self.servo = ServoBuffer(self.send.layout, self.receive.layout)
+        self.telemetry = TelemetryRing(self.send.layout, self.receive.layout)
+        self.watchdog = Watchdog(self.send.layout, cycle_rate)
+
+    def close(self):
+        """
+        Release the shared memory blocks, the client can not be used afterwards
+        :return:
+        """
+        self.send.close(unlink=True)
+        self.receive.close(unlink=True)
+        self.timing.close(unlink=True)
+        self.trajectory.close(unlink=True)
+        self.motion.close(unlink=True)
+        self.commands.close(unlink=True)
+        self.servo.close(unlink=True)
+        self.telemetry.close(unlink=True)
+        self.watchdog.close(unlink=True)
+
+    def display_variables(self):
+        """
+        :return:
+        """
+        print("Receive Variables")
+        for key, value in self.receive.items():
+            print(key, ' : ', value)
+
+        print("Send Variables")
+        for key, value in self.send.items():
+            print(key, ' : ', value)
+
+    def cycle_statistics(self):
+        """
+        Timing statistics of the last RSI cycles, see CycleTimer.statistics
+        :return: dict of counters, phase durations and reply latency histogram
+        """
+        return self.timing.statistics()
+
+    def check_receive_value(self, key):
+        try:
+            return self.receive[key]
+        except KeyError:
+            return "Key does not exist"
+
+    def check_send_value(self, key):
+        try:
+            return self.send[key]
+        except KeyError:
+            return "Key does not exist"
+
+    def update_pendant(self, value):
+        try:
+            self.send["EStr"] = value
+        except KeyError:
+            return "EStr internal variable not present in config file"
+
+    def set_value(self, key, value):
+        """
+        :param key:
+        :param value: Multi value variables take a dict of attribute to value, see set_values
+        :return:
+        """
+        if isinstance(value, dict):
+            return self.set_values(key, value)
+        try:
+            self.send[key] = value
+        except KeyError:
+            return "{} not present in config file".format(key)
+
+    def set_values(self, key, values):
+        """Sets several attributes of a multi value variable, sent together in the same telegram.
+
+        The values are written as one consistent update of the send values and sent every cycle
+        until they are changed. Use send_once for values sent in a single telegram.
+        :param key: Multi value send variable, e.g. "RKorr"
+        :param values: dict of attribute to value
+        :return:
+        """
+        try:
+            self.send[key] = values
+        except KeyError:
+            return "{} is not present in config file".format(key)
+        return "OK"
+
+    def set_value_attribute(self, key, axis, value):
+        """Sets the value of a multi value variable.
+
+        :param key:
+        :param axis:
+        :param value:
+        :return:
+        """
+        return self.set_values(key, {axis: value})
+
+    def send_once(self, key, values, ipoc=0):
+        """Sends attributes of a multi value variable in a single telegram.
+
+        The values are queued as one batch of commands the RSI process applies to one telegram,
+        the send values are sent again afterwards, see CommandBuffer.
+        :param key: Multi value send variable, e.g. "RKorr"
+        :param values: dict of attribute to value
+        :param ipoc: IPOC of the telegram sending the values (default 0, the next telegram)
+        :return:
+        """
+        try:
+            self.commands.push(key, values, ipoc)
+        except KeyError:
+            return "{} is not present in config file".format(key)
+        except (TimeoutError, ValueError) as error:
+            return str(error)
+        return "OK"
+
+    def set_axis(self, axis, value):
+        """
+
+        :param axis:
+        :param value:
+        :return:
+        """
+        return self.set_value_attribute("RKorr", axis, value)
+
+    def set_joint(self, joint, value):
+        """
+
+        :param joint:
+        :param value:
+        :return:
+        """
+        return self.set_value_attribute("AKorr", joint, value)
+
+    def check_send_values(self, key):
+        """
+
+        :param key:
+        :return:
+        """
+        return self.send[key]
+
+    def check_receive_values(self, key):
+        """
+
+        :param key:
+        :return:
+        """
+        return self.receive[key]
+
+    def test(self, key, value):
+        """
+
+        :param key:
+        :param value:
+        :return:
+        """
+        try:
+            self.send[key] = value
+        except KeyError:
+            return "{} not present in config file".format(key)
+
+    def command_progress(self):
+        """
+        Commands queued and applied, see CommandBuffer.progress
+        :return:
+        """
+        return self.commands.progress()
+
+    def trajectory_progress(self):
+        """
+        Progress of the streamed trajectory, see TrajectoryBuffer.progress
+        :return: dict of queued, applied and underrun counts and the done flag
+        """
+        return self.trajectory.progress()
+
+    def stop_trajectory(self):
+        """
+        Stop the streamed trajectory, the send values are used again from the next telegram
+        :return:
+        """
+        self.trajectory.stop()
+
+    def start_move(self, key, target, rate, acceleration=None, jerk=None, profile="trapezoidal"):
+        """Start a move, see MotionBuffer.move.
+
+        :return: Error message when key or its measured variable is not present in config file, or the
+                 limits are not positive
+        """
+        if key not in self.motion.keys:
+            return "{} and {} are not present in config file".format(key, MOVES.get(key, "its measured value"))
+        try:
+            self.motion.move(key, target, rate, acceleration, jerk, profile)
+        except ValueError as error:
+            return str(error)
+
+    def motion_progress(self):
+        """
+        Progress of the move, see MotionBuffer.progress
+        :return: dict with the done flag and remaining distance of each axis
+        """
+        return self.motion.progress()
+
+    def stop_motion(self):
+        """
+        Stop the move, the send values are used again from the next telegram
+        :return:
+        """
+        self.motion.stop()
+
+    def servo_twist(self, twist, linear=1.0, angular=0.1, joint=0.1, timeout=25):
+        """Servo the robot along a cartesian twist, computed in the RSI process every cycle.
+
+        Call again with every new sensor value, the twist is applied for timeout cycles. The joint
+        corrections are solved from the measured AIPos and sent as AKorr, see ServoBuffer.
+        :param twist: X, Y, Z in mm and A, B, C in degrees per cycle, in the base frame, A, B, C are
+                      rotations about Z, Y and X as in RIst
+        :param linear: Largest cartesian correction in mm per cycle
+        :param angular: Largest rotation in degrees per cycle
+        :param joint: Largest joint correction in degrees per cycle
+        :param timeout: Cycles the twist is applied without a new one
+        :return:
+        """
+        try:
+            self.servo.write("twist", twist, linear=linear, angular=angular, joint=joint, timeout=timeout)
+        except (ImportError, ValueError) as error:
+            return str(error)
+
+    def servo_pose(self, pose, gain=0.1, linear=1.0, angular=0.1, joint=0.1):
+        """Servo the robot onto a cartesian pose, see servo_twist.
+
+        :param pose: X, Y, Z, A, B, C as RIst
+        :param gain: Fraction of the pose error corrected per cycle
+        :param linear: Largest cartesian correction in mm per cycle
+        :param angular: Largest rotation in degrees per cycle
+        :param joint: Largest joint correction in degrees per cycle
+        :return:
+        """
+        try:
+            self.servo.write("pose", pose, gain, linear, angular, joint)
+        except (ImportError, ValueError) as error:
+            return str(error)
+
+    def servo_progress(self):
+        """
+        Servo counters, solve time and remaining pose error, see ServoBuffer.progress
+        :return:
+        """
+        return self.servo.progress()
+
+    def stop_servo(self):
+        """
+        Stop servoing, the send values are used again from the next telegram
+        :return:
+        """
+        self.servo.stop()
+
+    def subscribe(self, latest=True):
+        """
+        Reader of the values of every cycle, see TelemetrySubscriber
+        :param latest: Start at the next cycle, False starts at the oldest cycle held
+        :return: TelemetrySubscriber, can be passed to other processes with the client's telemetry ring
+        """
+        return self.telemetry.subscribe(latest)
+
+    def heartbeat(self):
+        """
+        Tell the watchdog the client is alive, after the first heartbeat a client missing the stall
+        cycles ramps the corrections to zero, see Watchdog
+        :return:
+        """
+        self.watchdog.send_heartbeat()
+
+    def configure_watchdog(self, ramp=None, stall=None, gap=None, timeout=None):
+        """
+        Change the watchdog settings, None keeps a setting
+        :param ramp: Cycles over which corrections are ramped to zero
+        :param stall: Cycles without heartbeat counted as a client stall
+        :param gap: Missing cycles between two telegrams tolerated, -1 only counts gaps
+        :param timeout: Seconds without a telegram after which the stop request is checked
+        :return:
+        """
+        self.watchdog.configure(ramp, stall, gap, timeout)
+
+    def reset_watchdog(self):
+        """
+        Clear a watchdog fault, the live corrections are sent again
+        :return:
+        """
+        self.watchdog.reset()
+
+    def watchdog_status(self):
+        """
+        State of the watchdog, see Watchdog.status
+        :return:
+        """
+        return self.watchdog.status()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,588 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from itertools import cycle
+from time import perf_counter_ns, strftime
+from timeit import repeat
+
+from src.RSIRI.codec import check_codecs, codecs
+from src.RSIRI.commands import CommandBuffer, APPLIED, WRITTEN as COMMANDS_WRITTEN
+from src.RSIRI.config import load_config
+from src.RSIRI.decoder import ReceiveDecoder
+from src.RSIRI.log import create_log, LogBuffer, READ, WRITTEN
+from src.RSIRI.network import Network
+from src.RSIRI.server import log_format
+from src.RSIRI.state import SharedState, type_values
+from src.RSIRI.telemetry import TelemetryRing
+from src.RSIRI.template import DeltaRenderer, SendTemplate
+from src.RSIRI.timing import summarise
+from src.RSIRI.tracing import TelegramTrace, SENT
+from src.RSIRI.tools import \
+    add_ipoc, \
+    convert_config_to_xml_string, \
+    convert_rsi_config_to_dict, \
+    convert_xml_string_to_dict, \
+    get_ipoc, \
+    merge_dict_with_xml_string, \
+    update_ipoc
+
+# Synthetic configs from no Tech channels to all Tech.C*/Tech.T* channels
+TECH_CHANNELS = (0, 1, 2, 3, 4, 5, 6)
+
+config_header = """<ROOT>
+  <CONFIG>
+    <IP_NUMBER>127.0.0.1</IP_NUMBER>
+    <PORT>{port}</PORT>
+    <SENTYPE>ImFree</SENTYPE>
+    <ONLYSEND>FALSE</ONLYSEND>
+  </CONFIG>
+"""
+element = '      <ELEMENT TAG="{}" TYPE="{}" INDX="{}" HOLDON="1" />\n'
+
+
+def create_config(location, tech_channels=0, port=49152):
+    """Writes a synthetic RSI_EthernetConfig file.
+
+    :param location: Directory the config file is written to
+    :param tech_channels: Number of Tech.C*/Tech.T* channel groups (0 - 6) in each direction
+    :param port: Port used in the config file
+    :return: Path of the config file
+    """
+    send = ["DEF_RIst", "DEF_AIPos", "DEF_Delay"]
+    send += ["DEF_Tech.C{}".format(c) for c in range(1, tech_channels + 1)]
+    receive = ["DEF_EStr"]
+    receive += ["RKorr.{}".format(a) for a in ("X", "Y", "Z", "A", "B", "C")]
+    receive += ["AKorr.A{}".format(a) for a in range(1, 7)]
+    receive += ["Tech.T{}{}".format(c, t) for c in range(1, tech_channels + 1) for t in range(1, 11)]
+
+    config = config_header.format(port=port)
+    for name, items in (("SEND", send), ("RECEIVE", receive)):
+        config += "  <{}>\n    <ELEMENTS>\n".format(name)
+        for i, tag in enumerate(items):
+            if tag.startswith("DEF_"):
+                config += element.format(tag, "DOUBLE", "INTERNAL")
+            else:
+                config += element.format(tag, "DOUBLE", i + 1)
+        config += "    </ELEMENTS>\n  </{}>\n".format(name)
+    config += "</ROOT>\n"
+
+    file = os.path.join(location, "RSI_EthernetConfig_{}.xml".format(tech_channels))
+    with open(file, "w") as config_file:
+        config_file.write(config)
+    return file
+
+
+def time_per_cycle(function, cycles=2000):
+    """ Best of five runs, in microseconds per call. """
+    return min(repeat(function, number=cycles, repeat=5)) / cycles * 1e6
+
+
+def benchmark_send(file):
+    """Per cycle cost of creating the send message.
+
+    Compares merge_dict_with_xml_string and update_ipoc with the precompiled SendTemplate, and
+    rendering a SharedState snapshot through to_dict with DeltaRenderer, once with unchanged values
+    and once with one value changing every cycle.
+    """
+    send_string = convert_config_to_xml_string(file, "send")
+    values = convert_rsi_config_to_dict(file, "send")
+    for key, value in values.items():
+        if isinstance(value, dict):
+            for a in value:
+                value[a] = "0.0125"
+    template = SendTemplate(send_string)
+
+    def lxml_path():
+        update_ipoc(merge_dict_with_xml_string(values, send_string), "123456")
+
+    def template_path():
+        template.render(values, "123456")
+
+    state = SharedState(values)
+    snapshot = state.snapshot()
+    changed = list(snapshot)
+    changed[-1] = 0.025
+    snapshots = cycle([snapshot, tuple(changed)])
+    renderer = DeltaRenderer(template, state.layout)
+
+    def snapshot_path():
+        template.render(state.to_dict(snapshot), "123456").encode("utf8")
+
+    def delta_path():
+        renderer.render(snapshot, "123456")
+
+    def delta_changed_path():
+        renderer.render(next(snapshots), "123456")
+
+    try:
+        return {"lxml": time_per_cycle(lxml_path), "template": time_per_cycle(template_path),
+                "snapshot_template": time_per_cycle(snapshot_path), "delta": time_per_cycle(delta_path),
+                "delta_changed": time_per_cycle(delta_changed_path)}
+    finally:
+        state.close(unlink=True)
+
+
+def benchmark_receive(file):
+    """Per cycle cost of decoding a robot telegram.
+
+    Compares get_ipoc and convert_xml_string_to_dict with the single pass ReceiveDecoder.
+    """
+    receive_string = convert_config_to_xml_string(file, "receive")
+    message = bytes(update_ipoc(add_ipoc(receive_string), 123456), "utf8")
+    decoder = ReceiveDecoder(receive_string)
+
+    def lxml_path():
+        get_ipoc(message)
+        convert_xml_string_to_dict(message)
+
+    def decoder_path():
+        decoder.decode(message)
+
+    return {"lxml": time_per_cycle(lxml_path), "decoder": time_per_cycle(decoder_path)}
+
+
+def benchmark_codec(file):
+    """Per cycle cost of each registered codec.
+
+    Encodes the send values and decodes a robot telegram through every backend, the
+    conformance mismatches of each backend are returned under "mismatches".
+    """
+    config = load_config(file)
+    values = type_values(sample_values(file, "send"))
+    message = bytes(update_ipoc(add_ipoc(config.receive_string), 123456), "utf8")
+    results = {}
+    for name, codec in codecs.items():
+        backend = codec(config.send_string, config.receive_string, config.precision)
+        results["{}_encode".format(name)] = time_per_cycle(lambda: backend.encode(values, 123456))
+        results["{}_decode".format(name)] = time_per_cycle(lambda: backend.decode(message))
+    results["mismatches"] = {name: len(mismatches) for name, mismatches in check_codecs(config).items()}
+    return results
+
+
+def benchmark_network(file):
+    """Per cycle cost of a loopback exchange with the echo server.
+
+    The echo server sends the robot telegram and receives the reply. The RSI side uses either
+    recvfrom with a str reply encoded on send, or Network with recvfrom_into and a pre-encoded reply.
+    """
+    from src.RSIRI.echo_server import RSIEchoServer
+
+    config = load_config(file)
+    echo = RSIEchoServer(config, 4)
+    network = Network("", config.port, size=config.receive_size)
+    telegram = echo.send_string.encode("utf8")
+    reply = config.send_string
+    encoded = reply.encode("utf8")
+    udp_socket = network.udp_socket
+
+    def recvfrom_path():
+        echo.network.send(telegram)
+        data, network.controller_ip = udp_socket.recvfrom(config.receive_size)
+        udp_socket.sendto(bytes(reply, "utf8"), network.controller_ip)
+        echo.network.receive()
+
+    def recvfrom_into_path():
+        echo.network.send(telegram)
+        network.receive()
+        network.send(encoded)
+        echo.network.receive()
+
+    try:
+        return {"recvfrom": time_per_cycle(recvfrom_path), "recvfrom_into": time_per_cycle(recvfrom_into_path)}
+    finally:
+        network.close()
+        echo.network.close()
+
+
+def benchmark_trace(file):
+    """Per cycle cost of debug logging a sent telegram.
+
+    Compares a TelegramTrace record, logging in the loop to a handler writing to the null device
+    and the None check of a disabled trace.
+    """
+    config = load_config(file)
+    telegram = config.codec.encode(sample_values(file, "send"), 123456)
+    logger = logging.getLogger("benchmark.trace")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    trace = TelegramTrace(logger, config.send_size)
+    disabled = None
+
+    def disabled_path():
+        if disabled is not None:
+            disabled.record(SENT, 123456, telegram)
+
+    with open(os.devnull, "w") as null:
+        handler = logging.StreamHandler(null)
+        handler.setFormatter(logging.Formatter(log_format))
+        logger.addHandler(handler)
+        try:
+            return {"disabled": time_per_cycle(disabled_path),
+                    "record": time_per_cycle(lambda: trace.record(SENT, 123456, telegram)),
+                    "log": time_per_cycle(lambda: logger.debug("Send: %s", telegram.decode("utf8")))}
+        finally:
+            logger.removeHandler(handler)
+
+
+def sample_values(file, direction):
+    """ Values dict of a direction with every number set, as the RSI process holds them. """
+    values = convert_rsi_config_to_dict(file, direction)
+    for key, value in values.items():
+        if isinstance(value, dict):
+            for a in value:
+                value[a] = "0.0125"
+    values["IPOC"] = "123456"
+    return values
+
+
+def benchmark_tools(file):
+    """ Per call cost of each tools.py function on the hot path. """
+    send_string = convert_config_to_xml_string(file, "send")
+    send_values = sample_values(file, "send")
+    merged = merge_dict_with_xml_string(send_values, send_string)
+    message = bytes(update_ipoc(add_ipoc(convert_config_to_xml_string(file, "receive")), 123456), "utf8")
+    return {"convert_xml_string_to_dict": time_per_cycle(lambda: convert_xml_string_to_dict(message)),
+            "get_ipoc": time_per_cycle(lambda: get_ipoc(message)),
+            "merge_dict_with_xml_string": time_per_cycle(lambda: merge_dict_with_xml_string(send_values, send_string)),
+            "update_ipoc": time_per_cycle(lambda: update_ipoc(merged, "123457"))}
+
+
+def benchmark_state(file):
+    """Per cycle cost of sharing the received values between processes.
+
+    Compares updating and copying a Manager dict with SharedState, updated with str values and
+    with the typed values ReceiveDecoder returns, and pushing a correction command.
+    """
+    from multiprocessing import Manager
+
+    values = sample_values(file, "receive")
+    typed = type_values(values)
+    manager = Manager()
+    state = SharedState(values)
+    commands = CommandBuffer(state.layout)
+    key = next((tag for tag, attributes in state.layout if attributes), None)
+    correction = {a: 0.1 for a in dict(state.layout).get(key) or ()}
+
+    def command_path():
+        commands.push(key, correction)
+        # Drained as the RSI process would
+        commands.values[APPLIED] = commands.values[COMMANDS_WRITTEN]
+
+    try:
+        shared = manager.dict(values)
+        results = {"manager_update": time_per_cycle(lambda: shared.update(values), 200),
+                   "manager_copy": time_per_cycle(shared.copy, 200),
+                   "shared_state_update": time_per_cycle(lambda: state.update(values)),
+                   "shared_state_update_typed": time_per_cycle(lambda: state.update(typed)),
+                   "shared_state_copy": time_per_cycle(state.copy)}
+        if key is not None:
+            results["command_push"] = time_per_cycle(command_path)
+        return results
+    finally:
+        state.close(unlink=True)
+        commands.close(unlink=True)
+        manager.shutdown()
+
+
+def benchmark_log(file):
+    """ Per cycle cost of logging: a create_log CSV row against a LogBuffer record and a telemetry record. """
+    send_values = sample_values(file, "send")
+    receive_values = sample_values(file, "receive")
+    send = SharedState(send_values)
+    receive = SharedState(receive_values)
+    log = LogBuffer(send.layout, receive.layout)
+    telemetry = TelemetryRing(send.layout, receive.layout)
+    send_snapshot = send.snapshot()
+    receive_snapshot = receive.snapshot()
+
+    def log_buffer_path():
+        log.write(send_snapshot, receive_snapshot)
+        # Drained as the log process would
+        log.values[READ] = log.values[WRITTEN]
+
+    try:
+        return {"create_log": time_per_cycle(lambda: create_log(send_values, receive_values, "row")),
+                "log_buffer": time_per_cycle(log_buffer_path),
+                "telemetry_publish": time_per_cycle(lambda: telemetry.publish(send_snapshot, receive_snapshot))}
+    finally:
+        for shared in (send, receive, log, telemetry):
+            shared.close(unlink=True)
+
+
+def benchmark_round_trip(file, cycles=2000):
+    """Loopback round trip latency of the RSI process, driven by the echo server.
+
+    Starts an RSIClient, the echo server sends robot telegrams with increasing IPOC and waits
+    for each reply. Returns the round trip summary in microseconds, the reply latency measured by
+    the RSI process (server_p50, server_p99) and the number of telegrams without reply.
+    """
+    from src.RSIRI.client import RSIClient
+    from src.RSIRI.echo_server import RSIEchoServer
+
+    config = load_config(file)
+    client = RSIClient(config)
+    echo = RSIEchoServer(config, 4)
+    echo.network.udp_socket.settimeout(0.1)
+    prefix, suffix = echo.send_string.split("<IPOC>0</IPOC>")
+    telegrams = [(prefix + "<IPOC>{}</IPOC>".format(4 * n) + suffix).encode("utf8") for n in range(1, cycles + 1)]
+    client.start()
+    try:
+        # Wait for the RSI process to bind its socket
+        for _ in range(50):
+            echo.network.send(telegrams[0])
+            try:
+                echo.network.receive()
+                break
+            except TimeoutError:
+                continue
+        latencies = []
+        lost = 0
+        for telegram in telegrams:
+            start = perf_counter_ns()
+            echo.network.send(telegram)
+            try:
+                echo.network.receive()
+            except TimeoutError:
+                lost += 1
+                continue
+            latencies.append(perf_counter_ns() - start)
+        results = summarise(latencies)
+        server = client.cycle_statistics()["total"]
+        results.update({"server_p50": server["p50"], "server_p99": server["p99"], "lost": lost})
+        return results
+    finally:
+        client.stop()
+        client.manager.shutdown()
+        client.close()
+        echo.network.close()
+
+
+def benchmark_servo(file):
+    """ Per cycle cost of the servo solve of the RSI process, needs PyKDL. """
+    from src.RSIRI.servo import PyKDL, ServoBuffer
+
+    if PyKDL is None:
+        raise ImportError("Servoing needs PyKDL")
+    send = SharedState(sample_values(file, "send"))
+    receive = SharedState(sample_values(file, "receive"))
+    servo = ServoBuffer(send.layout, receive.layout)
+    snapshot = send.snapshot()
+    try:
+        servo.write("twist", [0.1, 0, 0, 0, 0, 0], timeout=10 ** 9)
+        twist = time_per_cycle(lambda: servo.apply(snapshot, receive))
+        servo.write("pose", [600, 0, 900, 0, 90, 0])
+        pose = time_per_cycle(lambda: servo.apply(snapshot, receive))
+        return {"twist": twist, "pose": pose}
+    finally:
+        servo.close(unlink=True)
+        send.close(unlink=True)
+        receive.close(unlink=True)
+
+
+def benchmark_kinematics(count=1000):
+    """Per waypoint cost of PyKDL fk against fk_batch and of warm started ik_batch.
+
+    Also returns the largest difference between the PyKDL and NumPy forward kinematics.
+    """
+    import numpy as np
+    from src.RSIRI.robots import fk, fk_batch, ik_batch, jntarray, frame_to_matrix
+
+    # Smooth joint trajectory within the joint limits
+    q = np.linspace([0.1, -1.2, 1.0, 0.1, 0.5, 0.1], [0.9, -0.6, 1.6, 0.8, 1.0, 0.9], count)
+    frames = fk_batch(q)
+    difference = max(np.abs(frame_to_matrix(fk(jntarray(q[n]))) - frames[n]).max() for n in range(count))
+
+    def pykdl_fk():
+        for n in range(count):
+            fk(jntarray(q[n]))
+
+    return {"fk": time_per_cycle(pykdl_fk, 1) / count,
+            "fk_batch": time_per_cycle(lambda: fk_batch(q), 1) / count,
+            "ik_batch": time_per_cycle(lambda: ik_batch(frames, q[0]), 1) / count,
+            "difference": difference}
+
+
+def benchmark_motion():
+    """Per cycle cost of ProfileGenerator.update for 6 axes and cycles to reach the target, per profile."""
+    from src.RSIRI.motion import ProfileGenerator
+
+    results = {}
+    for profile in ("trapezoidal", "s-curve"):
+        generator = ProfileGenerator()
+        generator.count = 6
+        generator.s_curve = profile == "s-curve"
+        for i in range(6):
+            generator.target[i] = 100.0 * (i + 1)
+            generator.velocity_limit[i] = 0.5
+            generator.acceleration_limit[i] = 0.02
+            generator.jerk_limit[i] = 0.002
+        generator.start([0.0] * 6)
+        cycles = 1
+        while not generator.update():
+            cycles += 1
+
+        def move():
+            generator.start([0.0] * 6)
+            for _ in range(cycles):
+                generator.update()
+
+        results[profile] = {"update": time_per_cycle(move, 1) / cycles, "cycles": cycles}
+    return results
+
+
+def benchmark_import(modules=("config", "client", "server", "simulator", "robots"), repeats=5):
+    """Import time of modules in a fresh interpreter, best of repeats less the start up of the interpreter.
+
+    Modules that can not be imported, robots.py without NumPy, are skipped.
+    """
+    package = __package__ or "src.RSIRI"
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+
+    def start_up(statement):
+        times = []
+        for _ in range(repeats):
+            start = perf_counter_ns()
+            completed = subprocess.run([sys.executable, "-c", statement], env=environment, capture_output=True)
+            times.append((perf_counter_ns() - start) / 1000)
+            if completed.returncode:
+                return None
+        return min(times)
+
+    baseline = start_up("pass")
+    results = {}
+    for module in modules:
+        elapsed = start_up("import {}.{}".format(package, module))
+        if elapsed is not None:
+            results[module] = elapsed - baseline
+    return results
+
+
+def environment():
+    """ Python, platform and commit the results were measured with. """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count(),
+            "commit": commit, "date": strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def run_suite(channels=TECH_CHANNELS, round_trip=True):
+    """Runs every benchmark.
+
+    :param channels: Tech channel counts of the synthetic configs
+    :param round_trip: Include the loopback round trip through an RSI process
+    :return: dict with the environment (meta), timings in microseconds by benchmark, case and metric
+             (benchmarks) and values that are not timings (checks)
+    """
+    results = {"meta": environment(), "benchmarks": {}, "checks": {}}
+    benchmarks = results["benchmarks"]
+    checks = results["checks"]
+    pipeline = (("tools", benchmark_tools), ("send", benchmark_send), ("receive", benchmark_receive),
+                ("codec", benchmark_codec), ("state", benchmark_state), ("log", benchmark_log),
+                ("network", benchmark_network), ("trace", benchmark_trace))
+    with tempfile.TemporaryDirectory() as directory:
+        for count in channels:
+            file = create_config(directory, count)
+            case = "tech_{}".format(count)
+            for name, function in pipeline:
+                benchmarks.setdefault(name, {})[case] = function(file)
+            checks.setdefault("codec_mismatches", {})[case] = benchmarks["codec"][case].pop("mismatches")
+            if round_trip:
+                trip = benchmark_round_trip(file)
+                checks.setdefault("round_trip_lost", {})[case] = trip.pop("lost")
+                benchmarks.setdefault("round_trip", {})[case] = trip
+
+    motion = benchmark_motion()
+    for profile, result in motion.items():
+        checks.setdefault("motion_cycles", {})[profile] = result.pop("cycles")
+    benchmarks["motion"] = motion
+    benchmarks["import"] = {"fresh_process": benchmark_import()}
+    try:
+        kinematics = benchmark_kinematics()
+        checks["fk_difference"] = kinematics.pop("difference")
+        benchmarks["kinematics"] = {"per_waypoint": kinematics}
+        with tempfile.TemporaryDirectory() as directory:
+            benchmarks["servo"] = {"tech_0": benchmark_servo(create_config(directory))}
+    except ImportError as error:
+        checks["kinematics"] = "skipped: {}".format(error)
+    return results
+
+
+def save_results(results, file):
+    with open(file, "w") as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+
+
+def load_results(file):
+    with open(file) as results_file:
+        return json.load(results_file)
+
+
+def compare_results(old, new, threshold=0.1):
+    """Compares the timings of two runs.
+
+    :param old: Results of the baseline run
+    :param new: Results of the run being checked
+    :param threshold: Relative slow down counted as a regression
+    :return: list of (benchmark, case, metric, old, new, ratio, regression) for timings present in both
+    """
+    rows = []
+    for name, cases in new["benchmarks"].items():
+        for case, metrics in cases.items():
+            for metric, value in metrics.items():
+                baseline = old["benchmarks"].get(name, {}).get(case, {}).get(metric)
+                if not baseline or not value:
+                    continue
+                ratio = value / baseline
+                rows.append((name, case, metric, baseline, value, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def print_suite(results):
+    meta = results["meta"]
+    print("Python {python} ({implementation}) on {platform}, commit {commit}".format(**meta))
+    for name, cases in results["benchmarks"].items():
+        print("\n{} (us)".format(name))
+        for case, metrics in cases.items():
+            print("  {:<12} {}".format(case, ", ".join("{} {:.2f}".format(m, v) for m, v in metrics.items())))
+    print("\nchecks")
+    for name, value in results["checks"].items():
+        print("  {:<16} {}".format(name, value))
+
+
+def print_comparison(rows):
+    print("\n{:<10} {:<12} {:<28} {:>10} {:>10} {:>7}".format("benchmark", "case", "metric", "old (us)", "new (us)",
+                                                              "ratio"))
+    for name, case, metric, old, new, ratio, regression in rows:
+        print("{:<10} {:<12} {:<28} {:>10.2f} {:>10.2f} {:>6.2f}x{}".format(name, case, metric, old, new, ratio,
+                                                                          "  REGRESSION" if regression else ""))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks of the RSI cycle pipeline")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", help="Compare with results written earlier by --json")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slow down reported as a regression")
+    parser.add_argument("--channels", type=int, nargs="+", default=TECH_CHANNELS, help="Tech channel counts")
+    parser.add_argument("--no-round-trip", action="store_true", help="Skip the round trip through an RSI process")
+    args = parser.parse_args()
+
+    suite = run_suite(args.channels, not args.no_round_trip)
+    print_suite(suite)
+    if args.json:
+        save_results(suite, args.json)
+    # Codecs that do not produce the reference telegrams fail the run
+    failed = any(any(counts.values()) for counts in suite["checks"]["codec_mismatches"].values())
+    if args.compare:
+        comparison = compare_results(load_results(args.compare), suite, args.threshold)
+        print_comparison(comparison)
+        failed = failed or any(row[-1] for row in comparison)
+    sys.exit(1 if failed else 0)
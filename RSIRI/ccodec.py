@@ -0,0 +1,184 @@
+from operator import itemgetter
+
+from src.RSIRI._ccodec import ffi, lib
+from src.RSIRI.ccodec_build import IPOC, NUMBER, TEXT
+from src.RSIRI.decoder import ReceiveDecoder
+from src.RSIRI.state import from_slot
+from src.RSIRI.template import SendTemplate, escape_attribute
+
+# Initial size of the message buffer, doubled whenever a message does not fit
+_BUFFER_SIZE = 4096
+
+
+class CompiledTemplate:
+    """SendTemplate rendered by the compiled rsi_render of ccodec_build.py.
+
+    The literal fragments of the template are copied into C arrays once, each render only passes
+    the numbers, the escaped strings and the IPOC. Numbers are formatted in C, producing the same
+    bytes as SendTemplate.render, the digits of unchanged numbers are reused.
+
+    Keyword arguments:
+    template - SendTemplate of the send message
+    """
+
+    def __init__(self, template):
+        parts = [part.encode("utf8") for part in template.parts]
+        # Parts alternate literal fragments and slots, slot i is part 2 * i + 1
+        self.slots = len(parts) // 2
+        literals = parts[0::2]
+        bounds = [0]
+        for literal in literals:
+            bounds.append(bounds[-1] + len(literal))
+        self.literals = ffi.new("char[]", b"".join(literals))
+        self.bounds = ffi.new("size_t[]", bounds)
+        self.kinds = ffi.new("unsigned char[]", self.slots)
+        for tag, position, text in template.text_fields:
+            self.kinds[position // 2] = TEXT
+        self.kinds[template.ipoc_position // 2] = IPOC
+        self.numbers = ffi.new("double[]", self.slots)
+        self.formatted = ffi.new("rsi_number[]", self.slots)
+        self.text_bounds = ffi.new("size_t[]", 2 * self.slots)
+        # Attribute slots holding a str and the texts of the previous render, the bounds of the
+        # texts are only updated when another dict is passed
+        self.attribute_texts = ()
+        self.texts = None
+        self.joined = b""
+        self.precision = -1 if template.precision is None else int(template.precision)
+        self.size = _BUFFER_SIZE
+        self.out = ffi.new("char[]", self.size)
+
+    def render(self, numbers, texts, ipoc, attribute_texts=()):
+        """Encoded send message.
+
+        :param numbers: Numbers of the number slots, in message order
+        :param texts: dict of slot to encoded text of the text slots, not changed after it was passed
+        :param ipoc: IPOC of the message being answered
+        :param attribute_texts: Attribute slots holding a str instead of a number, included in texts
+        :return: bytes
+        """
+        if attribute_texts != self.attribute_texts:
+            for slot in self.attribute_texts:
+                self.kinds[slot] = NUMBER
+            for slot in attribute_texts:
+                self.kinds[slot] = TEXT
+            self.attribute_texts = attribute_texts
+        if texts is not self.texts:
+            start = 0
+            text_bounds = self.text_bounds
+            for slot, text in texts.items():
+                text_bounds[2 * slot] = start
+                start += len(text)
+                text_bounds[2 * slot + 1] = start
+            self.joined = b"".join(texts.values())
+            self.texts = texts
+        self.numbers[0:len(numbers)] = numbers
+        while True:
+            length = lib.rsi_render(self.literals, self.bounds, self.kinds, self.slots, self.numbers, self.formatted,
+                                    self.joined, self.text_bounds, ipoc, self.precision, self.out, self.size)
+            if length >= 0:
+                return ffi.buffer(self.out, length)[:]
+            if length != -1:
+                raise ValueError("Could not format the numbers {}".format(numbers))
+            self.size *= 2
+            self.out = ffi.new("char[]", self.size)
+
+
+class CompiledCodec:
+    """Codec formatting the send messages in C, built by ccodec_build.py.
+
+    Sends through CompiledTemplate, compiled from the same SendTemplate as PrecompiledCodec, and
+    receives through the single pass ReceiveDecoder. Only importable once the _ccodec extension is
+    built (python ccodec_build.py, needs cffi), codec.py registers it first when it is.
+    See LxmlCodec for the arguments.
+    """
+    name = "compiled"
+
+    def __init__(self, send_string, receive_string, precision=None):
+        self.send_string = send_string
+        self.receive_string = receive_string
+        self.precision = precision
+        self.template = SendTemplate(send_string, precision)
+        self.compiled = CompiledTemplate(self.template)
+        # Fields of the template by slot instead of part position
+        self.attribute_fields = [(tag, [(position // 2, a) for position, a in attributes])
+                                 for tag, attributes in self.template.attribute_fields]
+        self.text_fields = [(tag, position // 2, text) for tag, position, text in self.template.text_fields]
+        self.decoder = ReceiveDecoder(receive_string)
+        self.decode = self.decoder.decode
+
+    def __getstate__(self):
+        # C arrays can not be pickled, they are compiled again
+        return self.send_string, self.receive_string, self.precision
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @property
+    def fallbacks(self):
+        return self.decoder.fallbacks
+
+    def encode(self, values, ipoc):
+        """ Encoded send message of a values dict and the IPOC being answered. """
+        numbers = []
+        texts = {}
+        attribute_texts = []
+        for tag, attributes in self.attribute_fields:
+            row = values[tag]
+            for slot, a in attributes:
+                value = row[a]
+                if value.__class__ is str:
+                    texts[slot] = escape_attribute(value).encode("utf8")
+                    attribute_texts.append(slot)
+                else:
+                    numbers.append(value)
+        for tag, slot, text in self.text_fields:
+            texts[slot] = text(values[tag]).encode("utf8")
+        return self.compiled.render(numbers, texts, ipoc, tuple(attribute_texts))
+
+    def renderer(self, layout):
+        return CompiledRenderer(self, layout)
+
+
+class CompiledRenderer:
+    """Renders send snapshots through CompiledTemplate.
+
+    The numbers are passed to C on every render, which formats only the ones that changed. The
+    escaped texts are reused while the snapshot is unchanged.
+
+    Keyword arguments:
+    codec - CompiledCodec of the send message
+    layout - Layout of the send SharedState the snapshots are taken from
+    """
+
+    def __init__(self, codec, layout):
+        template = codec.template
+        self.compiled = CompiledTemplate(template)
+        indices = {}
+        index = 0
+        for tag, attributes in layout:
+            if attributes is None:
+                indices[tag] = index
+                index += 1
+            else:
+                indices[tag] = {a: index + i for i, a in enumerate(attributes)}
+                index += len(attributes)
+        # Snapshot values of the number slots in message order
+        numbers = [indices[tag][a] for tag, attributes in template.attribute_fields for _, a in attributes]
+        self.numbers = itemgetter(*numbers) if len(numbers) > 1 else lambda snapshot: [snapshot[i] for i in numbers]
+        # (snapshot index, slot, ElementText, tag) of each text slot
+        self.text_slots = [(indices[tag], position // 2, text, tag) for tag, position, text in template.text_fields]
+        self.previous = None
+        self.texts = {}
+
+    def render(self, snapshot, ipoc):
+        """ Encoded send message of a SharedState snapshot and the IPOC being answered. """
+        snapshot = tuple(snapshot)
+        if snapshot != self.previous:
+            self.texts = {slot: text(from_slot(tag, snapshot[index])).encode("utf8")
+                          for index, slot, text, tag in self.text_slots}
+            self.previous = snapshot
+        return self.compiled.render(self.numbers(snapshot), self.texts, ipoc)
+
+
+if __name__ == '__main__':
+    pass
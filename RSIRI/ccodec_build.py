@@ -0,0 +1,139 @@
+import os
+import tempfile
+
+from cffi import FFI
+
+# Kinds of the slots between the literal fragments of a send message
+NUMBER = 0
+TEXT = 1
+IPOC = 2
+
+ffibuilder = FFI()
+
+ffibuilder.cdef("""
+    typedef struct {
+        double value;
+        int length;
+        char digits[40];
+    } rsi_number;
+
+    long rsi_render(const char *literals, const size_t *bounds, const unsigned char *kinds, int slots,
+                    const double *numbers, rsi_number *formatted, const char *texts, const size_t *text_bounds,
+                    unsigned long long ipoc, int precision, char *out, size_t size);
+""")
+
+# Numbers are formatted by PyOS_double_to_string, the function behind float repr and str.format,
+# so the compiled messages are byte identical to the ones of SendTemplate. The digits of each number
+# are kept in an rsi_number and reused while the number keeps the same bits, which also tells 0.0
+# from -0.0. Digits longer than rsi_number.digits are formatted on every render.
+ffibuilder.set_source("_ccodec", """
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdio.h>
+#include <string.h>
+
+#define RSI_NUMBER %d
+#define RSI_TEXT %d
+#define RSI_IPOC %d
+
+typedef struct {
+    double value;
+    int length;
+    char digits[40];
+} rsi_number;
+
+static int rsi_copy(char *out, size_t size, size_t *length, const char *data, size_t n)
+{
+    if (*length + n > size)
+        return -1;
+    memcpy(out + *length, data, n);
+    *length += n;
+    return 0;
+}
+
+/* Writes the digits of a number into out, reusing the digits of the previous render of the slot.
+   Returns 0, -1 if out is too small or -2 if the number could not be formatted. */
+static int rsi_number_copy(char *out, size_t size, size_t *length, double value, rsi_number *formatted,
+                           int precision, int *gil_held, PyGILState_STATE *gil)
+{
+    char *digits;
+    size_t n;
+    int result;
+
+    if (formatted->length > 0 && memcmp(&formatted->value, &value, sizeof(double)) == 0)
+        return rsi_copy(out, size, length, formatted->digits, (size_t)formatted->length);
+    if (!*gil_held) {
+        *gil = PyGILState_Ensure();
+        *gil_held = 1;
+    }
+    digits = precision < 0
+        ? PyOS_double_to_string(value, 'r', 0, Py_DTSF_ADD_DOT_0, NULL)
+        : PyOS_double_to_string(value, 'f', precision, 0, NULL);
+    if (digits == NULL) {
+        PyErr_Clear();
+        return -2;
+    }
+    n = strlen(digits);
+    formatted->length = 0;
+    if (n < sizeof(formatted->digits)) {
+        memcpy(formatted->digits, digits, n);
+        formatted->value = value;
+        formatted->length = (int)n;
+    }
+    result = rsi_copy(out, size, length, digits, n);
+    PyMem_Free(digits);
+    return result;
+}
+
+/* Writes the literal fragments with the formatted slots between them into out.
+   Returns the message length, -1 if out is too small or -2 if a number could not be formatted. */
+static long rsi_render(const char *literals, const size_t *bounds, const unsigned char *kinds, int slots,
+                       const double *numbers, rsi_number *formatted, const char *texts, const size_t *text_bounds,
+                       unsigned long long ipoc, int precision, char *out, size_t size)
+{
+    size_t length = 0;
+    int number = 0;
+    int failed = 0;
+    int gil_held = 0;
+    PyGILState_STATE gil;
+
+    for (int i = 0; i <= slots && !failed; i++) {
+        failed = rsi_copy(out, size, &length, literals + bounds[i], bounds[i + 1] - bounds[i]);
+        if (failed || i == slots)
+            break;
+        if (kinds[i] == RSI_NUMBER) {
+            failed = rsi_number_copy(out, size, &length, numbers[number], formatted + number, precision,
+                                     &gil_held, &gil);
+            number++;
+        } else if (kinds[i] == RSI_TEXT) {
+            failed = rsi_copy(out, size, &length, texts + text_bounds[2 * i],
+                              text_bounds[2 * i + 1] - text_bounds[2 * i]);
+        } else {
+            char digits[24];
+            int n = snprintf(digits, sizeof(digits), "%%llu", ipoc);
+            failed = rsi_copy(out, size, &length, digits, (size_t)n);
+        }
+    }
+    if (gil_held)
+        PyGILState_Release(gil);
+    return failed ? failed : (long)length;
+}
+""" % (NUMBER, TEXT, IPOC))
+
+
+def build(directory=None):
+    """Compiles the _ccodec extension of CompiledCodec, needs cffi and a C compiler.
+
+    :param directory: Directory the extension is written to (default None, next to this file)
+    :return: path of the extension
+    """
+    directory = os.path.abspath(directory or os.path.dirname(__file__))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        extension = ffibuilder.compile(tmpdir=tmpdir)
+        target = os.path.join(directory, os.path.basename(extension))
+        os.replace(extension, target)
+    return target
+
+
+if __name__ == '__main__':
+    print(build())
@@ -1,36 +1,45 @@
 from multiprocessing import Process, Manager
-from time import sleep
 
-from src.RSIRI.log import log_process
+from src.RSIRI.base_client import BaseRSIClient, JOINT_AXES, POSE_AXES
+from src.RSIRI.log import log_process, LogBuffer
 from src.RSIRI.server import rsi_process
-from src.RSIRI.tools import \
-    convert_rsi_config_to_dict, \
-    extract_config_from_rsi_config, \
-    check_position_values
 
 
-class RSIClient:
+class RSIClient(BaseRSIClient):
     """ RSI Client Object """
 
-    def __init__(self, file, cycle_rate=4):
+    def __init__(self, file, cycle_rate=4, cache_dir=None, status=None, cpus=None, priority=None, lock_memory=False,
+                 gc_control=False, precision=None):
         """RSI Client Object
 
         Object used to provide interface to RSI Variables.
         :param file: RSI Config File
-        :param ip: Local IP address
-        :param port: Port used in RSI Config file
-        """
-        self.file = file
-        self.ip, self.port, self.sen_type, self.only_send = extract_config_from_rsi_config(file)
-        self.manager = Manager()
-        self.send = self.manager.dict(convert_rsi_config_to_dict(file, "send"))
-        self.receive = self.manager.dict(convert_rsi_config_to_dict(file, "receive"))
-        self.status = self.manager.dict({"State": False, "Logging": False, "Error": ""})
+        :param cycle_rate: RSI cycle rate in ms (4 or 12)
+        :param cache_dir: Directory caching compiled config files, see load_config
+        :param status: Manager.Dict shared with an RSIMultiClient, which then serves the connection
+                       instead of a process of this client
+        :param cpus: CPUs to pin the RSI process to, e.g. {2, 3}
+        :param priority: SCHED_FIFO priority of the RSI process, 1-99, needs CAP_SYS_NICE or RLIMIT_RTPRIO
+        :param lock_memory: Lock the RSI process memory into RAM with mlockall
+        :param gc_control: Disable automatic garbage collection in the RSI process, collecting between cycles
+        :param precision: Digits after the decimal point of sent numbers, None sends the shortest exact repr
+        The applied real-time settings are reported in status["Realtime"] once the process runs.
+        """
+        super().__init__(file, cycle_rate, cache_dir, precision)
+        if status is None:
+            self.manager = Manager()
+            self.status = self.manager.dict({"State": False, "Logging": False, "Error": "", "Realtime": {}})
+        else:
+            self.manager = None
+            self.status = status
+        self.log = LogBuffer(self.send.layout, self.receive.layout)
         self.movement_type = None
-        self.rsi = Process(target=rsi_process, args=(self.file,
-                                                     self.receive,
-                                                     self.send,
-                                                     self.status))
+        # rsi_process arguments of this connection
+        self.session = (self.config, self.receive, self.send, self.status,
+                        self.timing, self.log, self.trajectory, self.motion, self.commands,
+                        self.servo, self.telemetry, self.watchdog)
+        self.realtime = {"cpus": cpus, "priority": priority, "lock": lock_memory, "collect": gc_control}
+        self.rsi = self.create_process() if status is None else None
         if cycle_rate == 4:
             self.cycle_rate = 0.004
         elif cycle_rate == 12:
@@ -50,182 +59,107 @@ class RSIClient:
         self.log_location = location
 
     def enable_logging(self):
-        self.logging = Process(target=log_process, args=(self.send,
-                                                         self.receive,
+        self.logging = Process(target=log_process, args=(self.log,
                                                          self.status,
-                                                         self.log_location,
-                                                         self.cycle_rate))
+                                                         self.log_location))
 
-    def display_variables(self):
+    def create_process(self):
         """
+        RSI Network process of this connection, started by start
         :return:
         """
-        print("Receive Variables")
-        for key, value in self.receive.items():
-            print(key, ' : ', value)
-
-        print("Send Variables")
-        for key, value in self.send.items():
-            print(key, ' : ', value)
+        return Process(target=rsi_process, args=self.session, kwargs={"realtime": self.realtime})
 
     def start(self):
         """
         Start RSI Network process
         :return:
         """
+        if self.rsi is None:
+            return "Connection is served by an RSIMultiClient"
+        if self.rsi.is_alive():
+            return "RSI process is already running"
+        self.watchdog.reset()
+        self.status["State"] = True
         self.rsi.start()
         if self.logging is not False:
             self.logging.start()
-        self.status["State"] = True
-        # self.rsi.join()
 
-    def stop(self):
+    def stop(self, timeout=None):
         """
-        Stop RSI Network process
+        Stop RSI Network process, ramping the corrections to zero first, see Watchdog
+        The process can be started again, the compiled config and shared memory blocks are reused.
+        A restarted session logs to a new file, see session_log_file.
+        :param timeout: Seconds to wait for the process before it is terminated
+                        (default None, the watchdog stop time plus 1 s)
         :return:
         """
+        if self.rsi is None:
+            return "Connection is served by an RSIMultiClient"
+        self.watchdog.request_stop()
+        if self.rsi.is_alive():
+            self.rsi.join(self.watchdog.stop_time + 1 if timeout is None else timeout)
+            if self.rsi.is_alive():
+                self.rsi.terminate()
+                self.rsi.join()
         self.status["State"] = False
-        sleep(1)
-        self.rsi.terminate()
-        sleep(1)
-        self.rsi.kill()
-        sleep(1)
-        self.rsi = Process(target=rsi_process, args=(self.file,
-                                                     self.ip,
-                                                     self.port,
-                                                     self.receive,
-                                                     self.send,
-                                                     self.status))
-
-    def check_receive_value(self, key):
-        try:
-            return self.receive[key]
-        except NameError:
-            return "Key does not exist"
-
-    def check_send_value(self, key):
-        try:
-            return self.send[key]
-        except NameError:
-            return "Key does not exist"
-
-    def update_pendant(self, value):
-        try:
-            self.send["EStr"] = value
-        except ValueError:
-            return "EStr internal variable not present in config file"
-
-    def set_value(self, key, value):
-        """
-        :param key:
-        :param value:
-        :return:
-        """
-        try:
-            self.send[key] = value
-        except ValueError:
-            return "{} not present in config file".format(key)
-
-    def set_value_attribute(self, key, axis, value):
-        """Sets the value of a multi value variable.
-
-        :param key:
-        :param axis:
-        :param value:
-        :return:
-        """
-        try:
-            send_value = self.send
-            values = send_value[key]
-            values[axis] = str(value)
-            send_value[key] = values
-            self.send = send_value
-            return "OK"
-        except ValueError:
-            return "{} is not present in config file".format(key)
-
-    def set_axis(self, axis, value):
-        """
-
-        :param axis:
-        :param value:
-        :return:
-        """
-        try:
-            self.set_value_attribute("RKorr", axis, value)
-        except NameError:
-            return "RKorr is not present in config file"
-
-    def set_joint(self, joint, value):
-        """
-
-        :param joint:
-        :param value:
-        :return:
-        """
-        try:
-            self.set_value_attribute("AKorr", joint, value)
-        except NameError:
-            return "AKorr is not present in config file"
-
-    def check_send_values(self, key):
-        """
-
-        :param key:
-        :return:
-        """
-        return self.send[key]
+        if self.logging is not False:
+            self.logging.join()
+            self.enable_logging()
+        self.rsi = self.create_process()
 
-    def check_receive_values(self, key):
+    def close(self):
         """
-
-        :param key:
+        Release the shared memory blocks, the client can not be used afterwards
         :return:
         """
-        return self.receive[key]
+        super().close()
+        self.log.close(unlink=True)
 
-    def test(self, key, value):
-        """
+    def stream_trajectory(self, key, corrections, end=True, policy="hold"):
+        """Queue per cycle corrections, the RSI process sends exactly one row per telegram.
 
-        :param key:
-        :param value:
-        :return:
+        Waits while the queue is full, so trajectories longer than the queue can be streamed.
+        :param key: Send variable the corrections are applied to, "RKorr" or "AKorr"
+        :param corrections: Sequence of rows, one value per attribute of key (e.g. X, Y, Z, A, B, C)
+        :param end: The trajectory ends with these rows, pass False to append more rows later
+        :param policy: When the queue runs empty before the end, "hold" repeats the last row, "zero" sends zeros
+        :return: Number of rows queued
         """
-        try:
-            self.send[key] = value
-        except ValueError:
-            return "{} not present in config file".format(key)
+        return self.trajectory.push(key, corrections, end, policy)
 
-    def move_basic_ptp(self, coord, rate):
-        """
+    def move_basic_ptp(self, coord, rate, acceleration=None, jerk=None, profile="trapezoidal"):
+        """Move to a cartesian position.
 
-        :param coord:
-        :param rate:
+        The RSI process computes the RKorr correction of each cycle from RIst, accelerating up
+        to rate and braking onto the target without overshoot. Returns once the move is started.
+        :param coord: Target X, Y, Z, A, B, C
+        :param rate: Largest correction per cycle
+        :param acceleration: Largest change of correction per cycle (default rate / 25)
+        :param jerk: Largest change of acceleration per cycle, s-curve profile only (default acceleration / 10)
+        :param profile: "trapezoidal" or "s-curve"
         :return:
         """
-        values = {"X": coord[0], "Y": coord[1], "Z": coord[2], "A": coord[3], "B": coord[4], "C": coord[5]}
-        send_values = self.check_send_values("RKorr")
-        rec_values = self.check_receive_values("RIst")
-
-        self.send["RKorr"] = check_position_values(values, send_values, rec_values, rate)
+        return self.start_move("RKorr", dict(zip(POSE_AXES, coord)), rate, acceleration, jerk, profile)
 
-    def move_joints(self, a1, a2, a3, a4, a5, a6, rate):
-        """
+    def move_joints(self, a1, a2, a3, a4, a5, a6, rate, acceleration=None, jerk=None, profile="trapezoidal"):
+        """Move to a joint position.
 
+        The RSI process computes the AKorr correction of each cycle from AIPos, see move_basic_ptp.
         :param a1:
         :param a2:
         :param a3:
         :param a4:
         :param a5:
         :param a6:
-        :param rate:
+        :param rate: Largest correction per cycle
+        :param acceleration: Largest change of correction per cycle (default rate / 25)
+        :param jerk: Largest change of acceleration per cycle, s-curve profile only (default acceleration / 10)
+        :param profile: "trapezoidal" or "s-curve"
         :return:
         """
-        values = {"A1": a1, "A2": a2, "A3": a3, "A4": a4, "A5": a5, "A6": a6}
-        send_values = self.check_send_values("RKorr")
-        rec_values = self.check_receive_values("RIst")
-
-        self.send["AKorr"] = check_position_values(values, send_values, rec_values, rate)
+        values = dict(zip(JOINT_AXES, (a1, a2, a3, a4, a5, a6)))
+        return self.start_move("AKorr", values, rate, acceleration, jerk, profile)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,213 @@
+import os
+
+from src.RSIRI.decoder import ReceiveDecoder
+from src.RSIRI.state import snapshot_to_dict
+from src.RSIRI.template import DeltaRenderer, SendTemplate, number_format
+from src.RSIRI.tools import \
+    add_ipoc, \
+    convert_xml_string_to_dict, \
+    get_ipoc, \
+    merge_dict_with_xml_string, \
+    remove_ipoc, \
+    update_ipoc
+
+# Registered codecs by name, in order of preference (fastest first)
+codecs = {}
+
+
+class LxmlCodec:
+    """Reference codec built on the lxml functions of tools.py.
+
+    Parses and serialises every message, so it is the slowest backend. Other backends must
+    produce the same bytes and values, see check_codecs.
+
+    Keyword arguments:
+    send_string - XML template of the sent messages, with IPOC
+    receive_string - XML template of the received messages, without IPOC
+    precision - Digits after the decimal point of sent numbers, see number_format (default None)
+    """
+    name = "lxml"
+    # Telegrams the codec could not decode on its fast path
+    fallbacks = 0
+
+    def __init__(self, send_string, receive_string, precision=None):
+        self.send_string = send_string
+        self.receive_string = receive_string
+        self.precision = precision
+        self.format_number = number_format(precision)
+
+    def __getstate__(self):
+        return self.send_string, self.receive_string, self.precision
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def encode(self, values, ipoc):
+        """ Encoded send message of a values dict and the IPOC being answered. """
+        format_number = self.format_number
+        strings = {}
+        for tag, value in values.items():
+            if isinstance(value, dict):
+                strings[tag] = {a: v if v.__class__ is str else format_number(v) for a, v in value.items()}
+            else:
+                strings[tag] = str(value)
+        strings["IPOC"] = str(ipoc)
+        return update_ipoc(merge_dict_with_xml_string(strings, self.send_string), ipoc).encode("utf8")
+
+    def decode(self, message):
+        """ Typed values dict and IPOC of a received message. """
+        if not isinstance(message, (str, bytes)):
+            message = bytes(message)
+        return convert_xml_string_to_dict(message, typed=True), int(get_ipoc(message))
+
+    def renderer(self, layout):
+        """ Renderer of SharedState snapshots of layout, see DeltaRenderer. """
+        return SnapshotRenderer(self, layout)
+
+
+class SnapshotRenderer:
+    """ Renders SharedState snapshots through the encode method of a codec. """
+
+    def __init__(self, codec, layout):
+        self.codec = codec
+        self.layout = layout
+
+    def render(self, snapshot, ipoc):
+        return self.codec.encode(snapshot_to_dict(self.layout, snapshot), ipoc)
+
+
+class PrecompiledCodec:
+    """Pure Python codec of precompiled templates.
+
+    Sends through SendTemplate, or DeltaRenderer for snapshots, and receives through the
+    single pass ReceiveDecoder. See LxmlCodec for the arguments.
+    """
+    name = "precompiled"
+
+    def __init__(self, send_string, receive_string, precision=None):
+        self.precision = precision
+        self.template = SendTemplate(send_string, precision)
+        self.decoder = ReceiveDecoder(receive_string)
+        self.decode = self.decoder.decode
+
+    def __getstate__(self):
+        return self.template, self.decoder, self.precision
+
+    def __setstate__(self, state):
+        self.template, self.decoder, self.precision = state
+        self.decode = self.decoder.decode
+
+    @property
+    def fallbacks(self):
+        return self.decoder.fallbacks
+
+    def encode(self, values, ipoc):
+        return self.template.render(values, ipoc).encode("utf8")
+
+    def renderer(self, layout):
+        return DeltaRenderer(self.template, layout)
+
+
+def register_codec(codec, first=True):
+    """Registers a codec backend.
+
+    A backend is a class taking (send_string, receive_string, precision) with name and fallbacks
+    attributes and encode, decode and renderer methods, see LxmlCodec. Compiled backends register themselves
+    first, so they are selected when they can be imported.
+    :param codec: Codec class
+    :param first: Prefer the codec over the ones registered so far
+    """
+    registered = [(name, c) for name, c in codecs.items() if name != codec.name]
+    registered.insert(0 if first else len(registered), (codec.name, codec))
+    codecs.clear()
+    codecs.update(registered)
+
+
+def select_codec(name=None):
+    """Name of the codec used by new configs.
+
+    :param name: Codec name (default None, the RSIRI_CODEC environment variable or else the
+                 most preferred registered codec)
+    :return: codec name
+    """
+    name = name or os.environ.get("RSIRI_CODEC") or next(iter(codecs))
+    if name not in codecs:
+        raise ValueError("Unknown codec {}, available {}".format(name, list(codecs)))
+    return name
+
+
+def create_codec(send_string, receive_string, precision=None, name=None):
+    """ New codec of a pair of XML templates, see select_codec for name. """
+    return codecs[select_codec(name)](send_string, receive_string, precision)
+
+
+def check_codecs(config, values=None, ipocs=(0, 4, 123456, 2 ** 40)):
+    """Conformance check of the registered codecs against the lxml reference.
+
+    Every codec encodes the messages of both directions (the client's and, as the simulator
+    does, the robot's) and decodes them again. Encoded bytes and decoded values must match the
+    reference exactly.
+    :param config: RSIConfig
+    :param values: dict of direction to list of values dicts (default None, see conformance_values)
+    :param ipocs: IPOCs each values dict is encoded with
+    :return: dict of codec name to list of mismatch descriptions
+    """
+    values = values if values is not None else conformance_values(config)
+    # Template of the messages of each direction and the same template without IPOC to decode them
+    templates = {"send": (config.send_string, remove_ipoc(config.send_string)),
+                 "receive": (add_ipoc(config.receive_string), config.receive_string)}
+    result = {}
+    for name, codec in codecs.items():
+        mismatches = result[name] = []
+        for direction, strings in templates.items():
+            reference = LxmlCodec(*strings, config.precision)
+            candidate = codec(*strings, config.precision)
+            for index, sample in enumerate(values[direction]):
+                for ipoc in ipocs:
+                    expected = reference.encode(sample, ipoc)
+                    encoded = candidate.encode(sample, ipoc)
+                    if encoded != expected:
+                        mismatches.append("{} {} IPOC {}: encoded {!r}, expected {!r}".format(
+                            direction, index, ipoc, encoded, expected))
+                    expected = reference.decode(expected)
+                    decoded = candidate.decode(encoded)
+                    if decoded != expected:
+                        mismatches.append("{} {} IPOC {}: decoded {!r}, expected {!r}".format(
+                            direction, index, ipoc, decoded, expected))
+    return result
+
+
+def conformance_values(config):
+    """ Values dicts of both directions covering zero, signs, exponents, escaped and non ASCII text. """
+    numbers = (0.0, -0.0, 1.0, -2.5, 0.1, 1 / 3, 1e-7, -123456.789, 1e16)
+    texts = ("", "EStr Test", "a&b", "<tag>", "quote \" here", "tab\tline", "Grüße")
+    values = {}
+    for direction in ("send", "receive"):
+        samples = values[direction] = []
+        for n, number in enumerate(numbers):
+            sample = config.create_values(direction)
+            sample.pop("IPOC", None)
+            for tag, value in sample.items():
+                if isinstance(value, dict):
+                    for i, a in enumerate(value):
+                        value[a] = numbers[(n + i) % len(numbers)] * (i + 1)
+                else:
+                    sample[tag] = texts[n % len(texts)]
+            samples.append(sample)
+    return values
+
+
+register_codec(LxmlCodec)
+register_codec(PrecompiledCodec)
+
+# Optional compiled backend, importable once its extension is built (python ccodec_build.py)
+try:
+    from src.RSIRI.ccodec import CompiledCodec
+except ImportError:
+    pass
+else:
+    register_codec(CompiledCodec)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,143 @@
+from multiprocessing import shared_memory
+from struct import Struct
+from time import monotonic, sleep
+
+from src.RSIRI.trajectory import create_slot_indices
+
+# int64 header slots: commands written, commands applied, IPOC of the last applied command, pushes that waited
+# for room
+COMMAND_HEADER = 4
+WRITTEN, APPLIED, LAST_IPOC, WAITS = range(4)
+# Snapshot slot index, value and target IPOC of a command
+command_struct = Struct("<qdq")
+
+
+class CommandBuffer:
+    """Lock-free shared memory ring of correction commands.
+
+    A single client process pushes commands setting one attribute of a multi value send variable
+    (e.g. RKorr X) in one telegram, the first with an IPOC at or after the target IPOC. The RSI
+    server applies every due command at the start of a reply, the following telegrams send the
+    send values again, so commands never override later writes of the send values and a
+    correction is applied once. A batch of commands is published with a single store of the
+    written count, the server sees either all or none of them and never a half written command.
+
+    Keyword arguments:
+    send_layout - Layout of the send SharedState
+    capacity - Number of commands held by the ring (default 1024)
+    """
+
+    def __init__(self, send_layout, capacity=1024):
+        self.send_layout = send_layout
+        self.capacity = capacity
+        self._setup()
+        self.memory = shared_memory.SharedMemory(create=True, size=8 * COMMAND_HEADER + capacity * command_struct.size)
+        self._attach()
+        for i in range(COMMAND_HEADER):
+            self.values[i] = 0
+
+    def _setup(self):
+        indices = create_slot_indices(self.send_layout)
+        self.indices = {key: dict(zip(attributes, indices[key]))
+                        for key, attributes in self.send_layout if attributes is not None}
+
+    def _attach(self):
+        self.buffer = self.memory.buf
+        self.values = self.memory.buf[:8 * COMMAND_HEADER].cast("q")
+
+    def __getstate__(self):
+        return self.send_layout, self.capacity, self.memory.name
+
+    def __setstate__(self, state):
+        self.send_layout, self.capacity, name = state
+        self._setup()
+        self.memory = shared_memory.SharedMemory(name=name)
+        self._attach()
+
+    def push(self, key, values, ipoc=0, timeout=0.1):
+        """Queue commands as one batch, waiting for room while the ring is full.
+
+        The ring only drains while the RSI process answers telegrams, so the wait is bounded.
+        :param key: Multi value send variable, e.g. "RKorr"
+        :param values: dict of attribute to value
+        :param ipoc: IPOC of the telegram sending the values, or the first one after it (default 0, the next
+                     telegram)
+        :param timeout: Seconds to wait for room before TimeoutError is raised, nothing is queued then
+        :return: Number of commands queued
+        """
+        try:
+            slots = self.indices[key]
+            commands = [(slots[a], float(v)) for a, v in values.items()]
+        except KeyError as error:
+            raise KeyError("{}.{} is not a multi value send variable".format(key, error.args[0])) from None
+        if len(commands) > self.capacity:
+            raise ValueError("Batch of {} commands exceeds the capacity of {}".format(len(commands), self.capacity))
+        counters = self.values
+        written = counters[WRITTEN]
+        if written + len(commands) - counters[APPLIED] > self.capacity:
+            counters[WAITS] += 1
+            deadline = monotonic() + timeout
+            while written + len(commands) - counters[APPLIED] > self.capacity:
+                if monotonic() > deadline:
+                    raise TimeoutError("Command ring is full, the RSI process is not answering telegrams")
+                sleep(0.001)
+        for index, value in commands:
+            offset = 8 * COMMAND_HEADER + (written % self.capacity) * command_struct.size
+            command_struct.pack_into(self.buffer, offset, index, value, int(ipoc))
+            written += 1
+        # Publishes the whole batch
+        counters[WRITTEN] = written
+        return len(commands)
+
+    def apply(self, snapshot, ipoc):
+        """Apply the due commands to a send snapshot, called by the RSI server once per telegram.
+
+        Commands are applied in order, a command with a later target IPOC holds back the ones
+        queued after it.
+        :param snapshot: SharedState snapshot tuple of the send values
+        :param ipoc: IPOC of the telegram being answered
+        :return: The snapshot with the due commands applied
+        """
+        counters = self.values
+        applied = counters[APPLIED]
+        written = counters[WRITTEN]
+        if applied == written:
+            return snapshot
+        buffer = self.buffer
+        due = None
+        while applied < written:
+            offset = 8 * COMMAND_HEADER + (applied % self.capacity) * command_struct.size
+            index, value, target = command_struct.unpack_from(buffer, offset)
+            if target > ipoc:
+                break
+            if due is None:
+                due = list(snapshot)
+            # Of several commands of a slot the last one is sent
+            due[index] = value
+            applied += 1
+        if due is None:
+            return snapshot
+        counters[APPLIED] = applied
+        counters[LAST_IPOC] = ipoc
+        return due
+
+    def progress(self):
+        """ Commands queued and applied so far. """
+        counters = self.values
+        return {"queued": counters[WRITTEN] - counters[APPLIED],
+                "applied": counters[APPLIED],
+                "written": counters[WRITTEN],
+                "waits": counters[WAITS],
+                "last_ipoc": counters[LAST_IPOC]}
+
+    def close(self, unlink=False):
+        """ Release the shared memory, unlink removes the block once every process has closed it. """
+        self.values.release()
+        self.buffer = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,126 @@
+import os
+import pickle
+from copy import deepcopy
+from hashlib import sha256
+
+from lxml import etree
+
+from src.RSIRI.codec import create_codec, select_codec
+from src.RSIRI.state import STRING_SIZE
+from src.RSIRI.tools import \
+    convert_config_to_xml_string, \
+    convert_xml_string_to_dict, \
+    extract_config_from_rsi_config, \
+    extract_hold_values_from_config
+
+# Bump when the compiled contents change, invalidates on disk caches
+CACHE_VERSION = 5
+# Bytes allowed for each number of a message, formatted floats and IPOC stay well below
+NUMBER_SIZE = 32
+
+# Compiled configs of this process, keyed by content hash
+compiled_configs = {}
+
+
+class RSIConfig:
+    """Compiled RSI config file.
+
+    Holds everything derived from an RSI_EthernetConfig file: connection settings, send
+    and receive layouts, hold flags and the codec encoding and decoding the messages, the
+    backend chosen by select_codec. Values are typed (see type_values), numbers are only
+    formatted by the codec.
+    The config file is parsed once, use load_config to share compiled configs.
+
+    Keyword arguments:
+    file - RSI config file
+    data - Contents of the config file (default None, read from file)
+    precision - Digits after the decimal point of sent numbers, see number_format (default None)
+    """
+
+    def __init__(self, file, data=None, precision=None):
+        if data is None:
+            with open(file, "rb") as config_file:
+                data = config_file.read()
+        self.file = file
+        self.precision = precision
+        self.digest = config_digest(data, precision)
+
+        root = etree.fromstring(data, etree.XMLParser(remove_blank_text=True))
+        self.ip, self.port, self.sen_type, self.only_send = extract_config_from_rsi_config(root)
+        self.hold = extract_hold_values_from_config(root)
+        self.send_string = convert_config_to_xml_string(root, "send")
+        self.receive_string = convert_config_to_xml_string(root, "receive")
+        self.send_values = convert_xml_string_to_dict(self.send_string, typed=True)
+        self.receive_values = convert_xml_string_to_dict(self.receive_string, typed=True)
+        self.codec = create_codec(self.send_string, self.receive_string, precision)
+        self.send_size = message_size(self.send_string, self.send_values)
+        self.receive_size = message_size(self.receive_string, self.receive_values)
+
+    def create_values(self, direction):
+        """ New typed values dict of a direction ("send" or "receive"), as convert_rsi_config_to_dict. """
+        return deepcopy(self.send_values if direction == "send" else self.receive_values)
+
+
+def message_size(xml_string, values):
+    """Buffer size of the messages of a layout.
+
+    The XML template plus NUMBER_SIZE bytes per number and STRING_SIZE bytes per string value,
+    rounded up to whole KiB.
+    """
+    size = len(xml_string.encode("utf8")) + NUMBER_SIZE
+    for value in values.values():
+        size += NUMBER_SIZE * len(value) if isinstance(value, dict) else STRING_SIZE
+    return -(-size // 1024) * 1024
+
+
+def config_digest(data, precision=None):
+    """ Content hash of a config file, including the cache version, send precision and codec. """
+    return sha256("{}\0{}\0{}\0".format(CACHE_VERSION, precision, select_codec()).encode() + data).hexdigest()
+
+
+def load_config(file, cache_dir=None, precision=None):
+    """Loads a compiled RSI config.
+
+    Compiled configs are memoized by content hash within the process and, when cache_dir
+    is set or the RSIRI_CACHE environment variable names a directory, pickled to disk.
+    The cache directory must only be writable by trusted users.
+    :param file: RSI config file, or an RSIConfig which is returned as it is
+    :param cache_dir: Directory of the on disk cache (default None)
+    :param precision: Digits after the decimal point of sent numbers, see number_format (default None)
+    :return: RSIConfig
+    """
+    if isinstance(file, RSIConfig):
+        return file
+    with open(file, "rb") as config_file:
+        data = config_file.read()
+    digest = config_digest(data, precision)
+    config = compiled_configs.get(digest)
+    if config is not None:
+        return config
+
+    cache_dir = cache_dir if cache_dir is not None else os.environ.get("RSIRI_CACHE")
+    cache_file = os.path.join(cache_dir, "{}.pickle".format(digest)) if cache_dir else None
+    if cache_file is not None and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as cached:
+                config = pickle.load(cached)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            config = None
+    if config is None or config.digest != digest:
+        config = RSIConfig(file, data, precision)
+        if cache_file is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                temporary = "{}.{}".format(cache_file, os.getpid())
+                with open(temporary, "wb") as cached:
+                    pickle.dump(config, cached)
+                os.replace(temporary, cache_file)
+            except OSError:
+                pass
+    config.file = file
+    compiled_configs[digest] = config
+    return config
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,85 @@
+import re
+
+from lxml import etree
+
+from src.RSIRI.state import to_float
+from src.RSIRI.tools import convert_xml_string_to_dict, get_ipoc
+
+# Values containing entities, tabs or line breaks need XML normalisation,
+# those telegrams are left to the lxml path
+_ATTRIBUTE_VALUE = r'\s+{}="([^"&<\n\r\t]*)"'
+_TEXT_VALUE = r"([^<&\r]+)"
+
+
+class ReceiveDecoder:
+    """Single pass decoder for RSI telegrams sent by the robot.
+
+    Generated from the XML string created by convert_config_to_xml_string(file, "receive").
+    Telegrams matching that layout are decoded with one regular expression match,
+    anything else falls back to convert_xml_string_to_dict and get_ipoc. Numbers are
+    converted once here: attributes to float, IPOC to int, text values stay str.
+
+    Keyword arguments:
+    xml_string - RSI receive XML template
+    """
+
+    def __init__(self, xml_string):
+        layout = etree.fromstring(xml_string)
+        pattern = r"\s*(?:<\?xml[^>]*\?>\s*)?<{}\b[^>]*>".format(re.escape(layout.tag))
+        # (tag, attributes) of each element, attributes is None for element text
+        self.fields = []
+
+        for xml_row in layout:
+            tag = re.escape(xml_row.tag)
+            if xml_row.text is None:
+                attributes = xml_row.keys()
+                pattern += r"\s*<{}{}\s*(?:/>|></{}>)".format(
+                    tag, "".join(_ATTRIBUTE_VALUE.format(re.escape(a)) for a in attributes), tag)
+                self.fields.append((xml_row.tag, attributes))
+            else:
+                pattern += r"\s*<{}>{}</{}>".format(tag, _TEXT_VALUE, tag)
+                self.fields.append((xml_row.tag, None))
+        # The robot appends IPOC to every telegram
+        pattern += r"\s*<IPOC>(\d+)</IPOC>\s*</{}>\s*".format(re.escape(layout.tag))
+        self.fields.append(("IPOC", None))
+
+        self.pattern = re.compile(pattern)
+        self.fallbacks = 0
+
+    def decode(self, message):
+        """ Decode an RSI telegram, returns the typed values dict and the IPOC as int.
+
+        Keyword arguments:
+        message - RSI XML telegram as string, bytes or a bytes-like object such as a memoryview
+        """
+        try:
+            text = message if isinstance(message, str) else str(message, "utf8")
+        except UnicodeDecodeError:
+            text = None
+        match = self.pattern.fullmatch(text) if text is not None else None
+        if match is None:
+            self.fallbacks += 1
+            if not isinstance(message, (str, bytes)):
+                message = bytes(message)
+            return convert_xml_string_to_dict(message, typed=True), int(get_ipoc(message))
+
+        groups = match.groups()
+        values = {}
+        index = 0
+        for tag, attributes in self.fields:
+            if attributes is None:
+                values[tag] = groups[index]
+                index += 1
+            else:
+                numbers = groups[index:index + len(attributes)]
+                try:
+                    values[tag] = dict(zip(attributes, map(float, numbers)))
+                except ValueError:
+                    values[tag] = dict(zip(attributes, map(to_float, numbers)))
+                index += len(attributes)
+        ipoc = values["IPOC"] = int(groups[-1])
+        return values, ipoc
+
+
+if __name__ == '__main__':
+    pass
@@ -1,37 +1,34 @@
 import logging
 from time import sleep
 
-from src.RSI-RI.network import Network
-from src.RSI-RI.tools import \
+from src.RSIRI.config import load_config
+from src.RSIRI.network import Network
+from src.RSIRI.tracing import create_trace, RECEIVED, SENT
+from src.RSIRI.tools import \
     get_ipoc, \
     update_ipoc, \
     convert_xml_string_to_dict, \
-    convert_config_to_xml_string, \
-    convert_rsi_config_to_dict, \
-    extract_config_from_rsi_config, \
     add_ipoc
 
-# Log file location
-# Define the log format
-log_format = '[%(asctime)s] %(levelname)-8s %(name)-12s %(funcName)20s() %(lineno)s %(message)s'
-# Define basic configuration
-logging.basicConfig(level=logging.DEBUG, format=log_format, handlers=[logging.StreamHandler()])
 logger = logging.getLogger(__name__)
 
 
 class RSIEchoServer:
     def __init__(self, config_file, cycle_rate):
-        self.network = Network("", int(extract_config_from_rsi_config(config_file)[1]), True)
+        self.config = load_config(config_file)
+        self.network = Network("", self.config.port, True, self.config.send_size)
         # RSI Variables
-        self.send_string = convert_config_to_xml_string(config_file, "receive")
-        self.send_values = convert_rsi_config_to_dict(config_file, "receive")
-        self.receive_string = convert_config_to_xml_string(config_file, "send")
-        self.receive_values = convert_rsi_config_to_dict(config_file, "send")
+        self.send_string = self.config.receive_string
+        self.send_values = self.config.create_values("receive")
+        self.receive_string = self.config.send_string
+        self.receive_values = self.config.create_values("send")
         # Status (State": "Inactive", "Status": "", "Config": "")
         self.status = {"State": False, "Error": ""}
         self.ipoc = 0
         self.cycle_rate = cycle_rate
         self.send_string = add_ipoc(self.send_string)
+        # Telegrams are traced when the logger is enabled for DEBUG as the server is created
+        self.trace = create_trace(logger, max(self.config.send_size, self.config.receive_size))
 
     def run(self):
         """ Operates RSI communication loop.
@@ -40,15 +37,22 @@ class RSIEchoServer:
         polling client pipe, processing data _working sending a reply
         """
         while True:
-            self.send_data()
-            logger.debug("Echo Send: {}".format(self.send_string))
-            try:
-                self.receive_data()
-                self.send_string = update_ipoc(self.send_string, self.ipoc)
-                self.process_data()
-                logger.debug("Echo receive: {}".format(self.receive_string))
-            except(TimeoutError, ConnectionResetError):
-                pass
+            self.exchange()
+
+    def exchange(self):
+        """ Send one robot telegram and process the reply, returns False when no reply arrived. """
+        self.send_data()
+        if self.trace is not None:
+            self.trace.record(SENT, self.ipoc, self.send_string.encode("utf8"))
+        try:
+            self.receive_data()
+            self.send_string = update_ipoc(self.send_string, self.ipoc)
+            self.process_data()
+            if self.trace is not None:
+                self.trace.record(RECEIVED, self.ipoc - self.cycle_rate, self.receive_string)
+        except(TimeoutError, ConnectionResetError):
+            return False
+        return True
 
     def send_data(self):
         # self.send_values.update(convert_xml_string_to_dict(self.send_string))
@@ -61,13 +65,13 @@ class RSIEchoServer:
         Polls network socket _working then updates RSIValues.values
         Gets IPOC from message _working updates self.ipoc
         """
-        # Polls network, returns a string of XML
-        self.receive_string = self.network.receive()
+        # Polls network, copies the XML message out of the reused receive buffer
+        self.receive_string = bytes(self.network.receive())
         # Get IPOC
         self.ipoc = int(get_ipoc(self.receive_string)) + self.cycle_rate
 
         # Convert XML string into Dict
-        self.receive_values.update(convert_xml_string_to_dict(self.receive_string))
+        self.receive_values.update(convert_xml_string_to_dict(self.receive_string, typed=True))
 
     def process_data(self):
         pass
@@ -2,8 +2,10 @@ from time import sleep
 
 from client import RSIClient
 from echo_server import RSIEchoServer
+from server import configure_logging
 
 if __name__ == '__main__':
+    configure_logging()
 
     config_file = "../../resources/Example Files/ConfigFiles/rsi examples/RSI_EthernetConfig.xml"
     # Create RSI Client
@@ -15,22 +17,22 @@ if __name__ == '__main__':
     # Show variables created from config file
     client.display_variables()
 
-    # Set cartesian correction
+    # Cartesian correction, sent every cycle until changed
     client.set_axis("X", 0.1)
 
-    # Set joint correction
+    # Joint correction, sent every cycle until changed
     client.set_joint("A1", 0.1)
 
-    # Move axis specific distance
-    # TODO if this works, turn into a procedure
+    # Cartesian correction sent in a single telegram
+    client.send_once("RKorr", {"X": 0.1, "Y": 0.1})
+
+    # Move axis specific distance, one correction per RSI cycle
     target = 3
     rate = 0.1
-    client.set_axis("X", rate)
-    current = 0
-    while current < target:
+    client.stream_trajectory("RKorr", [[rate, 0, 0, 0, 0, 0]] * round(target / rate), policy="zero")
+    while client.trajectory_progress()["queued"]:
         sleep(client.cycle_rate)
-        current += rate
-    client.set_axis("X", 0)
+    client.stop_trajectory()
 
     # Send message to Teach Pendent
     client.update_pendant("This is a message that will be shown on the pendant")
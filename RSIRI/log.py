@@ -1,19 +1,288 @@
+import ast
 import csv
+import os
+from array import array
+from multiprocessing import shared_memory
+from struct import Struct, unpack
 from time import sleep
 
+from src.RSIRI.state import STRING_SIZE
 
-def log_process(send, receive, status, location, rate):
-    location = "{}/log.csv".format(location)
-    output_file = open(location, "w+")
+# int64 header slots of the log buffer: records written, records read, records dropped, logging active
+LOG_HEADER = 8
+WRITTEN, READ, DROPPED, ACTIVE = range(4)
+NPY_MAGIC = b"\x93NUMPY"
+# Room left in the .npy header for the record count written when the log is closed
+NPY_RESERVE = 21
 
-    file_writer = csv.writer(output_file, lineterminator='\n')
-    file_writer.writerow(create_log(send, receive, "header"))
-    status["Logging"] = "Logging active"
-    while status["State"] is True:
-        file_writer.writerow(create_log(send, receive, "row"))
-        sleep(rate)
+
+def create_log_columns(send_layout, receive_layout):
+    """Names the binary log columns, in the create_log column order.
+
+    :param send_layout: Layout of the send SharedState
+    :param receive_layout: Layout of the receive SharedState
+    :return: list of (name, direction, tag, attribute) tuples, attribute is None for single values
+    """
+    columns = [("IPOC", "receive", "IPOC", None)]
+    names = {"IPOC"}
+    for direction, layout in (("send", send_layout), ("receive", receive_layout)):
+        for tag, attributes in layout:
+            if tag == "IPOC":
+                continue
+            for attribute in (None,) if attributes is None else attributes:
+                name = tag if attribute is None else "{}.{}".format(tag, attribute)
+                # Variables present in both directions are told apart by the direction
+                if name in names:
+                    name = "{}.{}".format(direction, name)
+                names.add(name)
+                columns.append((name, direction, tag, attribute))
+    return columns
+
+
+def create_log_fields(send_layout, receive_layout):
+    """Creates the binary log record fields, in the create_log column order.
+
+    :param send_layout: Layout of the send SharedState
+    :param receive_layout: Layout of the receive SharedState
+    :return: list of (name, struct format, numpy dtype) tuples
+    """
+    fields = []
+    for name, _, tag, attribute in create_log_columns(send_layout, receive_layout):
+        if tag == "IPOC":
+            fields.append((name, "Q", "<u8"))
+        elif attribute is None:
+            fields.append((name, "{}s".format(STRING_SIZE), "|S{}".format(STRING_SIZE)))
+        else:
+            fields.append((name, "d", "<f8"))
+    return fields
+
+
+class LogBuffer:
+    """Shared memory ring of binary log records.
+
+    The RSI server writes the send and receive values of every cycle as one fixed width
+    record, the log process drains the ring in large blocks. The server never waits on the
+    logger, records are dropped and counted when the ring is full.
+
+    Keyword arguments:
+    send_layout - Layout of the send SharedState
+    receive_layout - Layout of the receive SharedState
+    capacity - Number of records held by the ring (default 4096)
+    """
+
+    def __init__(self, send_layout, receive_layout, capacity=4096):
+        self.send_layout = send_layout
+        self.receive_layout = receive_layout
+        self.capacity = capacity
+        self.fields = create_log_fields(send_layout, receive_layout)
+        self.record = Struct("<" + "".join(field[1] for field in self.fields))
+        self.memory = shared_memory.SharedMemory(create=True, size=8 * LOG_HEADER + capacity * self.record.size)
+        self._attach()
+        for i in range(LOG_HEADER):
+            self.values[i] = 0
+
+    def _attach(self):
+        self.buffer = self.memory.buf
+        self.values = self.memory.buf[:8 * LOG_HEADER].cast("q")
+
+    def __getstate__(self):
+        return self.send_layout, self.receive_layout, self.capacity, self.memory.name
+
+    def __setstate__(self, state):
+        self.send_layout, self.receive_layout, self.capacity, name = state
+        self.fields = create_log_fields(self.send_layout, self.receive_layout)
+        self.record = Struct("<" + "".join(field[1] for field in self.fields))
+        self.memory = shared_memory.SharedMemory(name=name)
+        self._attach()
+
+    @property
+    def active(self):
+        return self.values[ACTIVE] == 1
+
+    @active.setter
+    def active(self, value):
+        self.values[ACTIVE] = 1 if value else 0
+
+    def write(self, send, receive):
+        """ Write one cycle, send and receive are SharedState snapshot sequences. """
+        values = self.values
+        written = values[WRITTEN]
+        if written - values[READ] >= self.capacity:
+            values[DROPPED] += 1
+            return
+        offset = 8 * LOG_HEADER + (written % self.capacity) * self.record.size
+        self.record.pack_into(self.buffer, offset, *receive[:1], *send[1:], *receive[1:])
+        values[WRITTEN] = written + 1
+
+    def drain(self):
+        """ Copy out all records written since the last drain as bytes. """
+        values = self.values
+        read = values[READ]
+        written = values[WRITTEN]
+        size = self.record.size
+        start = 8 * LOG_HEADER
+        first = read % self.capacity
+        count = written - read
+        if first + count <= self.capacity:
+            data = bytes(self.buffer[start + first * size:start + (first + count) * size])
+        else:
+            data = bytes(self.buffer[start + first * size:start + self.capacity * size]) + \
+                bytes(self.buffer[start:start + (first + count - self.capacity) * size])
+        values[READ] = written
+        return data
+
+    def close(self, unlink=False):
+        """ Release the shared memory, unlink removes the block once every process has closed it. """
+        self.values.release()
+        self.buffer = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+def npy_header(fields, count, length=None):
+    """ NumPy .npy version 1.0 header of a structured array of log records. """
+    descr = [(name, dtype) for name, _, dtype in fields]
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(descr, count)
+    if length is None:
+        length = -(-(len(NPY_MAGIC) + 4 + len(header) + NPY_RESERVE) // 64) * 64
+    header += " " * (length - len(NPY_MAGIC) - 4 - len(header) - 1) + "\n"
+    return NPY_MAGIC + b"\x01\x00" + Struct("<H").pack(len(header)) + header.encode("latin1")
+
+
+def read_npy_header(log_file):
+    """ Reads the header of a binary log, returns the log fields and the offset of the first record. """
+    if log_file.read(len(NPY_MAGIC)) != NPY_MAGIC:
+        raise ValueError("{} is not a binary RSI log".format(log_file.name))
+    major = log_file.read(2)[0]
+    if major == 1:
+        length = unpack("<H", log_file.read(2))[0]
     else:
-        status["Logging"] = "Logging complete"
+        length = unpack("<I", log_file.read(4))[0]
+    header = ast.literal_eval(log_file.read(length).decode("latin1"))
+    fields = []
+    for name, dtype in header["descr"]:
+        if dtype.endswith("u8"):
+            fields.append((name, "Q", dtype))
+        elif dtype.endswith("f8"):
+            fields.append((name, "d", dtype))
+        else:
+            fields.append((name, "{}s".format(dtype[2:]), dtype))
+    return fields, log_file.tell()
+
+
+def session_log_file(location):
+    """Opens a new binary log file in location, never overwriting the log of an earlier session.
+
+    The first session writes location/log.npy, later sessions location/log_1.npy, log_2.npy and so on.
+    :param location: Directory of the log file
+    :return: File name, file opened for binary writing
+    """
+    count = 0
+    while True:
+        name = os.path.join(location, "log.npy" if count == 0 else "log_{}.npy".format(count))
+        try:
+            return name, open(name, "xb", buffering=1 << 20)
+        except FileExistsError:
+            count += 1
+
+
+def log_process(log, status, location, rate=0.1):
+    """Process writing the binary log.
+
+    Drains the LogBuffer filled by the RSI server every rate seconds and appends the records
+    to a NumPy structured array file in location, see session_log_file. The file name is reported
+    in status["Log file"].
+    :param log: LogBuffer shared with the RSI process
+    :param status: Variable containing Manager.Dict variable with RSI status values
+    :param location: Directory of the log file
+    :param rate: Seconds between writes
+    :return:
+    """
+    count = 0
+    name, output_file = session_log_file(location)
+    status["Log file"] = name
+    with output_file:
+        header = npy_header(log.fields, 0)
+        output_file.write(header)
+        log.active = True
+        status["Logging"] = "Logging active"
+        while status["State"] is True:
+            data = log.drain()
+            output_file.write(data)
+            count += len(data) // log.record.size
+            sleep(rate)
+        log.active = False
+        data = log.drain()
+        output_file.write(data)
+        count += len(data) // log.record.size
+        # Record the final count so numpy.load reads the whole file
+        output_file.seek(0)
+        output_file.write(npy_header(log.fields, count, len(header)))
+    status["Logging"] = "Logging complete"
+
+
+def open_log(file_name, columns=None, mmap=False):
+    """Loads a binary log into columns.
+
+    Uses NumPy when available, otherwise array.array (list of str for string columns).
+    The record count is taken from the file size, so logs of an interrupted session can be read.
+    :param file_name: Binary log file
+    :param columns: Column names to load, all columns when None
+    :param mmap: Memory map the file instead of reading it, columns are read on access, NumPy only
+    :return: dict of column name to array
+    """
+    with open(file_name, "rb") as log_file:
+        fields, offset = read_npy_header(log_file)
+        data = None if mmap else log_file.read()
+    names = [field[0] for field in fields] if columns is None else list(columns)
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    if numpy is not None:
+        dtype = numpy.dtype([(name, dtype) for name, _, dtype in fields])
+        if mmap:
+            count = (os.path.getsize(file_name) - offset) // dtype.itemsize
+            records = numpy.memmap(file_name, dtype=dtype, mode="r", offset=offset, shape=(count,))
+        else:
+            records = numpy.frombuffer(data, dtype=dtype, count=len(data) // dtype.itemsize)
+        return {name: records[name] for name in names}
+    if mmap:
+        with open(file_name, "rb") as log_file:
+            log_file.seek(offset)
+            data = log_file.read()
+
+    record = Struct("<" + "".join(field[1] for field in fields))
+    count = len(data) // record.size
+    rows = list(zip(*record.iter_unpack(data[:count * record.size]))) or [[] for _ in fields]
+    values = {}
+    for index, (name, struct_format, _) in enumerate(fields):
+        if name not in names:
+            continue
+        if struct_format in ("Q", "d"):
+            values[name] = array(struct_format, rows[index])
+        else:
+            values[name] = [value.rstrip(b"\x00").decode("utf8", "ignore") for value in rows[index]]
+    return {name: values[name] for name in names}
+
+
+def convert_log_to_csv(file_name, csv_file_name):
+    """ Converts a binary log into a CSV file with a header row. """
+    with open(file_name, "rb") as log_file:
+        fields, _ = read_npy_header(log_file)
+        record = Struct("<" + "".join(field[1] for field in fields))
+        with open(csv_file_name, "w") as output_file:
+            file_writer = csv.writer(output_file, lineterminator='\n')
+            file_writer.writerow([field[0] for field in fields])
+            while True:
+                data = log_file.read(record.size * 4096)
+                for row in record.iter_unpack(data[:len(data) // record.size * record.size]):
+                    file_writer.writerow([value.rstrip(b"\x00").decode("utf8", "ignore")
+                                          if isinstance(value, bytes) else value for value in row])
+                if len(data) < record.size * 4096:
+                    break
 
 
 def open_csv(file_name):
@@ -24,6 +293,43 @@ def open_csv(file_name):
     return data
 
 
+def open_csv_log(file_name, columns=None):
+    """Loads a CSV log with a create_log header row into typed columns.
+
+    IPOC is read as integers, columns holding only numbers as floats and other columns as str.
+    Uses NumPy arrays when available, otherwise array.array.
+    :param file_name: CSV log file
+    :param columns: Column names to load, all columns when None
+    :return: dict of column name to array
+    """
+    with open(file_name, newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader)
+        names = header if columns is None else list(columns)
+        indices = [header.index(name) for name in names]
+        data = [[] for _ in names]
+        for row in reader:
+            for values, index in zip(data, indices):
+                values.append(row[index] if index < len(row) else "")
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    result = {}
+    for name, values in zip(names, data):
+        try:
+            if name == "IPOC":
+                typed = [int(value) for value in values]
+                result[name] = numpy.array(typed, dtype="<u8") if numpy else array("Q", typed)
+            else:
+                typed = [float(value) for value in values]
+                result[name] = numpy.array(typed) if numpy else array("d", typed)
+        except ValueError:
+            result[name] = values
+    return result
+
+
 def create_log(send, receive, entry_type):
     row = []
     for direction in (send, receive):
@@ -0,0 +1,277 @@
+from math import ceil, copysign, sqrt
+from multiprocessing import shared_memory
+from struct import Struct
+
+from src.RSIRI.state import double_struct
+from src.RSIRI.trajectory import create_slot_indices
+
+# Most axes of a move
+MAX_AXES = 6
+# int64 header slots: active, command generation (odd while a command is written), generation reached, profile
+MOTION_HEADER = 8
+ACTIVE, GENERATION, DONE, PROFILE = range(4)
+PROFILES = {"trapezoidal": 0, "s-curve": 1}
+# Moves pair a correction variable with the measured position it corrects
+MOVES = {"RKorr": "RIst", "AKorr": "AIPos"}
+# Distance treated as reached
+TOLERANCE = 1e-9
+
+
+class ProfileGenerator:
+    """Online motion profile of up to MAX_AXES independent axes.
+
+    Limits and outputs are in per cycle units: the velocity limit is the largest correction
+    per cycle, the acceleration limit the largest change of correction per cycle and the
+    jerk limit the largest change of that per cycle.
+
+    The trapezoidal profile limits velocity and acceleration. It follows its own commanded
+    position, started from the measured position, and steps exactly onto the target instead
+    of passing it, so it never overshoots or oscillates. The s-curve profile passes the
+    trapezoidal corrections through a moving average over 2.25 * acceleration / jerk cycles,
+    which limits the jerk while keeping the total correction and the no overshoot property.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.s_curve = False
+        self.position = [0.0] * MAX_AXES
+        self.velocity = [0.0] * MAX_AXES
+        self.target = [0.0] * MAX_AXES
+        self.velocity_limit = [0.0] * MAX_AXES
+        self.acceleration_limit = [0.0] * MAX_AXES
+        self.jerk_limit = [0.0] * MAX_AXES
+        self.step = [0.0] * MAX_AXES
+        # Moving average of the s-curve profile: output position, window, running sum, cycles on target
+        self.output = [0.0] * MAX_AXES
+        self.window = [[0.0] for _ in range(MAX_AXES)]
+        self.total = [0.0] * MAX_AXES
+        self.settled = [0] * MAX_AXES
+        self.cycle = 0
+
+    def start(self, position):
+        """ Start from a measured position at rest, sizing the s-curve window from the current limits. """
+        self.cycle = 0
+        for i in range(self.count):
+            self.position[i] = self.output[i] = position[i]
+            self.velocity[i] = 0.0
+            self.total[i] = 0.0
+            self.settled[i] = 0
+            # The trapezoidal acceleration can swing by up to 2.25 times its limit within a cycle
+            length = max(1, ceil(2.25 * self.acceleration_limit[i] / self.jerk_limit[i])) if self.s_curve else 1
+            self.window[i] = [0.0] * length
+
+    def update(self):
+        """Compute the correction of the next cycle into self.step.
+
+        :return: True once every axis is on target
+        """
+        reached = True
+        self.cycle += 1
+        for i in range(self.count):
+            error = self.target[i] - self.position[i]
+            velocity = self.velocity[i]
+            if abs(error) <= TOLERANCE and abs(velocity) <= TOLERANCE:
+                step = error
+                self.position[i] = self.target[i]
+                self.velocity[i] = 0.0
+            else:
+                a_max = self.acceleration_limit[i]
+                # Highest velocity that can still stop within distance, decelerating each cycle
+                brake = a_max * (sqrt(0.25 + 2 * abs(error) / a_max) - 0.5)
+                change = copysign(min(self.velocity_limit[i], brake), error) - velocity
+                velocity += max(-a_max, min(a_max, change))
+                if abs(error) <= abs(velocity) and velocity * error >= 0:
+                    # Last step lands on the target
+                    step = error
+                    self.position[i] = self.target[i]
+                    self.velocity[i] = 0.0
+                else:
+                    step = velocity
+                    self.position[i] += velocity
+                    self.velocity[i] = velocity
+
+            window = self.window[i]
+            length = len(window)
+            if length > 1:
+                slot = self.cycle % length
+                self.total[i] += step - window[slot]
+                window[slot] = step
+                if step == 0.0 and self.position[i] == self.target[i]:
+                    self.settled[i] += 1
+                else:
+                    self.settled[i] = 0
+                # Once the window has drained land exactly on the target
+                step = self.target[i] - self.output[i] if self.settled[i] >= length else self.total[i] / length
+                self.output[i] += step
+            else:
+                self.output[i] = self.position[i]
+            self.step[i] = step
+            if self.output[i] != self.target[i] or step != 0.0:
+                reached = False
+        return reached
+
+
+class MotionBuffer:
+    """Shared memory move command executed by a ProfileGenerator in the RSI process.
+
+    The client writes a target and limits, the RSI server computes the correction of each
+    telegram from the latest measured position (RIst for RKorr, AIPos for AKorr). Once the target
+    is reached the move is done and the send values are used again from the next telegram.
+
+    Keyword arguments:
+    send_layout - Layout of the send SharedState
+    receive_layout - Layout of the receive SharedState
+    """
+
+    def __init__(self, send_layout, receive_layout):
+        self.send_layout = send_layout
+        self.receive_layout = receive_layout
+        self._setup()
+        self.memory = shared_memory.SharedMemory(create=True, size=8 * MOTION_HEADER + self.command.size)
+        self._attach()
+        for i in range(MOTION_HEADER):
+            self.values[i] = 0
+
+    def _setup(self):
+        # key number, target, velocity, acceleration and jerk limits and remaining distance of each axis
+        self.command = Struct("<" + "d" * (1 + 5 * MAX_AXES))
+        send = create_slot_indices(self.send_layout)
+        receive = create_slot_indices(self.receive_layout)
+        send_attributes = dict((tag, attributes) for tag, attributes in self.send_layout if attributes)
+        receive_attributes = dict((tag, attributes) for tag, attributes in self.receive_layout if attributes)
+        # Snapshot indices of the corrections and measured positions of each move key
+        self.keys = []
+        self.attributes = []
+        self.indices = []
+        for key, measured in MOVES.items():
+            if key in send and measured in receive:
+                names = [a for a in send_attributes[key] if a in receive_attributes[measured]][:MAX_AXES]
+                self.keys.append(key)
+                self.attributes.append(names)
+                self.indices.append(([send[key][send_attributes[key].index(a)] for a in names],
+                                     [receive[measured][receive_attributes[measured].index(a)] for a in names]))
+        self.generator = ProfileGenerator()
+        self.generation = 0
+        self.number = 0
+        self.measured = [0.0] * MAX_AXES
+
+    def _attach(self):
+        self.buffer = self.memory.buf
+        self.values = self.memory.buf[:8 * MOTION_HEADER].cast("q")
+
+    def __getstate__(self):
+        return self.send_layout, self.receive_layout, self.memory.name
+
+    def __setstate__(self, state):
+        self.send_layout, self.receive_layout, name = state
+        self._setup()
+        self.memory = shared_memory.SharedMemory(name=name)
+        self._attach()
+
+    def move(self, key, target, velocity, acceleration=None, jerk=None, profile="trapezoidal"):
+        """Start a move, replacing any running move.
+
+        Raises ValueError, without touching a running move, when a limit is not positive or the
+        profile is unknown.
+        :param key: Correction variable, "RKorr" or "AKorr"
+        :param target: dict of attribute to target position
+        :param velocity: Largest correction per cycle
+        :param acceleration: Largest change of correction per cycle (default velocity / 25)
+        :param jerk: Largest change of acceleration per cycle, s-curve profile only (default acceleration / 10)
+        :param profile: "trapezoidal" or "s-curve"
+        :return:
+        """
+        number = self.keys.index(key)
+        names = self.attributes[number]
+        acceleration = velocity / 25 if acceleration is None else acceleration
+        jerk = acceleration / 10 if jerk is None else jerk
+        if velocity <= 0 or acceleration <= 0 or jerk <= 0:
+            raise ValueError("Motion limits must be positive")
+        if profile not in PROFILES:
+            raise ValueError("Unknown motion profile {!r}, use one of {}".format(profile, ", ".join(PROFILES)))
+        data = [float(number)]
+        for limits in ([target[a] for a in names], [velocity] * len(names),
+                       [acceleration] * len(names), [jerk] * len(names), [0.0] * len(names)):
+            data += [float(value) for value in limits] + [0.0] * (MAX_AXES - len(names))
+        self.values[GENERATION] += 1
+        self.command.pack_into(self.buffer, 8 * MOTION_HEADER, *data)
+        self.values[PROFILE] = PROFILES[profile]
+        self.values[GENERATION] += 1
+        self.values[ACTIVE] = 1
+
+    def stop(self):
+        """ Stop the move, the send values are used again from the next telegram. """
+        self.values[ACTIVE] = 0
+
+    def apply(self, snapshot, measured):
+        """Apply the next correction of the move to a send snapshot, called by the RSI server.
+
+        :param snapshot: SharedState snapshot of the send values
+        :param measured: SharedState of the receive values, read when a move starts
+        :return: The snapshot with the correction applied
+        """
+        values = self.values
+        if not values[ACTIVE]:
+            self.generation = 0
+            return snapshot
+        generator = self.generator
+        generation = values[GENERATION]
+        # A command being written is picked up on the next telegram
+        if generation != self.generation and not generation & 1:
+            command = self.command.unpack_from(self.buffer, 8 * MOTION_HEADER)
+            profile = values[PROFILE]
+            if values[GENERATION] != generation:
+                return snapshot
+            number = int(command[0])
+            generator.count = len(self.attributes[number])
+            generator.s_curve = profile == PROFILES["s-curve"]
+            for i in range(generator.count):
+                generator.target[i] = command[1 + i]
+                generator.velocity_limit[i] = command[1 + MAX_AXES + i]
+                generator.acceleration_limit[i] = command[1 + 2 * MAX_AXES + i]
+                generator.jerk_limit[i] = command[1 + 3 * MAX_AXES + i]
+            # A new move starts from the measured position, a changed target continues the running profile
+            if not self.generation or number != self.number:
+                position = measured.snapshot()
+                for i, index in enumerate(self.indices[number][1]):
+                    self.measured[i] = position[index]
+                generator.start(self.measured)
+            self.number = number
+            self.generation = generation
+
+        if not self.generation:
+            return snapshot
+        if generator.update():
+            values[DONE] = self.generation
+            values[ACTIVE] = 0
+            if values[GENERATION] != self.generation:
+                # A new move was written meanwhile
+                values[ACTIVE] = 1
+        snapshot = list(snapshot)
+        remaining = 8 * MOTION_HEADER + 8 * (1 + 4 * MAX_AXES)
+        for i, index in enumerate(self.indices[self.number][0]):
+            snapshot[index] = generator.step[i]
+            double_struct.pack_into(self.buffer, remaining + 8 * i, generator.target[i] - generator.output[i])
+        return snapshot
+
+    def progress(self):
+        """ Progress of the move. """
+        command = self.command.unpack_from(self.buffer, 8 * MOTION_HEADER)
+        number = int(command[0])
+        names = self.attributes[number] if number < len(self.attributes) else []
+        return {"active": bool(self.values[ACTIVE]),
+                "done": self.values[GENERATION] > 0 and self.values[DONE] == self.values[GENERATION],
+                "key": self.keys[number] if names else None,
+                "remaining": dict(zip(names, command[1 + 4 * MAX_AXES:1 + 4 * MAX_AXES + len(names)]))}
+
+    def close(self, unlink=False):
+        """ Release the shared memory, unlink removes the block once every process has closed it. """
+        self.values.release()
+        self.buffer = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,119 @@
+from multiprocessing import Process, Manager
+
+from src.RSIRI.client import RSIClient
+from src.RSIRI.multi_server import multi_rsi_process
+
+
+class RSIMultiClient:
+    """ RSI Client Object for a cell of several robots """
+
+    def __init__(self, files, cycle_rate=4, cache_dir=None, processes=1, cpus=None, priority=None, lock_memory=False,
+                 gc_control=False, precision=None):
+        """RSI Multi Client Object
+
+        Serves the RSI connections of several robots from a small pool of processes sharing one
+        Manager, instead of a process and a Manager per robot. Each robot is an RSIClient with its
+        own compiled config and state, accessed by index.
+        :param files: RSI Config File of each robot, every config needs its own port
+        :param cycle_rate: RSI cycle rate in ms (4 or 12)
+        :param cache_dir: Directory caching compiled config files, see load_config
+        :param processes: Number of processes serving the connections
+        :param cpus: CPUs to pin the processes to, e.g. {2, 3}, process n is pinned to the n-th CPU in
+                     ascending order, wrapping around
+        :param priority: SCHED_FIFO priority of the processes, see RSIClient
+        :param lock_memory: Lock the process memory into RAM, see RSIClient
+        :param gc_control: Collect garbage between cycles, see RSIClient
+        :param precision: Digits after the decimal point of sent numbers, see RSIClient
+        The real-time settings applied by process n are reported in status["Realtime n"].
+        """
+        self.manager = Manager()
+        self.status = self.manager.dict({"State": False, "Logging": False, "Error": ""})
+        self.robots = [RSIClient(file, cycle_rate, cache_dir, self.status, precision=precision) for file in files]
+        ports = [robot.port for robot in self.robots]
+        if len(set(ports)) != len(ports):
+            self.close()
+            raise ValueError("Every robot needs its own port, got {}".format(ports))
+        self.processes = max(1, min(processes, len(self.robots)))
+        self.realtime = {"cpus": cpus, "priority": priority, "lock": lock_memory, "collect": gc_control}
+        self.rsi = self.create_processes()
+
+    def create_processes(self):
+        """
+        RSI Network processes, started by start
+        :return: list of Process
+        """
+        processes = []
+        cpus = sorted(self.realtime["cpus"] or ())
+        for n in range(self.processes):
+            sessions = [robot.session for robot in self.robots[n::self.processes]]
+            realtime = dict(self.realtime, cpus={cpus[n % len(cpus)]} if cpus else None)
+            processes.append(Process(target=multi_rsi_process,
+                                     args=(sessions, self.status, realtime, 0.1, "Realtime {}".format(n))))
+        return processes
+
+    def __getitem__(self, index):
+        return self.robots[index]
+
+    def __iter__(self):
+        return iter(self.robots)
+
+    def __len__(self):
+        return len(self.robots)
+
+    def start(self):
+        """
+        Start the RSI Network processes
+        :return:
+        """
+        for robot in self.robots:
+            robot.watchdog.reset()
+        self.status["State"] = True
+        for process in self.rsi:
+            process.start()
+        for robot in self.robots:
+            if robot.logging is not False:
+                robot.logging.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the RSI Network processes, ramping the corrections of every robot to zero first, see Watchdog
+        The processes can be started again.
+        :param timeout: Seconds to wait for each process before it is terminated
+                        (default None, the longest watchdog stop time plus 1 s)
+        :return:
+        """
+        for robot in self.robots:
+            robot.watchdog.request_stop()
+        if timeout is None:
+            timeout = max(robot.watchdog.stop_time for robot in self.robots) + 1
+        for process in self.rsi:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.status["State"] = False
+        for robot in self.robots:
+            if robot.logging is not False:
+                robot.logging.join()
+                robot.enable_logging()
+        self.rsi = self.create_processes()
+
+    def close(self):
+        """
+        Release the shared memory blocks of every robot, the client can not be used afterwards
+        :return:
+        """
+        for robot in self.robots:
+            robot.close()
+        self.manager.shutdown()
+
+    def cycle_statistics(self):
+        """
+        Timing statistics of the last RSI cycles of each robot, see CycleTimer.statistics
+        :return: dict of port to statistics
+        """
+        return {robot.port: robot.cycle_statistics() for robot in self.robots}
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,100 @@
+import logging
+import selectors
+from time import monotonic, perf_counter_ns
+
+from src.RSIRI.realtime import apply_realtime
+from src.RSIRI.server import RSIServer
+
+logger = logging.getLogger(__name__)
+
+
+def multi_rsi_process(sessions, status, realtime=None, poll=0.1, name="Realtime"):
+    """Process serving several RSI connections from a single loop.
+
+    :param sessions: list of rsi_process argument tuples, one per robot
+    :param status: Variable containing Manager.Dict variable with RSI status values, the loop ends when State is False
+    :param realtime: dict of apply_realtime keyword arguments, the report is written to status[name]
+    :param poll: Seconds between checks of the status
+    :param name: Status key of the real-time report
+    :return:
+    """
+    multi_server = MultiRSIServer(sessions, status)
+    if realtime:
+        status[name], multi_server.collector = apply_realtime(**realtime)
+    multi_server.run(poll)
+
+
+class MultiRSIServer:
+    """Serves many RSI connections from one selectors loop.
+
+    Each session keeps its own compiled config, RSIServer, Network socket, shared state and
+    buffers, the loop answers every socket that became readable.
+
+    Keyword arguments:
+    sessions - list of rsi_process argument tuples (file, send, receive, status, timing, log, trajectory, motion,
+               commands, servo, telemetry, watchdog)
+    status - Manager.Dict with RSI status values, the loop ends when State is False
+    """
+
+    def __init__(self, sessions, status):
+        self.status = status
+        self.selector = selectors.DefaultSelector()
+        self.servers = []
+        self.collector = None
+        for file, send, receive, session_status, *buffers in sessions:
+            server = RSIServer(file, receive, send, session_status, *buffers)
+            self.selector.register(server.network.udp_socket, selectors.EVENT_READ, server)
+            self.servers.append(server)
+            if server.watchdog is not None:
+                server.watchdog.start()
+
+    def stop(self):
+        """
+
+        :return:
+        """
+        self.selector.close()
+        for server in self.servers:
+            server.stop()
+
+    def remove(self, server):
+        """ Stop serving a session whose watchdog finished. """
+        self.selector.unregister(server.network.udp_socket)
+        self.servers.remove(server)
+        server.stop()
+
+    def run(self, poll=0.1):
+        """ Operates the RSI communication loop of all sessions.
+
+        The Manager status is only read every poll seconds, a proxy call takes longer than
+        answering a telegram. Sessions are removed once their watchdog finished a stop, the loop
+        ends when State is False or no session is left.
+        """
+        logger.debug("RSI Multi Server Waiting on %s connections", len(self.servers))
+        select = self.selector.select
+        check = monotonic() + poll
+        while True:
+            for key, _ in select(poll):
+                server = key.data
+                server.get_robot_data()
+                server.send_reply()
+                if server.watchdog is not None and server.watchdog.finished:
+                    self.remove(server)
+            if self.collector is not None:
+                self.collector.collect()
+            if monotonic() >= check:
+                # Sessions without telegrams within their watchdog timeout
+                now = perf_counter_ns()
+                for server in list(self.servers):
+                    watchdog = server.watchdog
+                    if watchdog is not None and now - server.received > watchdog.timeout * 1e9 and \
+                            watchdog.timed_out():
+                        self.remove(server)
+                if self.status["State"] is not True or not self.servers:
+                    break
+                check = monotonic() + poll
+        self.stop()
+
+
+if __name__ == '__main__':
+    pass
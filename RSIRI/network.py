@@ -1,37 +1,74 @@
 import logging
+import select
 from socket import socket, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_RCVBUF
 
 from src.RSIRI.tools import change_config_port
 
+logger = logging.getLogger(__name__)
+
+# Datagrams the socket receive buffer holds
+RECEIVE_DEPTH = 16
+
 
 class Network:
     """Network class for RSI networking.
 
+    Received datagrams are read into one preallocated buffer. receive returns a memoryview of
+    it, which is only valid until the next call. Datagrams queued behind the newest one are
+    stale telegrams the robot has already given up on. They are skipped and counted in stale.
+
     Keyword arguments:
     client_ip - IP address of the local network socket (default None)
     client_port - Port of the local network socket (default None)
+    echo - Bind the echo server port instead (default False)
+    size - Receive buffer size in bytes, see RSIConfig.receive_size (default 4096)
     """
 
-    def __init__(self, client_ip, client_port, echo=False):
+    def __init__(self, client_ip, client_port, echo=False, size=4096):
         self.client_address = (client_ip, change_config_port(client_port) if echo is True else client_port)
         self.udp_socket = socket(AF_INET, SOCK_DGRAM)
         self.udp_socket.bind(self.client_address)
-        self.udp_socket.setsockopt(SOL_SOCKET, SO_RCVBUF, 1)
+        self.udp_socket.setsockopt(SOL_SOCKET, SO_RCVBUF, RECEIVE_DEPTH * size)
         self.controller_ip = ("127.0.0.1", client_port)
-        logging.debug("Network Socket Established")
+        # Checks for queued datagrams without raising, select.poll is not available on every platform
+        self.poller = select.poll() if hasattr(select, "poll") else None
+        if self.poller is not None:
+            self.poller.register(self.udp_socket, select.POLLIN)
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.size = size
+        # Stale datagrams skipped and datagrams that filled the whole buffer
+        self.stale = 0
+        self.truncated = 0
+        logger.debug("Network Socket Established")
 
     def receive(self):
-        """Polls network, returns output an XML string."""
-        data, self.controller_ip = self.udp_socket.recvfrom(400)
-        return data
+        """Polls network, returns a memoryview of the newest XML message."""
+        recvfrom_into = self.udp_socket.recvfrom_into
+        buffer = self.buffer
+        size, address = recvfrom_into(buffer)
+        if self.poller is not None:
+            while self.poller.poll(0):
+                size, address = recvfrom_into(buffer)
+                self.stale += 1
+        if size == self.size:
+            self.truncated += 1
+        if address != self.controller_ip:
+            self.controller_ip = address
+        return self.view[:size]
 
     def send(self, message):
         """Send message to controller IP.
 
         Keyword arguments:
-        message - binary message (default binary)
+        message - encoded message, str messages are encoded as utf8
         """
-        self.udp_socket.sendto(bytes(message, "utf8"), self.controller_ip)
+        if isinstance(message, str):
+            message = message.encode("utf8")
+        self.udp_socket.sendto(message, self.controller_ip)
+
+    def close(self):
+        self.udp_socket.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,105 @@
+import ctypes
+import ctypes.util
+import gc
+import os
+
+# mlockall flags: pages mapped now and pages mapped later
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+def set_affinity(cpus):
+    """ Pin the current process to cpus, returns the status report. """
+    if not hasattr(os, "sched_setaffinity"):
+        return "not supported on this platform"
+    try:
+        os.sched_setaffinity(0, cpus)
+    except (OSError, ValueError) as error:
+        return "failed: {}".format(error)
+    return "pinned to CPUs {}".format(sorted(os.sched_getaffinity(0)))
+
+
+def set_priority(priority):
+    """ Run the current process with SCHED_FIFO priority, returns the status report. """
+    if not hasattr(os, "sched_setscheduler"):
+        return "not supported on this platform"
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    except PermissionError:
+        return "not permitted, needs CAP_SYS_NICE or an RLIMIT_RTPRIO of at least {}".format(priority)
+    except OSError as error:
+        return "failed: {}".format(error)
+    return "SCHED_FIFO priority {}".format(priority)
+
+
+def lock_memory():
+    """ Lock current and future pages of the process into RAM, returns the status report. """
+    name = ctypes.util.find_library("c")
+    if os.name != "posix" or name is None:
+        return "not supported on this platform"
+    libc = ctypes.CDLL(name, use_errno=True)
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        number = ctypes.get_errno()
+        return "failed: {}".format(os.strerror(number))
+    return "locked"
+
+
+def apply_realtime(cpus=None, priority=None, lock=False, collect=False):
+    """Apply real-time settings to the current process.
+
+    Settings that are not permitted are reported and skipped, the process keeps running.
+    Call after setup, the CycleCollector freezes the objects created so far.
+    :param cpus: CPUs to pin the process to (default None, not pinned)
+    :param priority: SCHED_FIFO priority 1-99 (default None, default scheduling)
+    :param lock: Lock the process memory with mlockall (default False)
+    :param collect: Disable automatic garbage collection, see CycleCollector (default False)
+    :return: dict of setting to status report, only requested settings are included,
+             CycleCollector to call after each reply or None
+    """
+    report = {}
+    if cpus:
+        report["CPUs"] = set_affinity(cpus)
+    if priority:
+        report["Priority"] = set_priority(priority)
+    if lock:
+        report["Memory"] = lock_memory()
+    collector = None
+    if collect:
+        collector = CycleCollector()
+        report["GC"] = "collected between cycles, thresholds {}".format(collector.thresholds)
+    return report, collector
+
+
+class CycleCollector:
+    """Runs garbage collection between RSI cycles instead of during them.
+
+    Disables automatic collection and freezes the objects created during setup, so later
+    collections only traverse objects allocated by the loop. collect is called after each
+    reply and collects the oldest generation whose threshold was reached, using the
+    thresholds automatic collection would use.
+    """
+
+    def __init__(self):
+        self.thresholds = gc.get_threshold()
+        self.collections = 0
+        gc.disable()
+        gc.collect()
+        gc.freeze()
+
+    def collect(self):
+        counts = gc.get_count()
+        if counts[0] < self.thresholds[0]:
+            return
+        generation = 0
+        if counts[1] + 1 >= self.thresholds[1]:
+            generation = 2 if counts[2] + 1 >= self.thresholds[2] else 1
+        gc.collect(generation)
+        self.collections += 1
+
+    def close(self):
+        gc.unfreeze()
+        gc.enable()
+
+
+if __name__ == '__main__':
+    pass
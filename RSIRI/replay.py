@@ -0,0 +1,171 @@
+from time import perf_counter, sleep
+
+from src.RSIRI.analysis import gap_statistics, load_log
+from src.RSIRI.commands import CommandBuffer
+from src.RSIRI.config import load_config
+from src.RSIRI.decoder import ReceiveDecoder
+from src.RSIRI.log import create_log_columns
+from src.RSIRI.motion import MotionBuffer
+from src.RSIRI.server import RSIServer
+from src.RSIRI.state import SharedState, from_slot, to_float
+from src.RSIRI.template import SendTemplate
+from src.RSIRI.timing import CycleTimer
+from src.RSIRI.tools import add_ipoc, remove_ipoc
+from src.RSIRI.trajectory import TrajectoryBuffer
+
+
+class ReplayNetwork:
+    """ Stands in for the Network socket of a replayed RSIServer, keeping the last reply. """
+
+    def __init__(self):
+        self.reply = None
+        self.sent = 0
+
+    def send(self, message):
+        self.reply = message
+        self.sent += 1
+
+    def close(self):
+        pass
+
+
+class LogReplay:
+    """Replays the robot telegrams of a log through RSIServer.
+
+    Each logged cycle is rebuilt into the telegram the robot sent and answered by an RSIServer
+    with the same buffers as RSIClient (trajectory, motion and commands). The replies are
+    compared with the send values of the log, so changes of control code can be checked
+    against recorded sessions. Control code runs in control, called with the replay after each
+    telegram is decoded and before it is answered.
+
+    Keyword arguments:
+    config_file - RSI config file or compiled RSIConfig the log was recorded with
+    log_file - Binary or CSV log of the session
+    speed - Replayed time per wall clock time, 0 replays as fast as possible (default 0)
+    cycle_rate - RSI cycle rate in ms (default 4)
+    control - Called with the replay every cycle (default None)
+    tolerance - Difference of a numeric send value counted as a mismatch (default 1e-6)
+    """
+
+    def __init__(self, config_file, log_file, speed=0.0, cycle_rate=4, control=None, tolerance=1e-6):
+        self.config = load_config(config_file)
+        self.speed = speed
+        self.cycle_rate = cycle_rate
+        self.control = control
+        self.tolerance = tolerance
+        self.send = SharedState(self.config.send_values)
+        self.receive = SharedState(self.config.receive_values)
+        self.timing = CycleTimer(cycle_rate)
+        self.trajectory = TrajectoryBuffer(self.send.layout)
+        self.motion = MotionBuffer(self.send.layout, self.receive.layout)
+        self.commands = CommandBuffer(self.send.layout)
+        self.network = ReplayNetwork()
+        self.status = {"State": True, "Logging": False, "Error": ""}
+        self.server = RSIServer(self.config, self.send, self.receive, self.status, self.timing, None, self.trajectory,
+                                self.motion, self.commands, network=self.network)
+        # Robot telegrams are rebuilt with the receive layout, replies decoded with the send layout
+        self.telegram = SendTemplate(add_ipoc(self.config.receive_string))
+        self.reply_decoder = ReceiveDecoder(remove_ipoc(self.config.send_string))
+
+        self.columns = create_log_columns(self.send.layout, self.receive.layout)
+        self.log = load_log(log_file)
+        missing = [name for name, direction, _, _ in self.columns if direction == "receive" and name not in self.log]
+        if missing:
+            self.close()
+            raise ValueError("{} was not recorded with this config, missing {}".format(log_file, missing))
+        self.values = self.config.create_values("receive")
+        self.cycle = 0
+        self.mismatched = 0
+        self.difference = {}
+        self.replayed = {name: [] for name, direction, _, attribute in self.columns
+                         if direction == "send" and attribute is not None and name in self.log}
+
+    def __len__(self):
+        return len(self.log["IPOC"])
+
+    def telegram_values(self, index):
+        """ Robot values of a logged cycle as a receive values dict. """
+        values = self.values
+        for name, direction, tag, attribute in self.columns:
+            if direction != "receive" or tag == "IPOC":
+                continue
+            value = self.log[name][index]
+            if attribute is None:
+                values[tag] = from_slot(tag, value) if isinstance(value, bytes) else value
+            else:
+                values[tag][attribute] = float(value)
+        return values
+
+    def compare(self, index, reply):
+        """ Compares a reply with the logged send values, returns True when they match. """
+        values, _ = self.reply_decoder.decode(reply)
+        matched = True
+        for name, direction, tag, attribute in self.columns:
+            if direction != "send" or name not in self.log:
+                continue
+            recorded = self.log[name][index]
+            if attribute is None:
+                recorded = from_slot(tag, recorded) if isinstance(recorded, bytes) else str(recorded)
+                matched = matched and recorded == values[tag]
+                continue
+            replayed = to_float(values[tag][attribute])
+            self.replayed[name].append(replayed)
+            difference = abs(replayed - float(recorded))
+            if difference > self.difference.get(name, 0.0):
+                self.difference[name] = difference
+            matched = matched and difference <= self.tolerance
+        return matched
+
+    def step(self):
+        """ Replay the next logged cycle, returns False at the end of the log. """
+        if self.cycle >= len(self):
+            return False
+        index = self.cycle
+        ipoc = int(self.log["IPOC"][index])
+        # Encoded as the robot sends it
+        self.server.handle_robot_data(self.telegram.render(self.telegram_values(index), ipoc).encode("utf8"))
+        if self.control is not None:
+            self.control(self)
+        self.server.send_reply()
+        if not self.compare(index, self.network.reply):
+            self.mismatched += 1
+        self.cycle += 1
+        return True
+
+    def run(self, cycles=None):
+        """Replays the log, at the logged IPOC timing when speed is set.
+
+        :param cycles: Number of cycles to replay (default None, the whole log)
+        :return: statistics of the replay
+        """
+        start = perf_counter()
+        first = int(self.log["IPOC"][self.cycle]) if self.cycle < len(self) else 0
+        end = len(self) if cycles is None else min(len(self), self.cycle + cycles)
+        while self.cycle < end:
+            if self.speed:
+                due = start + (int(self.log["IPOC"][self.cycle]) - first) / 1000 / self.speed
+                delay = due - perf_counter()
+                if delay > 0:
+                    sleep(delay)
+            self.step()
+        return self.statistics(perf_counter() - start)
+
+    def statistics(self, elapsed=0.0):
+        """ Replayed and mismatched cycles, largest differences, gaps of the log and server timing. """
+        replayed_time = self.cycle * self.cycle_rate / 1000
+        return {"cycles": self.cycle,
+                "mismatched": self.mismatched,
+                "difference": dict(self.difference),
+                "log": gap_statistics(self.log["IPOC"][:self.cycle], self.cycle_rate),
+                "real_time_factor": replayed_time / elapsed if elapsed > 0 else 0.0,
+                "server": self.timing.statistics()}
+
+    def close(self):
+        """ Release the shared memory blocks, the replay can not be used afterwards. """
+        self.server.stop()
+        for shared in (self.send, self.receive, self.timing, self.trajectory, self.motion, self.commands):
+            shared.close(unlink=True)
+
+
+if __name__ == '__main__':
+    pass
@@ -1,57 +1,175 @@
-import PyKDL
+from functools import lru_cache
+
+import numpy as np
 
 
 def vec(vals):
+    import PyKDL
+
     return PyKDL.Vector(vals[0], vals[1], vals[2])
 
 
-joints = [{'segment': 'link1', 'joint': 'joint_a1', 'RotAxis': vec([0, 0, -1]), 'origin': vec([0, 0, 0.4])},
-          {'segment': 'link2', 'joint': 'joint_a2', 'RotAxis': vec([0, 1, 0]), 'origin': vec([0.025, 0, 0])},
-          {'segment': 'link3', 'joint': 'joint_a3', 'RotAxis': vec([0, 1, 0]), 'origin': vec([0.455, 0, 0])},
-          {'segment': 'link4', 'joint': 'joint_a4', 'RotAxis': vec([-1, 0, 0]), 'origin': vec([0, 0, 0.035])},
-          {'segment': 'link5', 'joint': 'joint_a5', 'RotAxis': vec([0, 1, 0]), 'origin': vec([0.42, 0, 0])},
-          {'segment': 'link6', 'joint': 'joint_a6', 'RotAxis': vec([-1, 0, 0]), 'origin': vec([0.08, 0, 0])}]
+# Rotation axis and origin of each joint of the KR chain
+axes = np.array([[0, 0, -1], [0, 1, 0], [0, 1, 0], [-1, 0, 0], [0, 1, 0], [-1, 0, 0]], dtype=float)
+origins = np.array([[0, 0, 0.4], [0.025, 0, 0], [0.455, 0, 0], [0, 0, 0.035], [0.42, 0, 0], [0.08, 0, 0]])
+
+joints = [{'segment': 'link{}'.format(i + 1), 'joint': 'joint_a{}'.format(i + 1),
+           'RotAxis': axes[i], 'origin': origins[i]} for i in range(6)]
 
 
 def jntarray(q):
+    import PyKDL
+
     qjnt = PyKDL.JntArray(6)
     for i in range(6):
         qjnt[i] = q[i]
     return qjnt
 
 
-q_lower = jntarray([-2.96705972839, -3.31612557879, -2.09439510239, -3.22885911619, -2.09439510239, -6.10865238198])
-q_upper = jntarray([2.96705972839, 0.785398163397, 2.72271363311, 3.22885911619, 2.09439510239, 6.10865238198])
-
-
 def make_segment(joint):
-    jt = PyKDL.Joint(joint['joint'], joint['origin'], joint['RotAxis'], PyKDL.Joint.RotAxis)
-    seg = PyKDL.Segment(joint['segment'], jt, PyKDL.Frame(joint['origin']))
+    import PyKDL
+
+    origin = vec(joint['origin'])
+    jt = PyKDL.Joint(joint['joint'], origin, vec(joint['RotAxis']), PyKDL.Joint.RotAxis)
+    seg = PyKDL.Segment(joint['segment'], jt, PyKDL.Frame(origin))
     return seg
 
 
-chain = PyKDL.Chain()
+def create_chain():
+    import PyKDL
+
+    chain = PyKDL.Chain()
+    for joint in joints:
+        chain.addSegment(make_segment(joint))
+    return chain
+
+
+@lru_cache(maxsize=None)
+def kdl_solvers():
+    """Chain, solvers and joint limits of the robot, built on first use and shared afterwards.
+
+    PyKDL is only imported here and by the functions using it, so importing the module does not need it.
+    :return: chain, position FK solver, velocity IK solver, position IK solver within the limits,
+             lower and upper joint limits in radians as JntArray
+    """
+    import PyKDL
+
+    q_lower = jntarray([-2.96705972839, -3.31612557879, -2.09439510239, -3.22885911619, -2.09439510239,
+                        -6.10865238198])
+    q_upper = jntarray([2.96705972839, 0.785398163397, 2.72271363311, 3.22885911619, 2.09439510239, 6.10865238198])
+    chain = create_chain()
+    fk_kdl = PyKDL.ChainFkSolverPos_recursive(chain)
+    ik_v_kdl = PyKDL.ChainIkSolverVel_pinv(chain)
+    ik_p_kdl = PyKDL.ChainIkSolverPos_NR_JL(chain, q_lower, q_upper, fk_kdl, ik_v_kdl)
+    return chain, fk_kdl, ik_v_kdl, ik_p_kdl, q_lower, q_upper
+
+
+# Module attributes built by kdl_solvers on first access
+_SOLVERS = {"chain": 0, "fk_kdl": 1, "ik_v_kdl": 2, "ik_p_kdl": 3, "q_lower": 4, "q_upper": 5}
 
-for joint in joints:
-    chain.addSegment(make_segment(joint))
 
-fk_kdl = PyKDL.ChainFkSolverPos_recursive(chain)
-ik_v_kdl = PyKDL.ChainIkSolverVel_pinv(chain)
-ik_p_kdl = PyKDL.ChainIkSolverPos_NR_JL(chain, q_lower, q_upper, fk_kdl, ik_v_kdl)
+def __getattr__(name):
+    if name in _SOLVERS:
+        return kdl_solvers()[_SOLVERS[name]]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
 def fk(q):
+    import PyKDL
+
     frame = PyKDL.Frame()
-    fk_kdl.JntToCart(q, frame)
+    kdl_solvers()[1].JntToCart(q, frame)
     return frame
 
 
 def ik(frame, q_guess):
+    import PyKDL
+
     q_res = PyKDL.JntArray(6)
-    ik_p_kdl.CartToJnt(q_guess, frame, q_res)
+    kdl_solvers()[3].CartToJnt(q_guess, frame, q_res)
     return q_res
 
 
+def frame_to_matrix(frame):
+    """ Convert a PyKDL.Frame into a 4x4 homogeneous transform. """
+    matrix = np.eye(4)
+    for i in range(3):
+        for j in range(3):
+            matrix[i, j] = frame.M[i, j]
+        matrix[i, 3] = frame.p[i]
+    return matrix
+
+
+def matrix_to_frame(matrix):
+    """ Convert a 4x4 homogeneous transform into a PyKDL.Frame. """
+    import PyKDL
+
+    return PyKDL.Frame(PyKDL.Rotation(*matrix[:3, :3].ravel().tolist()), vec(matrix[:3, 3].tolist()))
+
+
+def fk_batch(q):
+    """Forward kinematics of many joint positions with NumPy.
+
+    Computes the same chain as fk: each segment is the joint rotation, placed at the joint origin
+    relative to the previous segment.
+    :param q: Joint positions in radians, shape (N, 6)
+    :return: Homogeneous transforms of the tool, shape (N, 4, 4)
+    """
+    q = np.atleast_2d(np.asarray(q, dtype=float))
+    count = len(q)
+    cos = np.cos(q)
+    sin = np.sin(q)
+    result = np.broadcast_to(np.eye(4), (count, 4, 4)).copy()
+    segment = np.zeros((count, 4, 4))
+    segment[:, 3, 3] = 1.0
+
+    for i in range(6):
+        # Rodrigues rotation about the joint axis
+        x, y, z = axes[i]
+        c = cos[:, i, None, None]
+        s = sin[:, i, None, None]
+        cross = np.array([[0, -z, y], [z, 0, -x], [-y, x, 0]])
+        rotation = c * np.eye(3) + s * cross + (1 - c) * np.outer(axes[i], axes[i])
+        segment[:, :3, :3] = rotation
+        segment[:, :3, 3] = origins[i]
+        result = result @ segment
+    return result
+
+
+def ik_batch(frames, seeds=None):
+    """Inverse kinematics of many tool frames.
+
+    Without seeds, or with a single seed, the frames are treated as a trajectory and each
+    solution seeds the next frame. With one seed per frame each frame is solved independently.
+    :param frames: Homogeneous transforms, shape (N, 4, 4)
+    :param seeds: None, a seed of shape (6,) or seeds of shape (N, 6)
+    :return: Joint positions of shape (N, 6), success flags of shape (N,)
+    """
+    import PyKDL
+
+    frames = np.asarray(frames, dtype=float).reshape(-1, 4, 4)
+    count = len(frames)
+    seeds = np.zeros(6) if seeds is None else np.asarray(seeds, dtype=float)
+    warm_start = seeds.ndim == 1
+    solutions = np.empty((count, 6))
+    success = np.empty(count, dtype=bool)
+
+    ik_p_kdl = kdl_solvers()[3]
+    q_guess = jntarray(seeds if warm_start else seeds[0])
+    q_res = PyKDL.JntArray(6)
+    for n in range(count):
+        if not warm_start:
+            for i in range(6):
+                q_guess[i] = seeds[n, i]
+        success[n] = ik_p_kdl.CartToJnt(q_guess, matrix_to_frame(frames[n]), q_res) >= 0
+        for i in range(6):
+            solutions[n, i] = q_res[i]
+        # Seed the next frame with this solution
+        if warm_start and success[n]:
+            q_guess, q_res = q_res, q_guess
+    return solutions, success
+
+
 if __name__ == '__main__':
     q = jntarray([0.1, 0.0, 0.0, 0.0, 0.0, 0.0])
     frame = fk(q)
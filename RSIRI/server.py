@@ -1,67 +1,122 @@
 import logging
+from time import perf_counter_ns
 
+from src.RSIRI.config import load_config
 from src.RSIRI.network import Network
-from src.RSIRI.tools import \
-    get_ipoc, \
-    update_ipoc, \
-    convert_xml_string_to_dict, \
-    merge_dict_with_xml_string, \
-    convert_config_to_xml_string, \
-    extract_config_from_rsi_config
+from src.RSIRI.realtime import apply_realtime
+from src.RSIRI.timing import CycleTimer
+from src.RSIRI.tracing import create_trace, RECEIVED, SENT
 
 # Log file location
 # Define the log format
 log_format = '[%(asctime)s] %(levelname)-8s %(name)-12s %(funcName)20s() %(lineno)s %(message)s'
-# Define basic configuration
-logging.basicConfig(level=logging.DEBUG, format=log_format, handlers=[logging.StreamHandler()])
 logger = logging.getLogger(__name__)
 
 
-def rsi_process(file, send, receive, status):
+def configure_logging(level=logging.DEBUG):
+    """Logs to the console with the RSIRI log format.
+
+    Importing RSIRI leaves logging untouched, applications call this or configure logging themselves.
+    :param level: Logging level (default DEBUG)
+    """
+    logging.basicConfig(level=level, format=log_format, handlers=[logging.StreamHandler()])
+
+
+def rsi_process(file, send, receive, status, timing=None, log=None, trajectory=None, motion=None, commands=None,
+                servo=None, telemetry=None, watchdog=None, realtime=None):
     """Process containing the RSI networking functions
 
     This process operates the networking side of the RSI RI Functions.
-    :param file: RSI config file
-    :param send: Variable containing Manager.Dict variable with RSI values
-    :param receive: Variable containing Manager.Dict variable with RSI values
+    :param file: RSI config file or compiled RSIConfig
+    :param send: Variable containing SharedState variable with RSI values
+    :param receive: Variable containing SharedState variable with RSI values
     :param status: Variable containing Manager.Dict variable with RSI status values
+    :param timing: CycleTimer recording the timing of each cycle
+    :param log: LogBuffer receiving the values of each cycle
+    :param trajectory: TrajectoryBuffer of per cycle corrections
+    :param motion: MotionBuffer of the current move
+    :param commands: CommandBuffer of correction commands
+    :param servo: ServoBuffer of the cartesian servo target
+    :param telemetry: TelemetryRing the values of each cycle are published to
+    :param watchdog: Watchdog ending the process with a ramp to zero corrections
+    :param realtime: dict of apply_realtime keyword arguments, the report is written to status["Realtime"]
     :return:
     """
-    rsi_server = RSIServer(file, receive, send, status)
-    rsi_server.state = True
+    rsi_server = RSIServer(file, receive, send, status, timing, log, trajectory, motion, commands, servo,
+                           telemetry, watchdog)
+    if realtime:
+        status["Realtime"], rsi_server.collector = apply_realtime(**realtime)
     rsi_server.run()
 
 
 class RSIServer:
-    def __init__(self, config_file, receive, send, status):
+    def __init__(self, config_file, receive, send, status, timing=None, log=None, trajectory=None, motion=None,
+                 commands=None, servo=None, telemetry=None, watchdog=None, network=None):
         """ RSI Communication Object.
 
             Main Object for operating an RSI connection.
 
             Keyword arguments:
-                config_file - *.rsi.xml config file (default None)
+                config_file - *.rsi.xml config file or compiled RSIConfig (default None)
                 client_ip - IP address of the local network socket (default None)
                 client_port - Port of the local network socket (default None)
+                timing - CycleTimer recording the timing of each cycle (default None, creates one)
+                log - LogBuffer receiving the values of each cycle (default None)
+                trajectory - TrajectoryBuffer of per cycle corrections (default None)
+                motion - MotionBuffer of the current move (default None)
+                commands - CommandBuffer of correction commands (default None)
+                servo - ServoBuffer of the cartesian servo target (default None)
+                telemetry - TelemetryRing the values of each cycle are published to (default None)
+                watchdog - Watchdog supervising the connection and ending run (default None, runs until terminated)
+                network - Object with send and close methods replacing the Network socket (default None)
             """
+        self.config = load_config(config_file)
         # Network connection Object
-        self.network = Network("", int(extract_config_from_rsi_config(config_file)[1]))
+        self.network = network if network is not None else Network("", self.config.port, size=self.config.receive_size)
         # RSI Variables
-        self.send_string = convert_config_to_xml_string(config_file, "send")
+        self.send_string = self.config.send_string
         self.send_values = receive
+        # Messages are encoded and decoded by the codec of the config, the precompiled
+        # codec formats only the send values that changed since the last reply
+        self.codec = self.config.codec
+        self.send_renderer = self.codec.renderer(self.send_values.layout)
 
-        self.receive_string = convert_config_to_xml_string(config_file, "receive")
+        self.receive_string = self.config.receive_string
         self.receive_values = send
 
         # Status (State": "Inactive", "Status": "", "Config": "")
         self.status = status
         self.ipoc = 0
 
+        # Cycle timing, perf_counter_ns timestamps of the current cycle
+        self.timing = timing if timing is not None else CycleTimer()
+        self.received = 0
+        self.decoded = 0
+        self.log = log
+        self.trajectory = trajectory
+        self.motion = motion
+        self.commands = commands
+        self.servo = servo
+        if servo is not None:
+            servo.prepare()
+        self.telemetry = telemetry
+        self.watchdog = watchdog
+        # Wake up without telegrams to check for a stop request
+        if watchdog is not None and hasattr(self.network, "udp_socket"):
+            self.network.udp_socket.settimeout(watchdog.timeout)
+        # CycleCollector running garbage collection after each reply (default None, automatic collection)
+        self.collector = None
+        # Telegrams are traced when the logger is enabled for DEBUG as the server is created
+        self.trace = create_trace(logger, max(self.config.send_size, self.config.receive_size))
+
     def stop(self):
         """
 
         :return:
         """
-        self.network.udp_socket.close()
+        self.network.close()
+        if self.trace is not None:
+            self.trace.stop()
 
     def run(self):
         """ Operates RSI communication loop.
@@ -70,12 +125,22 @@ class RSIServer:
         polling client pipe, processing data _working sending a reply
         """
         logger.debug("RSI Server Waiting")
-
-        while True:
-            self.get_robot_data()
+        watchdog = self.watchdog
+        if watchdog is not None:
+            watchdog.start()
+
+        while watchdog is None or not watchdog.finished:
+            try:
+                self.get_robot_data()
+            except TimeoutError:
+                if watchdog is not None and watchdog.timed_out():
+                    break
+                continue
             self.send_reply()
-        else:
-            self.stop()
+            if self.collector is not None:
+                self.collector.collect()
+        self.stop()
+        logger.debug("RSI Server Stopped")
 
     def get_robot_data(self):
         """ Get RSI data from robot _working process.
@@ -83,22 +148,58 @@ class RSIServer:
         Polls network socket _working then updates RSIValues.values
         Gets IPOC from message _working updates self.ipoc
         """
-        # Polls network, returns a string of XML
-        self.receive_string = self.network.receive()
-        # Get IPOC
-        self.ipoc = get_ipoc(self.receive_string)
-        # Convert XML string into Dict
-        self.receive_values.update(convert_xml_string_to_dict(self.receive_string))
+        # Polls network, returns the newest XML message in the reused receive buffer
+        self.handle_robot_data(self.network.receive())
+        self.timing.record_stale(self.network.stale)
+
+    def handle_robot_data(self, message):
+        """ Process an RSI message received from the robot. """
+        self.receive_string = message
+        self.received = perf_counter_ns()
+        # Get IPOC and convert XML string into typed values in a single pass
+        values, self.ipoc = self.codec.decode(self.receive_string)
+        self.timing.record_fallbacks(self.codec.fallbacks)
+        if self.trace is not None:
+            self.trace.record(RECEIVED, self.ipoc, message)
+        self.receive_values.update(values)
+        if self.watchdog is not None:
+            self.watchdog.received(self.ipoc)
+        self.decoded = perf_counter_ns()
 
     def send_reply(self):
         """ Send RSI Message.
 
         Updates IPOC of message _working sends the RSIValues Object .xml values
         """
-        new_string = merge_dict_with_xml_string(self.send_values, self.send_string)
-        new_string = update_ipoc(new_string, self.ipoc)
-        self.send_string = new_string
+        # Single snapshot of the shared values, then format the changed values into the precompiled template
+        send_snapshot = self.send_values.snapshot()
+        # Commands due at this IPOC, trajectory and motion corrections take precedence
+        if self.commands is not None:
+            send_snapshot = self.commands.apply(send_snapshot, self.ipoc)
+        # Exactly one queued correction per telegram
+        if self.trajectory is not None:
+            send_snapshot = self.trajectory.apply(send_snapshot, self.ipoc)
+        if self.motion is not None:
+            send_snapshot = self.motion.apply(send_snapshot, self.receive_values)
+        if self.servo is not None:
+            send_snapshot = self.servo.apply(send_snapshot, self.receive_values)
+        # Stop and fault ramps scale whatever would be sent
+        if self.watchdog is not None:
+            send_snapshot = self.watchdog.apply(send_snapshot)
+        self.send_string = self.send_renderer.render(send_snapshot, self.ipoc)
+        merged = perf_counter_ns()
         self.network.send(self.send_string)
+        self.timing.record(self.ipoc, self.received, self.decoded, merged, perf_counter_ns())
+        if self.trace is not None:
+            self.trace.record(SENT, self.ipoc, self.send_string)
+        # Log and publish exactly the values that were sent
+        logging_active = self.log is not None and self.log.active
+        if logging_active or self.telemetry is not None:
+            receive_snapshot = self.receive_values.snapshot()
+            if logging_active:
+                self.log.write(send_snapshot, receive_snapshot)
+            if self.telemetry is not None:
+                self.telemetry.publish(send_snapshot, receive_snapshot)
 
 
 if __name__ == '__main__':
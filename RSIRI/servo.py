@@ -0,0 +1,259 @@
+from math import degrees, radians, sqrt
+from multiprocessing import shared_memory
+from struct import Struct
+from time import perf_counter_ns
+
+from src.RSIRI.state import double_struct
+from src.RSIRI.trajectory import create_slot_indices
+
+try:
+    import PyKDL
+except ImportError:
+    PyKDL = None
+
+# int64 header slots: active, command generation (odd while a command is written), mode, cycles servoed,
+# cycles since the last command, solver failures, clamped cycles, solve time total, largest and last in ns
+SERVO_HEADER = 12
+ACTIVE, GENERATION, MODE, CYCLES, AGE, FAILURES, CLAMPED, SOLVE_TOTAL, SOLVE_MAX, SOLVE_LAST = range(10)
+MODES = {"twist": 0, "pose": 1}
+# Command doubles: target X, Y, Z, A, B, C, gain, linear, angular and joint limits, twist timeout
+COMMAND_SIZE = 11
+# Servoing corrects the joints from the measured joints
+JOINTS = ("AKorr", "AIPos")
+
+
+class ServoBuffer:
+    """Cartesian servoing in the RSI process.
+
+    The client writes a twist (X, Y, Z in mm and A, B, C in degrees per cycle, base frame) or a
+    pose target (X, Y, Z, A, B, C as RIst), as often as a sensor delivers them. In both A, B, C are
+    rotations about Z, Y and X, as in RIst. Each telegram the RSI server reads the measured AIPos,
+    solves the joint velocities of the twist with the velocity IK of robots.py and sends them as
+    AKorr in degrees per cycle. A pose target is servoed with the twist gain * pose error. The twist
+    is limited to the linear and angular limits, the joint corrections to the joint limit and
+    to the joint range q_lower to q_upper.
+
+    The KDL solver, joint arrays and frames are created once and reused every cycle. robots.py
+    is only loaded by prepare, which the RSI server calls before its first telegram. A twist
+    is only applied for timeout cycles after it was written, so a stalled sensor stops the robot.
+
+    Keyword arguments:
+    send_layout - Layout of the send SharedState
+    receive_layout - Layout of the receive SharedState
+    """
+
+    def __init__(self, send_layout, receive_layout):
+        self.send_layout = send_layout
+        self.receive_layout = receive_layout
+        self._setup()
+        self.memory = shared_memory.SharedMemory(create=True, size=8 * SERVO_HEADER + self.command.size)
+        self._attach()
+        for i in range(SERVO_HEADER):
+            self.values[i] = 0
+
+    def _setup(self):
+        # Command followed by the position and orientation error written by the server
+        self.command = Struct("<" + "d" * (COMMAND_SIZE + 2))
+        send = create_slot_indices(self.send_layout)
+        receive = create_slot_indices(self.receive_layout)
+        correction, measured = JOINTS
+        self.available = correction in send and measured in receive and \
+            len(send[correction]) >= 6 and len(receive[measured]) >= 6
+        self.indices = (send[correction][:6], receive[measured][:6]) if self.available else ([], [])
+        self.generation = 0
+        self.target = (0.0,) * COMMAND_SIZE
+        self.mode = MODES["twist"]
+        self.solvers = None
+        if PyKDL is not None:
+            self.q = PyKDL.JntArray(6)
+            self.qdot = PyKDL.JntArray(6)
+            self.twist = PyKDL.Twist()
+            self.frame = PyKDL.Frame()
+            self.goal = PyKDL.Frame()
+        self.step = [0.0] * 6
+
+    def _attach(self):
+        self.buffer = self.memory.buf
+        self.values = self.memory.buf[:8 * SERVO_HEADER].cast("q")
+
+    def __getstate__(self):
+        return self.send_layout, self.receive_layout, self.memory.name
+
+    def __setstate__(self, state):
+        self.send_layout, self.receive_layout, name = state
+        self._setup()
+        self.memory = shared_memory.SharedMemory(name=name)
+        self._attach()
+
+    def prepare(self):
+        """ Load the robot chain and solvers of robots.py, once per process. """
+        if PyKDL is not None and self.available and self.solvers is None:
+            from src.RSIRI.robots import kdl_solvers
+
+            _, fk_kdl, ik_v_kdl, _, q_lower, q_upper = kdl_solvers()
+            self.solvers = (fk_kdl, ik_v_kdl, q_lower, q_upper)
+
+    def write(self, mode, target, gain=0.1, linear=1.0, angular=0.1, joint=0.1, timeout=25):
+        """Start servoing or replace the target.
+
+        :param mode: "twist" or "pose"
+        :param target: X, Y, Z, A, B, C twist per cycle or pose, A, B, C are rotations about Z, Y and X as in RIst
+        :param gain: Fraction of the pose error corrected per cycle, pose mode only
+        :param linear: Largest cartesian correction in mm per cycle
+        :param angular: Largest rotation in degrees per cycle
+        :param joint: Largest joint correction in degrees per cycle
+        :param timeout: Cycles a twist is applied without a new one, twist mode only
+        :return:
+        """
+        if PyKDL is None:
+            raise ImportError("Servoing needs PyKDL")
+        if not self.available:
+            raise ValueError("Servoing needs 6 axis {} and {} in the config".format(*JOINTS))
+        target = [float(value) for value in target]
+        if len(target) != 6:
+            raise ValueError("Servo targets take 6 values, got {}".format(len(target)))
+        if gain <= 0 or linear <= 0 or angular <= 0 or joint <= 0 or timeout <= 0:
+            raise ValueError("Servo gain and limits must be positive")
+        if mode not in MODES:
+            raise ValueError("Unknown servo mode {!r}, use one of {}".format(mode, ", ".join(MODES)))
+        values = self.values
+        values[GENERATION] += 1
+        self.command.pack_into(self.buffer, 8 * SERVO_HEADER, *target, gain, linear, angular, joint, timeout, 0.0, 0.0)
+        values[MODE] = MODES[mode]
+        values[GENERATION] += 1
+        values[ACTIVE] = 1
+
+    def stop(self):
+        """ Stop servoing, the send values are used again from the next telegram. """
+        self.values[ACTIVE] = 0
+
+    def apply(self, snapshot, measured):
+        """Apply the joint corrections of the current target to a send snapshot, called by the RSI server.
+
+        :param snapshot: SharedState snapshot of the send values
+        :param measured: SharedState of the receive values
+        :return: The snapshot with the AKorr corrections applied
+        """
+        values = self.values
+        if not values[ACTIVE] or not self.available:
+            self.generation = 0
+            return snapshot
+        started = perf_counter_ns()
+        generation = values[GENERATION]
+        # A command being written is picked up on the next telegram
+        if generation != self.generation and not generation & 1:
+            target = self.command.unpack_from(self.buffer, 8 * SERVO_HEADER)
+            mode = values[MODE]
+            if values[GENERATION] == generation:
+                self.target = target[:COMMAND_SIZE]
+                self.mode = mode
+                self.generation = generation
+                values[AGE] = 0
+                if mode == MODES["pose"]:
+                    # A, B, C are rotations about Z, Y and X
+                    rotation = PyKDL.Rotation.RPY(radians(target[5]), radians(target[4]), radians(target[3]))
+                    origin = PyKDL.Vector(target[0] / 1000, target[1] / 1000, target[2] / 1000)
+                    self.goal = PyKDL.Frame(rotation, origin)
+        if not self.generation:
+            return snapshot
+        if self.solvers is None:
+            self.prepare()
+        fk_kdl, ik_v_kdl, q_lower, q_upper = self.solvers
+
+        q = self.q
+        qdot = self.qdot
+        twist = self.twist
+        target = self.target
+        position = measured.snapshot()
+        for i, index in enumerate(self.indices[1]):
+            q[i] = radians(position[index])
+
+        if self.mode == MODES["pose"]:
+            fk_kdl.JntToCart(q, self.frame)
+            error = PyKDL.diff(self.frame, self.goal)
+            for i in range(6):
+                twist[i] = target[6] * error[i]
+            linear_error = sqrt(error[0] ** 2 + error[1] ** 2 + error[2] ** 2)
+            angular_error = sqrt(error[3] ** 2 + error[4] ** 2 + error[5] ** 2)
+            errors = 8 * (SERVO_HEADER + COMMAND_SIZE)
+            double_struct.pack_into(self.buffer, errors, 1000 * linear_error)
+            double_struct.pack_into(self.buffer, errors + 8, degrees(angular_error))
+        else:
+            age = values[AGE] = values[AGE] + 1
+            stale = age > target[10]
+            for i in range(3):
+                twist[i] = 0.0 if stale else target[i] / 1000
+                # A, B, C are rotations about Z, Y and X, the twist holds the rotations about X, Y and Z
+                twist[5 - i] = 0.0 if stale else radians(target[i + 3])
+
+        clamped = False
+        # Scale the twist down to the cartesian limits, keeping its direction
+        for offset, limit in ((0, target[7] / 1000), (3, radians(target[8]))):
+            norm = sqrt(twist[offset] ** 2 + twist[offset + 1] ** 2 + twist[offset + 2] ** 2)
+            if norm > limit:
+                clamped = True
+                for i in range(offset, offset + 3):
+                    twist[i] *= limit / norm
+
+        if ik_v_kdl.CartToJnt(q, twist, qdot) < 0:
+            values[FAILURES] += 1
+            for i in range(6):
+                qdot[i] = 0.0
+
+        # Scale the joint corrections down to the joint limit, then keep every joint within its range
+        step = self.step
+        joint = radians(target[9])
+        largest = max(abs(qdot[i]) for i in range(6))
+        scale = joint / largest if largest > joint else 1.0
+        for i in range(6):
+            value = qdot[i] * scale
+            if q[i] + value > q_upper[i]:
+                value = max(q_upper[i] - q[i], 0.0)
+                clamped = True
+            elif q[i] + value < q_lower[i]:
+                value = min(q_lower[i] - q[i], 0.0)
+                clamped = True
+            step[i] = degrees(value)
+        clamped = clamped or scale < 1.0
+
+        snapshot = list(snapshot)
+        for i, index in enumerate(self.indices[0]):
+            snapshot[index] = step[i]
+        values[CYCLES] += 1
+        if clamped:
+            values[CLAMPED] += 1
+        duration = perf_counter_ns() - started
+        values[SOLVE_TOTAL] += duration
+        values[SOLVE_LAST] = duration
+        if duration > values[SOLVE_MAX]:
+            values[SOLVE_MAX] = duration
+        return snapshot
+
+    def progress(self):
+        """ Servo state, counters, solve time in microseconds and the remaining pose error. """
+        values = self.values
+        command = self.command.unpack_from(self.buffer, 8 * SERVO_HEADER)
+        cycles = values[CYCLES]
+        return {"active": bool(values[ACTIVE]),
+                "mode": [mode for mode, number in MODES.items() if number == values[MODE]][0],
+                "cycles": cycles,
+                "failures": values[FAILURES],
+                "clamped": values[CLAMPED],
+                "stale": values[MODE] == MODES["twist"] and values[AGE] > command[10],
+                "solve_mean": values[SOLVE_TOTAL] / cycles / 1000 if cycles else 0.0,
+                "solve_max": values[SOLVE_MAX] / 1000,
+                "solve_last": values[SOLVE_LAST] / 1000,
+                "position_error": command[COMMAND_SIZE],
+                "orientation_error": command[COMMAND_SIZE + 1]}
+
+    def close(self, unlink=False):
+        """ Release the shared memory, unlink removes the block once every process has closed it. """
+        self.values.release()
+        self.buffer = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,256 @@
+import heapq
+import random
+import select
+from math import atan2, degrees, radians, sqrt
+from time import perf_counter
+
+from src.RSIRI.decoder import ReceiveDecoder
+from src.RSIRI.echo_server import RSIEchoServer
+from src.RSIRI.motion import MOVES
+from src.RSIRI.state import to_float
+from src.RSIRI.template import SendTemplate
+from src.RSIRI.tools import add_ipoc, remove_ipoc
+
+# Simulated seconds after which an unanswered telegram is counted as missing
+MISSING_AFTER = 1.0
+
+
+def load_fk_batch():
+    """ fk_batch of robots.py, None when it can not be imported. Loaded on first use, robots.py needs NumPy. """
+    try:
+        from src.RSIRI.robots import fk_batch
+    except ImportError:
+        return None
+    return fk_batch
+
+
+def matrix_to_pose(matrix):
+    """ X, Y, Z in mm and A, B, C in degrees (KUKA Z, Y, X Euler angles) of a homogeneous transform in m. """
+    pose = (1000 * matrix[0][3], 1000 * matrix[1][3], 1000 * matrix[2][3],
+            degrees(atan2(matrix[1][0], matrix[0][0])),
+            degrees(atan2(-matrix[2][0], sqrt(matrix[0][0] ** 2 + matrix[1][0] ** 2))),
+            degrees(atan2(matrix[2][1], matrix[2][2])))
+    # Python floats, NumPy scalars would be written into the telegram as np.float64(...)
+    return [float(value) for value in pose]
+
+
+class RSISimulator(RSIEchoServer):
+    """Deterministic RSI controller simulator.
+
+    Sends a telegram every cycle_rate ms of simulated time on an absolute deadline clock, the IPOC
+    advancing by cycle_rate per telegram. The RKorr and AKorr corrections of each reply are
+    integrated into the simulated robot and sent back as RIst and AIPos. When robots.py can be
+    imported RIst follows the forward kinematics of AIPos plus the integrated RKorr.
+
+    Latency, loss and reordering of the sent telegrams are drawn from a seeded generator, so runs
+    are repeatable. A reply arriving after the next telegram was due is late and its corrections
+    are ignored, as the controller would. In a cycle without a reply in time, corrections with
+    HOLDON="1" in the config repeat their last received value and all others are zero. Delay,
+    when present in the config, reports late and missing replies.
+
+    Keyword arguments:
+    config_file - RSI config file or compiled RSIConfig
+    cycle_rate - RSI cycle rate in ms (default 4)
+    speed - Simulated time per wall clock time, 0 runs as fast as the client answers (default 1)
+    latency - Delay of each sent telegram in ms (default 0)
+    jitter - Largest random extra delay of each sent telegram in ms (default 0)
+    loss - Probability a telegram is dropped (default 0)
+    reorder - Probability a telegram is held back and sent after the next one (default 0)
+    seed - Seed of the fault generator (default 0)
+    timeout - Wall clock seconds to wait for each reply when speed is 0 (default 1)
+    joints - Initial AIPos in degrees (default None, the config values)
+    """
+
+    def __init__(self, config_file, cycle_rate=4, speed=1.0, latency=0.0, jitter=0.0, loss=0.0, reorder=0.0, seed=0,
+                 timeout=1.0, joints=None):
+        super().__init__(config_file, cycle_rate)
+        self.template = SendTemplate(add_ipoc(self.config.receive_string))
+        self.decoder = ReceiveDecoder(remove_ipoc(self.config.send_string))
+        self.period = cycle_rate / 1000
+        self.speed = speed
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.loss = loss
+        self.reorder = reorder
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.counts = {"sent": 0, "dropped": 0, "reordered": 0, "replies": 0, "late": 0, "missing": 0,
+                       "unexpected": 0, "held": 0}
+        # Last received corrections of the HOLDON="1" fields, repeated in cycles without a reply
+        self.hold = {}
+        for field, held in self.config.hold.items():
+            tag, _, a = field.partition(".")
+            if held and a and tag in MOVES:
+                self.hold.setdefault(tag, {})[a] = 0.0
+
+        # Simulated robot: joints, measured cartesian pose without corrections and integrated RKorr
+        self.joints = self.axis_values("AIPos", joints)
+        self.pose = self.axis_values("RIst")
+        self.offset = {a: 0.0 for a in self.pose}
+        self.fk_batch = load_fk_batch() if len(self.joints) == 6 and len(self.pose) == 6 else None
+        self.kinematics = self.fk_batch is not None
+        self.update_robot(True)
+
+        self.ipoc = 0
+        self.cycle = 0
+        self.time = 0.0
+        self.start = 0.0
+        self.sequence = 0
+        # Telegrams waiting for their send time: (time, sequence, ipoc, message)
+        self.pending = []
+        self.held = None
+        # IPOC of sent telegrams to their reply deadline
+        self.outstanding = {}
+
+    def axis_values(self, tag, initial=None):
+        values = self.send_values.get(tag)
+        if not isinstance(values, dict):
+            return {}
+        if initial is not None:
+            return {a: float(v) for a, v in zip(values, initial)}
+        return {a: to_float(v) for a, v in values.items()}
+
+    def update_robot(self, moved):
+        """ Write the simulated robot into the telegram values, moved is True when the joints changed. """
+        if moved and self.kinematics:
+            pose = matrix_to_pose(self.fk_batch([[radians(q) for q in self.joints.values()]])[0])
+            self.pose = dict(zip(self.pose, pose))
+        if "AIPos" in self.send_values and self.joints:
+            self.send_values["AIPos"] = dict(self.joints)
+        if "RIst" in self.send_values and self.pose:
+            self.send_values["RIst"] = {a: self.pose[a] + self.offset[a] for a in self.pose}
+        delay = self.send_values.get("Delay")
+        if isinstance(delay, dict):
+            for a in delay:
+                delay[a] = self.counts["late"] + self.counts["missing"]
+
+    def integrate(self, values):
+        """ Apply the corrections of a reply to the simulated robot. """
+        moved = False
+        for key, measured in MOVES.items():
+            corrections = values.get(key)
+            if not isinstance(corrections, dict):
+                continue
+            target = self.joints if measured == "AIPos" else self.offset
+            for a, value in corrections.items():
+                if a in target:
+                    value = to_float(value)
+                    target[a] += value
+                    moved = moved or (value != 0.0 and target is self.joints)
+        self.update_robot(moved)
+
+    def clock(self):
+        """ Simulated seconds since run started. """
+        if self.speed:
+            return (perf_counter() - self.start) * self.speed
+        return self.time
+
+    def schedule(self, now, ipoc, message):
+        """ Queue a telegram for sending, applying loss, latency and reordering. """
+        draw = self.random.random()
+        if draw < self.loss:
+            self.counts["dropped"] += 1
+            return
+        send_time = now + self.latency + self.random.uniform(0.0, self.jitter)
+        if self.held is None and draw < self.loss + self.reorder:
+            self.held = (ipoc, message)
+            self.counts["reordered"] += 1
+            return
+        for ipoc, message in [(ipoc, message)] + ([self.held] if self.held is not None else []):
+            heapq.heappush(self.pending, (send_time, self.sequence, ipoc, message))
+            self.sequence += 1
+        self.held = None
+
+    def transmit(self, ipoc, message):
+        self.network.send(message)
+        # The controller expects the reply before its next cycle
+        self.outstanding[ipoc] = (ipoc // self.cycle_rate) * self.period
+        self.counts["sent"] += 1
+
+    def poll(self, timeout):
+        """ Wait up to timeout wall clock seconds for a reply and process it. """
+        udp_socket = self.network.udp_socket
+        if not select.select([udp_socket], [], [], max(timeout, 0.0))[0]:
+            return False
+        try:
+            size, _ = udp_socket.recvfrom_into(self.network.buffer)
+        except (BlockingIOError, ConnectionResetError):
+            return False
+        self.receive_string = self.network.view[:size]
+        values, ipoc = self.decoder.decode(self.receive_string)
+        deadline = self.outstanding.pop(ipoc, None)
+        if deadline is None:
+            self.counts["unexpected"] += 1
+        elif self.clock() > deadline:
+            self.counts["late"] += 1
+        else:
+            self.counts["replies"] += 1
+            self.receive_values.update(values)
+            self.integrate(values)
+            for tag, held in self.hold.items():
+                corrections = values.get(tag)
+                if isinstance(corrections, dict):
+                    for a in held:
+                        if a in corrections:
+                            held[a] = to_float(corrections[a])
+        return True
+
+    def step(self):
+        """ Simulate one controller cycle. """
+        now = self.cycle * self.period
+        deadline = now + self.period
+        self.ipoc += self.cycle_rate
+        replies = self.counts["replies"]
+        self.schedule(now, self.ipoc, self.template.render(self.send_values, self.ipoc).encode("utf8"))
+        while True:
+            while self.pending and self.pending[0][0] <= self.clock():
+                _, _, ipoc, message = heapq.heappop(self.pending)
+                self.transmit(ipoc, message)
+            if self.clock() >= deadline:
+                break
+            target = min(self.pending[0][0], deadline) if self.pending else deadline
+            if self.speed:
+                self.poll(self.start + target / self.speed - perf_counter())
+            else:
+                end = perf_counter() + self.timeout
+                # Replies still in time, the clock stands still while waiting
+                while any(d > self.time for d in self.outstanding.values()) and perf_counter() < end:
+                    self.poll(end - perf_counter())
+                self.time = target
+        if self.counts["replies"] == replies and self.hold:
+            # No correction arrived this cycle, the controller holds the HOLDON fields
+            self.counts["held"] += 1
+            self.integrate(self.hold)
+        for ipoc in [i for i, d in self.outstanding.items() if d < deadline - MISSING_AFTER]:
+            del self.outstanding[ipoc]
+            self.counts["missing"] += 1
+        self.cycle += 1
+
+    def run(self, cycles=None):
+        """ Operates the simulated controller for a number of cycles, or until status State is False.
+
+        :param cycles: Number of cycles to simulate (default None, run until stopped)
+        :return: statistics of the run
+        """
+        self.status["State"] = True
+        # Continue the clock of an earlier run
+        self.start = perf_counter() - (self.cycle * self.period / self.speed if self.speed else 0.0)
+        end = None if cycles is None else self.cycle + cycles
+        while self.status["State"] and (end is None or self.cycle < end):
+            self.step()
+        return self.statistics()
+
+    def statistics(self):
+        """ Counters of the run, simulated time and the achieved real time factor. """
+        stats = dict(self.counts)
+        stats["outstanding"] = len(self.outstanding)
+        stats["cycles"] = self.cycle
+        stats["ipoc"] = self.ipoc
+        stats["simulated_time"] = self.cycle * self.period
+        elapsed = perf_counter() - self.start
+        stats["real_time_factor"] = stats["simulated_time"] / elapsed if elapsed > 0 else 0.0
+        return stats
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,240 @@
+from multiprocessing import shared_memory
+from struct import Struct
+
+# Fixed width of string values (EStr, ComStatus, ...) in bytes
+STRING_SIZE = 128
+
+sequence_struct = Struct("<Q")
+ipoc_struct = Struct("<Q")
+double_struct = Struct("<d")
+string_struct = Struct("<{}s".format(STRING_SIZE))
+header_size = sequence_struct.size
+
+
+def to_float(value):
+    """ Converts a value to float, empty and invalid values become 0. """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def type_values(values):
+    """Values dict with the native types of its slots, see create_layout.
+
+    Multi value attributes become float, IPOC int and single values str.
+    :param values: dict as created by convert_rsi_config_to_dict
+    :return: new dict
+    """
+    typed = {}
+    for tag, value in values.items():
+        if isinstance(value, dict):
+            typed[tag] = {a: to_float(v) for a, v in value.items()}
+        elif tag == "IPOC":
+            typed[tag] = int(to_float(value))
+        else:
+            typed[tag] = "" if value is None else str(value)
+    return typed
+
+
+def from_slot(tag, value):
+    if tag == "IPOC":
+        return value
+    return value.rstrip(b"\x00").decode("utf8", "ignore")
+
+
+def create_layout(values):
+    """Creates the shared memory layout of an RSI values dict.
+
+    Multi value variables get a float64 slot per attribute, single value variables
+    a fixed width string slot and IPOC an unsigned 64 bit slot.
+    :param values: dict as created by convert_rsi_config_to_dict
+    :return: list of (tag, attributes) tuples, attributes is None for single values
+    """
+    layout = [("IPOC", None)]
+    for tag, value in values.items():
+        if tag == "IPOC":
+            continue
+        if isinstance(value, dict):
+            layout.append((tag, tuple(value.keys())))
+        else:
+            layout.append((tag, None))
+    return layout
+
+
+def snapshot_to_dict(layout, data):
+    """ Converts a snapshot tuple of a layout into a values dict. """
+    values = {}
+    index = 0
+    for tag, attributes in layout:
+        if attributes is None:
+            values[tag] = from_slot(tag, data[index])
+            index += 1
+        else:
+            values[tag] = dict(zip(attributes, data[index:index + len(attributes)]))
+            index += len(attributes)
+    return values
+
+
+def create_record(layout):
+    """Creates the struct and slot offsets of a layout.
+
+    :param layout: list as created by create_layout
+    :return: Struct of all slots,
+             dict of tag to slot offset (dict of attribute to offset for multi values),
+             dict of tag to (offset, Struct) covering all slots of the tag
+    """
+    record_format = "<"
+    offsets = {}
+    fields = {}
+    offset = header_size
+    for tag, attributes in layout:
+        if tag == "IPOC":
+            field_format = "Q"
+            offsets[tag] = offset
+        elif attributes is None:
+            field_format = "{}s".format(STRING_SIZE)
+            offsets[tag] = offset
+        else:
+            field_format = "d" * len(attributes)
+            offsets[tag] = {a: offset + i * double_struct.size for i, a in enumerate(attributes)}
+        fields[tag] = (offset, Struct("<" + field_format))
+        record_format += field_format
+        offset += fields[tag][1].size
+    return Struct(record_format), offsets, fields
+
+
+class SharedState:
+    """Fixed layout shared memory block holding one direction of RSI values.
+
+    Replaces the Manager dict shared between RSIClient and the RSI process, while
+    offering the same dict style access. Writers bump a sequence counter before
+    and after each write (seqlock), readers retry until they copy a consistent
+    snapshot. Each block is meant to have a single writing process.
+
+    Keyword arguments:
+    values - dict as created by convert_rsi_config_to_dict, used for layout and initial values
+    """
+
+    def __init__(self, values):
+        self.layout = create_layout(values)
+        self.record, self.offsets, self.fields = create_record(self.layout)
+        self.memory = shared_memory.SharedMemory(create=True, size=header_size + self.record.size)
+        self.buffer = self.memory.buf
+        self.update(values)
+
+    def __getstate__(self):
+        return self.layout, self.memory.name
+
+    def __setstate__(self, state):
+        self.layout, name = state
+        self.record, self.offsets, self.fields = create_record(self.layout)
+        self.memory = shared_memory.SharedMemory(name=name)
+        self.buffer = self.memory.buf
+
+    def _write(self, tag, value):
+        buffer = self.buffer
+        offset = self.offsets[tag]
+        if tag == "IPOC":
+            ipoc_struct.pack_into(buffer, offset, int(value))
+        elif isinstance(offset, dict):
+            # Typed values are packed as they are, anything else is converted
+            for a, v in value.items():
+                double_struct.pack_into(buffer, offset[a], v if v.__class__ is float else to_float(v))
+        else:
+            string_struct.pack_into(buffer, offset, str(value).encode("utf8")[:STRING_SIZE])
+
+    def update(self, values):
+        """ Write several values as one consistent update, unknown tags and attributes are ignored. """
+        buffer = self.buffer
+        sequence = sequence_struct.unpack_from(buffer, 0)[0] | 1
+        sequence_struct.pack_into(buffer, 0, sequence)
+        try:
+            for tag, value in values.items():
+                offset = self.offsets.get(tag)
+                if offset is None:
+                    continue
+                if isinstance(offset, dict):
+                    value = {a: v for a, v in value.items() if a in offset}
+                self._write(tag, value)
+        finally:
+            sequence_struct.pack_into(buffer, 0, sequence + 1)
+
+    def __setitem__(self, key, value):
+        offset = self.offsets[key]
+        if isinstance(offset, dict):
+            for a in value:
+                if a not in offset:
+                    raise KeyError("{}.{}".format(key, a))
+        buffer = self.buffer
+        sequence = sequence_struct.unpack_from(buffer, 0)[0] | 1
+        sequence_struct.pack_into(buffer, 0, sequence)
+        try:
+            self._write(key, value)
+        finally:
+            sequence_struct.pack_into(buffer, 0, sequence + 1)
+
+    def snapshot(self):
+        """ Consistent copy of all slots as a tuple in layout order. """
+        buffer = self.buffer
+        record = self.record
+        while True:
+            sequence = sequence_struct.unpack_from(buffer, 0)[0]
+            if sequence & 1:
+                continue
+            data = record.unpack_from(buffer, header_size)
+            if sequence_struct.unpack_from(buffer, 0)[0] == sequence:
+                return data
+
+    def copy(self):
+        """ Consistent copy of all values as a dict. """
+        return self.to_dict(self.snapshot())
+
+    def to_dict(self, data):
+        """ Converts a snapshot tuple into a values dict. """
+        return snapshot_to_dict(self.layout, data)
+
+    def __getitem__(self, key):
+        """ Consistent copy of a single value, multi values are returned as a dict. """
+        offset, field = self.fields[key]
+        buffer = self.buffer
+        while True:
+            sequence = sequence_struct.unpack_from(buffer, 0)[0]
+            if sequence & 1:
+                continue
+            data = field.unpack_from(buffer, offset)
+            if sequence_struct.unpack_from(buffer, 0)[0] == sequence:
+                break
+        attributes = self.offsets[key]
+        if isinstance(attributes, dict):
+            return dict(zip(attributes, data))
+        return from_slot(key, data[0])
+
+    def __contains__(self, key):
+        return key in self.offsets
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def keys(self):
+        return self.offsets.keys()
+
+    def items(self):
+        return self.copy().items()
+
+    def values(self):
+        return self.copy().values()
+
+    def close(self, unlink=False):
+        """ Release the shared memory, unlink removes the block once every process has closed it. """
+        self.buffer = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+if __name__ == '__main__':
+    pass
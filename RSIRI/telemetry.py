@@ -0,0 +1,162 @@
+from multiprocessing import shared_memory
+from struct import Struct
+from time import perf_counter_ns
+
+from src.RSIRI.log import create_log_fields
+from src.RSIRI.state import from_slot
+
+# int64 header slots of the telemetry ring: records published
+TELEMETRY_HEADER = 8
+PUBLISHED = 0
+# Each slot starts with the number of its record, -1 while the record is written
+stamp_struct = Struct("<q")
+
+
+class TelemetryRing:
+    """Shared memory broadcast ring of the values of every cycle.
+
+    The RSI server publishes the send and receive values of each telegram, with the same
+    columns as the binary log plus the perf_counter_ns time of the reply. Publishing never looks at
+    the readers, so its cost is the same for any number of subscribers. Each subscriber keeps its
+    own read position and reads at its own pace, the oldest records are overwritten when it
+    falls more than capacity records behind.
+
+    Keyword arguments:
+    send_layout - Layout of the send SharedState
+    receive_layout - Layout of the receive SharedState
+    capacity - Number of records held by the ring (default 1024)
+    """
+
+    def __init__(self, send_layout, receive_layout, capacity=1024):
+        self.send_layout = send_layout
+        self.receive_layout = receive_layout
+        self.capacity = capacity
+        self._setup()
+        self.memory = shared_memory.SharedMemory(create=True, size=8 * TELEMETRY_HEADER + capacity * self.slot)
+        self._attach()
+        for i in range(TELEMETRY_HEADER):
+            self.values[i] = 0
+        for n in range(capacity):
+            stamp_struct.pack_into(self.buffer, 8 * TELEMETRY_HEADER + n * self.slot, -1)
+
+    def _setup(self):
+        self.fields = [("time", "q", "<i8")] + create_log_fields(self.send_layout, self.receive_layout)
+        self.names = [field[0] for field in self.fields]
+        self.record = Struct("<" + "".join(field[1] for field in self.fields))
+        self.slot = stamp_struct.size + self.record.size
+
+    def _attach(self):
+        self.buffer = self.memory.buf
+        self.values = self.memory.buf[:8 * TELEMETRY_HEADER].cast("q")
+
+    def __getstate__(self):
+        return self.send_layout, self.receive_layout, self.capacity, self.memory.name
+
+    def __setstate__(self, state):
+        self.send_layout, self.receive_layout, self.capacity, name = state
+        self._setup()
+        self.memory = shared_memory.SharedMemory(name=name)
+        self._attach()
+
+    def publish(self, send, receive):
+        """ Publish one cycle, send and receive are SharedState snapshot sequences. """
+        values = self.values
+        number = values[PUBLISHED]
+        offset = 8 * TELEMETRY_HEADER + (number % self.capacity) * self.slot
+        stamp_struct.pack_into(self.buffer, offset, -1)
+        self.record.pack_into(self.buffer, offset + stamp_struct.size, perf_counter_ns(), *receive[:1], *send[1:],
+                              *receive[1:])
+        stamp_struct.pack_into(self.buffer, offset, number)
+        values[PUBLISHED] = number + 1
+
+    def read(self, number):
+        """ Record number as a tuple, None once it was overwritten or while it is written. """
+        offset = 8 * TELEMETRY_HEADER + (number % self.capacity) * self.slot
+        if stamp_struct.unpack_from(self.buffer, offset)[0] != number:
+            return None
+        record = self.record.unpack_from(self.buffer, offset + stamp_struct.size)
+        if stamp_struct.unpack_from(self.buffer, offset)[0] != number:
+            return None
+        return record
+
+    def to_dict(self, record):
+        """ Converts a record tuple into a dict of column name to value. """
+        return {name: from_slot(name, value) if isinstance(value, bytes) else value
+                for name, value in zip(self.names, record)}
+
+    def subscribe(self, latest=True):
+        """ New TelemetrySubscriber, see TelemetrySubscriber. """
+        return TelemetrySubscriber(self, latest)
+
+    @property
+    def published(self):
+        return self.values[PUBLISHED]
+
+    def close(self, unlink=False):
+        """ Release the shared memory, unlink removes the block once every process has closed it. """
+        self.values.release()
+        self.buffer = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+class TelemetrySubscriber:
+    """Reader of a TelemetryRing, usable from any process holding the ring.
+
+    Reads the records published since the last read, oldest first. Records overwritten before
+    they were read are skipped and counted in dropped.
+
+    Keyword arguments:
+    ring - TelemetryRing to read
+    latest - Start at the next published record, False starts at the oldest record held (default True)
+    """
+
+    def __init__(self, ring, latest=True):
+        self.ring = ring
+        published = ring.published
+        self.position = published if latest else max(0, published - ring.capacity)
+        self.dropped = 0
+
+    def read(self, limit=None):
+        """Records published since the last read.
+
+        :param limit: Largest number of records returned (default None, all)
+        :return: list of record tuples in ring.names column order
+        """
+        ring = self.ring
+        published = ring.published
+        # Keep clear of the slot the server writes next
+        oldest = published - ring.capacity + 1
+        if self.position < oldest:
+            self.dropped += oldest - self.position
+            self.position = oldest
+        end = published if limit is None else min(published, self.position + limit)
+        records = []
+        while self.position < end:
+            record = ring.read(self.position)
+            if record is None:
+                self.dropped += 1
+            else:
+                records.append(record)
+            self.position += 1
+        return records
+
+    def values(self, limit=None):
+        """ Records published since the last read as dicts of column name to value. """
+        return [self.ring.to_dict(record) for record in self.read(limit)]
+
+    def latest(self):
+        """ Newest record as a dict, None before the first publish. Skips the records in between. """
+        published = self.ring.published
+        while published:
+            record = self.ring.read(published - 1)
+            if record is not None:
+                self.position = published
+                return self.ring.to_dict(record)
+            published = self.ring.published
+        return None
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,208 @@
+import re
+from math import copysign
+
+from lxml import etree
+
+from src.RSIRI.state import from_slot
+
+# Marker written into the template while it is compiled, split out afterwards
+_SLOT_FORMAT = "@RSIRI{}@"
+_SLOT_PATTERN = re.compile(r"@RSIRI(\d+)@")
+
+_TEXT_SPECIAL = re.compile(r"[&<>\r]")
+_ATTRIBUTE_SPECIAL = re.compile(r"[&<>\"\n\r\t]")
+
+
+def escape_text(value):
+    """ Escape a value for use as element text, matching lxml serialisation. """
+    value = str(value)
+    if _TEXT_SPECIAL.search(value) is None:
+        return value
+    return value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace("\r", "&#13;")
+
+
+def escape_attribute(value):
+    """ Escape a value for use as an attribute, matching lxml serialisation. """
+    value = str(value)
+    if _ATTRIBUTE_SPECIAL.search(value) is None:
+        return value
+    return value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace("\"", "&quot;") \
+        .replace("\n", "&#10;").replace("\r", "&#13;").replace("\t", "&#9;")
+
+
+def float_repr(value):
+    """ Shortest exact repr of a number as float, NumPy scalars are written as plain numbers too. """
+    return repr(float(value))
+
+
+def number_format(precision=None):
+    """Formatter of the numbers of a send message.
+
+    :param precision: Digits after the decimal point, None formats the shortest exact repr, see float_repr
+    :return: function formatting a number into a str
+    """
+    if precision is None:
+        return float_repr
+    return "{{:.{}f}}".format(int(precision)).format
+
+
+class ElementText:
+    """Formats the text of an element together with its tags.
+
+    Empty text is written as an empty element, matching lxml serialisation.
+    """
+
+    def __init__(self, tag):
+        self.open = "<{}>".format(tag)
+        self.close = "</{}>".format(tag)
+        self.empty = "<{}/>".format(tag)
+
+    def __call__(self, value):
+        value = escape_text(value)
+        return self.open + value + self.close if value else self.empty
+
+
+class SendTemplate:
+    """Precompiled RSI send message.
+
+    Compiles the XML string created by convert_config_to_xml_string(file, "send")
+    once into literal fragments and value slots. Rendering only formats the
+    values into the slots, producing the same string as merge_dict_with_xml_string
+    followed by update_ipoc. Numbers are formatted here only, at the wire, str values
+    are sent as they are.
+
+    Keyword arguments:
+    xml_string - RSI send XML template
+    precision - Digits after the decimal point of numbers, see number_format (default None)
+    """
+
+    def __init__(self, xml_string, precision=None):
+        self.precision = precision
+        self.format_number = number_format(precision)
+        xml = etree.fromstring(xml_string)
+        # (tag, attribute) of each slot, attribute is None for element text
+        fields = []
+        last = len(xml) - 1
+
+        for index, xml_row in enumerate(xml):
+            if xml_row.text is None:
+                for a in xml_row.keys():
+                    xml_row.set(a, _SLOT_FORMAT.format(len(fields)))
+                    fields.append((xml_row.tag, a))
+            elif index != last:
+                xml_row.text = _SLOT_FORMAT.format(len(fields))
+                fields.append((xml_row.tag, None))
+        # IPOC is always the last element of the message (see update_ipoc)
+        xml[last].text = _SLOT_FORMAT.format(len(fields))
+
+        # Alternating literal fragments and slot numbers, the slot numbers
+        # are overwritten with formatted values on each render
+        self.parts = _SLOT_PATTERN.split(etree.tostring(xml, encoding="unicode"))
+        positions = {int(slot): i for i, slot in enumerate(self.parts) if i % 2}
+
+        self.attribute_fields = []
+        # (tag, position, ElementText) of each text slot, the slot includes the element tags
+        self.text_fields = []
+        for slot, (tag, a) in enumerate(fields):
+            if a is None:
+                position = positions[slot]
+                text = ElementText(tag)
+                self.parts[position - 1] = self.parts[position - 1][:-len(text.open)]
+                self.parts[position + 1] = self.parts[position + 1][len(text.close):]
+                self.text_fields.append((tag, position, text))
+            elif self.attribute_fields and self.attribute_fields[-1][0] == tag:
+                self.attribute_fields[-1][1].append((positions[slot], a))
+            else:
+                self.attribute_fields.append((tag, [(positions[slot], a)]))
+        self.ipoc_position = positions[len(fields)]
+
+    def render(self, values, ipoc):
+        """ Format values and IPOC into the send message.
+
+        Keyword arguments:
+        values - dict of send values, as created by convert_rsi_config_to_dict
+        ipoc - IPOC of the message being answered
+        """
+        parts = self.parts
+        format_number = self.format_number
+        for tag, attributes in self.attribute_fields:
+            row = values[tag]
+            for position, a in attributes:
+                value = row[a]
+                parts[position] = escape_attribute(value) if value.__class__ is str else format_number(value)
+        for tag, position, text in self.text_fields:
+            parts[position] = text(values[tag])
+        parts[self.ipoc_position] = escape_text(ipoc)
+        return "".join(parts)
+
+
+class DeltaRenderer:
+    """Renders send snapshots into encoded messages, formatting only the values that changed.
+
+    Keeps the formatted values and the encoded message up to IPOC from the previous render.
+    When the snapshot is unchanged only the IPOC is formatted and the previous bytes are
+    reused, otherwise only the changed values are formatted. The message stays complete, every
+    element is sent every cycle.
+
+    Keyword arguments:
+    template - SendTemplate of the send message
+    layout - Layout of the send SharedState the snapshots are taken from
+    """
+
+    def __init__(self, template, layout):
+        self.parts = list(template.parts)
+        indices = {}
+        index = 0
+        for tag, attributes in layout:
+            if attributes is None:
+                indices[tag] = index
+                index += 1
+            else:
+                indices[tag] = {a: index + i for i, a in enumerate(attributes)}
+                index += len(attributes)
+        # (snapshot index, part position, format function, tag of string slots) of each value,
+        # numbers are formatted without escaping
+        self.slots = []
+        for tag, attributes in template.attribute_fields:
+            for position, a in attributes:
+                self.slots.append((indices[tag][a], position, template.format_number, None))
+        for tag, position, text in template.text_fields:
+            self.slots.append((indices[tag], position, text, tag))
+        self.ipoc_position = template.ipoc_position
+        self.suffix = "".join(self.parts[self.ipoc_position + 1:]).encode("utf8")
+        self.prefix = b""
+        self.previous = None
+        # (snapshot index, sign) of the zeros of the previous snapshot, 0.0 equals -0.0 but is
+        # written differently
+        self.zeros = ()
+        # Values formatted and renders that reused the previous message
+        self.formatted = 0
+        self.reused = 0
+
+    def render(self, snapshot, ipoc):
+        """ Encoded send message of a SharedState snapshot and the IPOC being answered. """
+        snapshot = tuple(snapshot)
+        previous = self.previous
+        if snapshot == previous and all(copysign(1.0, snapshot[index]) == sign for index, sign in self.zeros):
+            self.reused += 1
+        else:
+            parts = self.parts
+            formatted = 0
+            zeros = []
+            for index, position, format_value, tag in self.slots:
+                value = snapshot[index]
+                if tag is None and value == 0:
+                    zeros.append((index, copysign(1.0, value)))
+                if previous is None or value != previous[index] or tag is None and value == 0 \
+                        and copysign(1.0, value) != copysign(1.0, previous[index]):
+                    parts[position] = format_value(value if tag is None else from_slot(tag, value))
+                    formatted += 1
+            self.formatted += formatted
+            self.zeros = zeros
+            self.prefix = "".join(parts[:self.ipoc_position]).encode("utf8")
+            self.previous = snapshot
+        return self.prefix + escape_text(ipoc).encode("utf8") + self.suffix
+
+
+if __name__ == '__main__':
+    pass
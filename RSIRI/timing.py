@@ -0,0 +1,140 @@
+from multiprocessing import shared_memory
+
+# int64 header slots: cycles recorded, missed IPOCs, late replies, last IPOC, stale datagrams skipped,
+# telegrams the decoder left to lxml
+HEADER = 8
+CYCLES, MISSED, LATE, LAST_IPOC, STALE, FALLBACKS = range(6)
+# int64 slots of each ring entry: IPOC and perf_counter_ns timestamps of each phase
+FIELDS = 5
+IPOC, RECEIVED, DECODED, MERGED, SENT = range(FIELDS)
+PHASES = {"decode": (RECEIVED, DECODED), "merge": (DECODED, MERGED), "send": (MERGED, SENT), "total": (RECEIVED, SENT)}
+# Upper edges of the reply latency histogram in microseconds
+HISTOGRAM_EDGES = (100, 250, 500, 1000, 2000, 4000, 12000)
+
+
+def percentile(ordered, fraction):
+    """ Nearest rank percentile of a sorted list. """
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarise(durations):
+    """ Summary of a list of durations in nanoseconds, returned in microseconds. """
+    ordered = sorted(durations)
+    return {"min": ordered[0] / 1000 if ordered else 0.0,
+            "p50": percentile(ordered, 0.50) / 1000,
+            "p90": percentile(ordered, 0.90) / 1000,
+            "p99": percentile(ordered, 0.99) / 1000,
+            "max": ordered[-1] / 1000 if ordered else 0.0,
+            "mean": sum(ordered) / len(ordered) / 1000 if ordered else 0.0}
+
+
+class CycleTimer:
+    """Ring buffer of per cycle timestamps of the RSI server loop.
+
+    The RSI process records the receive, decode, merge and send timestamps of every
+    cycle into a shared memory block, so timing stays on in production and any process
+    holding the timer can compute statistics from the last cycles.
+
+    Keyword arguments:
+    cycle_rate - RSI cycle rate in ms, the expected IPOC increment (default 4)
+    size - number of cycles kept in the ring buffer (default 4096)
+    late - reply latency in ms counted as a late reply (default cycle_rate)
+    """
+
+    def __init__(self, cycle_rate=4, size=4096, late=None):
+        self.cycle_rate = cycle_rate
+        self.size = size
+        self.late = int((cycle_rate if late is None else late) * 1e6)
+        self.memory = shared_memory.SharedMemory(create=True, size=8 * (HEADER + size * FIELDS))
+        self.values = self.memory.buf.cast("q")
+        self.reset()
+
+    def __getstate__(self):
+        return self.cycle_rate, self.size, self.late, self.memory.name
+
+    def __setstate__(self, state):
+        self.cycle_rate, self.size, self.late, name = state
+        self.memory = shared_memory.SharedMemory(name=name)
+        self.values = self.memory.buf.cast("q")
+
+    def reset(self):
+        for i in range(HEADER):
+            self.values[i] = 0
+
+    def record(self, ipoc, received, decoded, merged, sent):
+        """ Record one cycle, timestamps are time.perf_counter_ns() values. """
+        values = self.values
+        cycles = values[CYCLES]
+        base = HEADER + (cycles % self.size) * FIELDS
+        values[base + IPOC] = ipoc
+        values[base + RECEIVED] = received
+        values[base + DECODED] = decoded
+        values[base + MERGED] = merged
+        values[base + SENT] = sent
+        if cycles and ipoc - values[LAST_IPOC] > self.cycle_rate:
+            values[MISSED] += (ipoc - values[LAST_IPOC]) // self.cycle_rate - 1
+        if sent - received > self.late:
+            values[LATE] += 1
+        values[LAST_IPOC] = ipoc
+        values[CYCLES] = cycles + 1
+
+    def record_stale(self, count):
+        """ Total of stale datagrams skipped by the network, see Network.receive. """
+        self.values[STALE] = count
+
+    def record_fallbacks(self, count):
+        """ Total of telegrams decoded by the lxml fallback, see ReceiveDecoder. """
+        self.values[FALLBACKS] = count
+
+    def entries(self):
+        """ Recorded ring entries, oldest first, as lists of FIELDS values. """
+        values = self.values
+        cycles = values[CYCLES]
+        count = min(cycles, self.size)
+        data = values[HEADER:HEADER + self.size * FIELDS].tolist()
+        first = (cycles - count) % self.size
+        order = [(first + i) % self.size for i in range(count)]
+        return [data[i * FIELDS:(i + 1) * FIELDS] for i in order]
+
+    def statistics(self):
+        """Statistics of the cycles in the ring buffer.
+
+        :return: dict of counters, duration summaries per phase and period in microseconds,
+                 and the reply latency histogram keyed by upper edge in microseconds
+        """
+        entries = self.entries()
+        stats = {"cycles": self.values[CYCLES],
+                 "missed_ipoc": self.values[MISSED],
+                 "late_replies": self.values[LATE],
+                 "last_ipoc": self.values[LAST_IPOC],
+                 "stale_datagrams": self.values[STALE],
+                 "decoder_fallbacks": self.values[FALLBACKS]}
+        for phase, (start, end) in PHASES.items():
+            stats[phase] = summarise([entry[end] - entry[start] for entry in entries])
+        stats["period"] = summarise([b[RECEIVED] - a[RECEIVED] for a, b in zip(entries, entries[1:])])
+
+        histogram = {edge: 0 for edge in HISTOGRAM_EDGES}
+        histogram["inf"] = 0
+        for entry in entries:
+            latency = (entry[SENT] - entry[RECEIVED]) / 1000
+            for edge in HISTOGRAM_EDGES:
+                if latency <= edge:
+                    histogram[edge] += 1
+                    break
+            else:
+                histogram["inf"] += 1
+        stats["histogram"] = histogram
+        return stats
+
+    def close(self, unlink=False):
+        """ Release the shared memory, unlink removes the block once every process has closed it. """
+        self.values.release()
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+if __name__ == '__main__':
+    pass
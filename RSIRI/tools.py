@@ -1,11 +1,13 @@
 from lxml import etree
 
+from src.RSIRI.state import type_values
 
-def convert_rsi_config_to_dict(rsi_file, direction):
-    return convert_xml_string_to_dict(convert_config_to_xml_string(rsi_file, direction))
 
+def convert_rsi_config_to_dict(rsi_file, direction, typed=False):
+    return convert_xml_string_to_dict(convert_config_to_xml_string(rsi_file, direction), typed)
 
-def convert_xml_string_to_dict(xml):
+
+def convert_xml_string_to_dict(xml, typed=False):
     """ Convert RSI XML string to dict variables.
 
     Converts an RSI XML string to RSIValue Object values.
@@ -13,6 +15,7 @@ def convert_xml_string_to_dict(xml):
 
     Keyword arguments:
         xml - RSI XML String (default None)
+        typed - Convert to native types, see type_values (default False, all values are str)
     """
     # Convert string to XML object
     xml_string = etree.fromstring(xml)
@@ -28,6 +31,8 @@ def convert_xml_string_to_dict(xml):
         else:
             new_values[xml_row.tag] = xml_row.text
     # logging.debug(new_values)
+    if typed:
+        return type_values(new_values)
     return new_values
 
 
@@ -45,6 +50,14 @@ def add_ipoc(xml_string):
     return etree.tostring(xml, encoding="unicode")
 
 
+def remove_ipoc(xml_string):
+    """ XML string without its trailing IPOC element. """
+    xml = etree.fromstring(xml_string)
+    if len(xml) and xml[len(xml) - 1].tag == "IPOC":
+        xml.remove(xml[len(xml) - 1])
+    return etree.tostring(xml, encoding="unicode")
+
+
 def update_ipoc(xml_string, ipoc):
     """ Updates IPOC of send message. """
     xml_val = etree.fromstring(xml_string)
@@ -71,7 +84,13 @@ def merge_dict_with_xml_string(dict_value, xml_string):
 
 
 def load_xml(file):
-    """ Load Send XML template _working returns XML root to object """
+    """ Load Send XML template _working returns XML root to object
+
+    Already loaded XML roots are returned as they are, so a config file can be parsed once
+    and passed to each of the config functions.
+    """
+    if etree.iselement(file):
+        return file
     parser = etree.XMLParser(remove_blank_text=True)
     tree = etree.parse(file, parser=parser)
     return tree.getroot()
@@ -244,17 +263,19 @@ def check_position_values(values, send_values, rec_values, rate):
 
     :param values:
     :param send_values:
-    :param rec_values:
+    :param rec_values: Typed or str receive values, each is converted once
     :param rate:
     :return:
     """
+    rate = float(rate)
     for key, val in values.items():
-        if float(rec_values[key]) > val:
-            send_values[key] = str(rate)
-        if float(rec_values[key]) < val:
-            send_values[key] = str(rate * -1)
-        if float(rec_values[key]) == val:
-            send_values[key] = 0
+        received = float(rec_values[key])
+        if received > val:
+            send_values[key] = rate
+        elif received < val:
+            send_values[key] = -rate
+        else:
+            send_values[key] = 0.0
     return send_values
 
 
@@ -0,0 +1,121 @@
+import logging
+import threading
+from struct import Struct
+from time import sleep
+
+# Slot header: record number (-1 while the record is written), IPOC, telegram length, direction
+slot_struct = Struct("<qqIB")
+stamp_struct = Struct("<q")
+DIRECTIONS = ("Receive", "Send")
+RECEIVED, SENT = range(2)
+
+
+class TelegramTrace:
+    """Debug log of the telegrams of the RSI loop.
+
+    record copies the raw telegram bytes into a preallocated ring and returns, a background
+    thread formats the records and passes them to the logger. The loop never formats or
+    writes to a log handler, so tracing a live cell does not add the cost of logging to the cycle.
+    When the thread falls more than capacity records behind the oldest records are overwritten,
+    skipped and counted in dropped. Telegrams longer than size bytes are cut.
+
+    Keyword arguments:
+    logger - Logger the telegrams are written to at DEBUG level
+    size - Largest telegram length in bytes kept
+    capacity - Number of records held by the ring (default 1024)
+    interval - Seconds between the wake ups of the formatting thread (default 0.1)
+    """
+
+    def __init__(self, logger, size, capacity=1024, interval=0.1):
+        self.logger = logger
+        self.size = size
+        self.capacity = capacity
+        self.interval = interval
+        self.slot = slot_struct.size + size
+        self.buffer = memoryview(bytearray(capacity * self.slot))
+        for n in range(capacity):
+            slot_struct.pack_into(self.buffer, n * self.slot, -1, 0, 0, 0)
+        self.written = 0
+        self.position = 0
+        self.dropped = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="TelegramTrace", daemon=True)
+
+    def record(self, direction, ipoc, message):
+        """ Copy a telegram into the ring, direction is RECEIVED or SENT, message bytes or a buffer. """
+        number = self.written
+        offset = (number % self.capacity) * self.slot
+        length = len(message)
+        if length > self.size:
+            length = self.size
+            message = message[:length]
+        start = offset + slot_struct.size
+        stamp_struct.pack_into(self.buffer, offset, -1)
+        self.buffer[start:start + length] = message
+        # The header is written with the record number, readers see a whole record or none
+        slot_struct.pack_into(self.buffer, offset, number, ipoc, length, direction)
+        self.written = number + 1
+
+    def read(self, number):
+        """ Record number as (direction, IPOC, bytes), None once it was overwritten or while it is written. """
+        offset = (number % self.capacity) * self.slot
+        stamp, ipoc, length, direction = slot_struct.unpack_from(self.buffer, offset)
+        if stamp != number:
+            return None
+        start = offset + slot_struct.size
+        message = bytes(self.buffer[start:start + length])
+        if slot_struct.unpack_from(self.buffer, offset)[0] != number:
+            return None
+        return direction, ipoc, message
+
+    def drain(self):
+        """ Log the records written since the last drain, returns the number logged. """
+        written = self.written
+        # Keep clear of the slot the loop writes next
+        oldest = written - self.capacity + 1
+        if self.position < oldest:
+            self.dropped += oldest - self.position
+            self.position = oldest
+        count = 0
+        while self.position < written:
+            record = self.read(self.position)
+            self.position += 1
+            if record is None:
+                self.dropped += 1
+                continue
+            direction, ipoc, message = record
+            self.logger.debug("%s IPOC %s: %s", DIRECTIONS[direction], ipoc, message.decode("utf8", "replace"))
+            count += 1
+            # Hand the interpreter back to the loop between records
+            sleep(0)
+        return count
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.drain()
+        self.drain()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        """ Stop the formatting thread after logging the records still held. """
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+
+def create_trace(logger, size, capacity=1024, interval=0.1):
+    """Started TelegramTrace of logger, None when logger is not enabled for DEBUG.
+
+    The level is checked once, loops test the trace for None so a disabled trace costs nothing
+    per cycle. See TelegramTrace for the arguments.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return None
+    return TelegramTrace(logger, size, capacity, interval).start()
+
+
+if __name__ == '__main__':
+    pass
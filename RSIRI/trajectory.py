@@ -0,0 +1,171 @@
+from multiprocessing import shared_memory
+from struct import Struct
+from time import sleep
+
+# int64 header slots: rows written, rows applied, underruns, active, ended, underrun policy, last IPOC,
+# rows up to which queued corrections are discarded
+TRAJECTORY_HEADER = 8
+WRITTEN, APPLIED, UNDERRUNS, ACTIVE, ENDED, POLICY, LAST_IPOC, DISCARD = range(8)
+POLICIES = {"hold": 0, "zero": 1}
+
+
+def create_slot_indices(layout):
+    """ Index of each multi value attribute in a SharedState snapshot tuple, by tag. """
+    indices = {}
+    index = 0
+    for tag, attributes in layout:
+        if attributes is None:
+            index += 1
+        else:
+            indices[tag] = list(range(index, index + len(attributes)))
+            index += len(attributes)
+    return indices
+
+
+class TrajectoryBuffer:
+    """Shared memory queue of per cycle corrections.
+
+    The client pushes rows of corrections for a send variable (e.g. RKorr or AKorr), the RSI
+    server applies exactly one row to the send values of each telegram it answers. When the
+    queue runs empty before the trajectory was ended the underrun policy applies: "hold"
+    repeats the last row, "zero" sends zero corrections, and the underrun is counted. Once an
+    ended trajectory is drained it is done, the send values are used again from the next
+    telegram.
+
+    Keyword arguments:
+    send_layout - Layout of the send SharedState
+    keys - Send variables trajectories can be streamed to (default ("RKorr", "AKorr"))
+    capacity - Number of rows held by the queue (default 8192)
+    """
+
+    def __init__(self, send_layout, keys=("RKorr", "AKorr"), capacity=8192):
+        self.send_layout = send_layout
+        self.capacity = capacity
+        self._setup(keys)
+        self.memory = shared_memory.SharedMemory(create=True, size=8 * TRAJECTORY_HEADER + capacity * self.row.size)
+        self._attach()
+        for i in range(TRAJECTORY_HEADER):
+            self.values[i] = 0
+
+    def _setup(self, keys):
+        indices = create_slot_indices(self.send_layout)
+        self.keys = tuple(key for key in keys if key in indices)
+        self.indices = [indices[key] for key in self.keys]
+        self.width = max([len(i) for i in self.indices] or [0])
+        # Key number followed by the corrections, padded to the widest key
+        self.row = Struct("<" + "d" * (1 + self.width))
+        self.last = None
+
+    def _attach(self):
+        self.buffer = self.memory.buf
+        self.values = self.memory.buf[:8 * TRAJECTORY_HEADER].cast("q")
+
+    def __getstate__(self):
+        return self.send_layout, self.keys, self.capacity, self.memory.name
+
+    def __setstate__(self, state):
+        self.send_layout, keys, self.capacity, name = state
+        self._setup(keys)
+        self.memory = shared_memory.SharedMemory(name=name)
+        self._attach()
+
+    def push(self, key, rows, end=True, policy="hold"):
+        """Queue corrections, waiting for room while the queue is full.
+
+        :param key: Send variable the corrections are applied to
+        :param rows: Sequence of per cycle corrections, one value per attribute of key
+        :param end: The trajectory ends with these rows, later underruns are not counted
+        :param policy: Underrun policy, "hold" or "zero"
+        :return: Number of rows queued
+        """
+        number = self.keys.index(key)
+        width = len(self.indices[number])
+        values = self.values
+        values[POLICY] = POLICIES[policy]
+        values[ENDED] = 0
+        values[ACTIVE] = 1
+        count = 0
+        for row in rows:
+            row = list(row)
+            if len(row) != width:
+                raise ValueError("{} takes {} corrections per row, got {}".format(key, width, len(row)))
+            written = values[WRITTEN]
+            while written - values[APPLIED] >= self.capacity:
+                sleep(0.001)
+            offset = 8 * TRAJECTORY_HEADER + (written % self.capacity) * self.row.size
+            self.row.pack_into(self.buffer, offset, number, *row, *[0.0] * (self.width - width))
+            values[WRITTEN] = written + 1
+            count += 1
+        if end:
+            values[ENDED] = 1
+        return count
+
+    def stop(self):
+        """ Stop applying corrections and discard the queued rows. """
+        self.values[ACTIVE] = 0
+        self.values[DISCARD] = self.values[WRITTEN]
+
+    def apply(self, snapshot, ipoc):
+        """Apply the next row to a send snapshot, called by the RSI server once per telegram.
+
+        :param snapshot: SharedState snapshot tuple of the send values
+        :param ipoc: IPOC of the telegram being answered
+        :return: The snapshot with the corrections applied
+        """
+        values = self.values
+        # Only the server moves the applied count, stop asks for rows to be discarded
+        applied = values[APPLIED]
+        if applied < values[DISCARD]:
+            applied = values[APPLIED] = values[DISCARD]
+        if not values[ACTIVE]:
+            self.last = None
+            return snapshot
+        if applied < values[WRITTEN]:
+            offset = 8 * TRAJECTORY_HEADER + (applied % self.capacity) * self.row.size
+            row = self.row.unpack_from(self.buffer, offset)
+            self.last = row
+            values[APPLIED] = applied + 1
+            values[LAST_IPOC] = ipoc
+        elif self.last is None:
+            return snapshot
+        elif values[ENDED]:
+            # Every row was sent, the trajectory is done
+            values[ACTIVE] = 0
+            if not values[ENDED] or values[WRITTEN] != applied:
+                # A new trajectory was pushed meanwhile
+                values[ACTIVE] = 1
+            self.last = None
+            return snapshot
+        else:
+            values[UNDERRUNS] += 1
+            row = self.last
+            if values[POLICY] == POLICIES["zero"]:
+                row = (row[0],) + (0.0,) * self.width
+        snapshot = list(snapshot)
+        for index, value in zip(self.indices[int(row[0])], row[1:]):
+            snapshot[index] = value
+        return snapshot
+
+    def progress(self):
+        """ Progress of the active trajectory. """
+        values = self.values
+        return {"active": bool(values[ACTIVE]),
+                "ended": bool(values[ENDED]),
+                "done": bool(values[ENDED]) and not values[ACTIVE] and values[WRITTEN] <= values[APPLIED],
+                "queued": values[WRITTEN] - values[APPLIED],
+                "applied": values[APPLIED],
+                "written": values[WRITTEN],
+                "underruns": values[UNDERRUNS],
+                "last_ipoc": values[LAST_IPOC]}
+
+    def close(self, unlink=False):
+        """ Release the shared memory, unlink removes the block once every process has closed it. """
+        self.values.release()
+        self.buffer = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,225 @@
+from multiprocessing import shared_memory
+
+from src.RSIRI.motion import MOVES
+from src.RSIRI.trajectory import create_slot_indices
+
+# int64 header slots written by the client: stop request, heartbeat count, reset count, ramp cycles, stall
+# cycles, tolerated missing cycles (-1 any), receive timeout in us
+# written by the RSI process: state, reason, stalls, gaps, missing cycles, timeouts, last IPOC
+WATCHDOG_HEADER = 16
+STOP, HEARTBEAT, RESET, RAMP, STALL, GAP, TIMEOUT, STATE, REASON, STALLS, GAPS, MISSING, TIMEOUTS, LAST_IPOC = range(14)
+STATES = ("running", "ramping", "faulted", "stopped")
+RUNNING, RAMPING, FAULTED, STOPPED = range(4)
+REASONS = ("", "stop", "client stall", "IPOC gap")
+NONE, STOPPING, CLIENT_STALL, IPOC_GAP = range(4)
+
+
+class Watchdog:
+    """Safe stop and fault supervision of the RSI process.
+
+    The client requests a stop and sends heartbeats, the RSI process checks every telegram for
+    a stalled client and for cycles missing between IPOCs. On a stop request or a fault the
+    corrections (RKorr, AKorr) are ramped linearly to zero over ramp cycles. After a stop the RSI
+    process ends, after a fault zero corrections are sent until the client resets the watchdog.
+    Stall detection starts with the first heartbeat. When no telegram arrives within the receive
+    timeout the RSI process checks for a stop request, so a stop takes at most ramp cycles while
+    the robot is sending and the receive timeout otherwise.
+
+    Keyword arguments:
+    send_layout - Layout of the send SharedState
+    cycle_rate - RSI cycle rate in ms, the expected IPOC increment (default 4)
+    ramp - Cycles over which corrections are ramped to zero (default 25)
+    stall - Cycles without heartbeat counted as a client stall (default 250)
+    gap - Missing cycles between two telegrams tolerated, None only counts gaps (default None)
+    timeout - Seconds without a telegram after which the stop request is checked (default 0.1)
+    """
+
+    def __init__(self, send_layout, cycle_rate=4, ramp=25, stall=250, gap=None, timeout=0.1):
+        self.send_layout = send_layout
+        self.cycle_rate = cycle_rate
+        self._setup()
+        self.memory = shared_memory.SharedMemory(create=True, size=8 * WATCHDOG_HEADER)
+        self.values = self.memory.buf.cast("q")
+        for i in range(WATCHDOG_HEADER):
+            self.values[i] = 0
+        self.values[GAP] = -1
+        self.configure(ramp, stall, gap, timeout)
+
+    def _setup(self):
+        indices = create_slot_indices(self.send_layout)
+        # Snapshot slots ramped to zero
+        self.indices = [index for key in MOVES if key in indices for index in indices[key]]
+        self.heartbeat = 0
+        self.stalled = 0
+        self.ramped = 0
+        self.resets = 0
+
+    def __getstate__(self):
+        return self.send_layout, self.cycle_rate, self.memory.name
+
+    def __setstate__(self, state):
+        self.send_layout, self.cycle_rate, name = state
+        self._setup()
+        self.memory = shared_memory.SharedMemory(name=name)
+        self.values = self.memory.buf.cast("q")
+        self.resets = self.values[RESET]
+
+    def configure(self, ramp=None, stall=None, gap=None, timeout=None):
+        """ Change the watchdog settings, None keeps a setting, a gap of -1 only counts gaps. See Watchdog. """
+        values = self.values
+        if ramp is not None:
+            values[RAMP] = max(1, int(ramp))
+        if stall is not None:
+            values[STALL] = max(1, int(stall))
+        if gap is not None:
+            values[GAP] = int(gap)
+        if timeout is not None:
+            values[TIMEOUT] = max(1, int(timeout * 1e6))
+
+    # Client side
+    def request_stop(self):
+        self.values[STOP] = 1
+
+    def send_heartbeat(self):
+        self.values[HEARTBEAT] += 1
+
+    def reset(self):
+        """ Clear a fault and a stop request, the RSI process sends the live corrections again. """
+        self.values[STOP] = 0
+        self.values[RESET] += 1
+
+    def status(self):
+        """ State, reason of the last ramp and the event counters. """
+        values = self.values
+        return {"state": STATES[values[STATE]],
+                "reason": REASONS[values[REASON]],
+                "stop_requested": bool(values[STOP]),
+                "stalls": values[STALLS],
+                "gaps": values[GAPS],
+                "missing": values[MISSING],
+                "timeouts": values[TIMEOUTS],
+                "last_ipoc": values[LAST_IPOC]}
+
+    # RSI process side
+    @property
+    def timeout(self):
+        return self.values[TIMEOUT] / 1e6
+
+    @property
+    def stop_time(self):
+        """ Longest time in seconds a requested stop takes the RSI process. """
+        values = self.values
+        return values[RAMP] * self.cycle_rate / 1000 + values[TIMEOUT] / 1e6
+
+    @property
+    def finished(self):
+        return self.values[STATE] == STOPPED
+
+    def start(self):
+        """ Called by the RSI process before its first telegram. """
+        values = self.values
+        self.heartbeat = values[HEARTBEAT]
+        self.stalled = 0
+        self.resets = values[RESET]
+        values[LAST_IPOC] = 0
+        values[REASON] = NONE
+        values[STATE] = RUNNING
+
+    def received(self, ipoc):
+        """ Checks the IPOC of a telegram for missing cycles. """
+        values = self.values
+        last = values[LAST_IPOC]
+        values[LAST_IPOC] = ipoc
+        if not last:
+            return
+        missing = (ipoc - last) // self.cycle_rate - 1
+        if missing > 0:
+            values[GAPS] += 1
+            values[MISSING] += missing
+            if 0 <= values[GAP] < missing:
+                self.fault(IPOC_GAP)
+
+    def timed_out(self):
+        """Called when no telegram arrived within the timeout.
+
+        :return: True when the RSI process should end
+        """
+        values = self.values
+        if values[LAST_IPOC]:
+            values[TIMEOUTS] += 1
+            # The next telegram starts a new connection
+            values[LAST_IPOC] = 0
+        if values[STOP]:
+            values[REASON] = STOPPING
+            values[STATE] = STOPPED
+            return True
+        return False
+
+    def fault(self, reason):
+        values = self.values
+        if values[STATE] == RUNNING:
+            values[REASON] = reason
+            values[STATE] = RAMPING
+            self.ramped = 0
+
+    def apply(self, snapshot):
+        """Ramps the corrections of a send snapshot, called by the RSI server once per telegram.
+
+        :param snapshot: SharedState snapshot of the send values, after all other corrections
+        :return: The snapshot to send
+        """
+        values = self.values
+        state = values[STATE]
+        if values[RESET] != self.resets:
+            self.resets = values[RESET]
+            if state == FAULTED or (state == RAMPING and values[REASON] != STOPPING):
+                state = values[STATE] = RUNNING
+                values[REASON] = NONE
+                self.heartbeat = values[HEARTBEAT]
+                self.stalled = 0
+        if state == RUNNING:
+            if values[STOP]:
+                values[REASON] = STOPPING
+                state = values[STATE] = RAMPING
+                self.ramped = 0
+            else:
+                heartbeat = values[HEARTBEAT]
+                if heartbeat != self.heartbeat:
+                    self.heartbeat = heartbeat
+                    self.stalled = 0
+                elif heartbeat:
+                    self.stalled += 1
+                    if self.stalled > values[STALL]:
+                        values[STALLS] += 1
+                        self.fault(CLIENT_STALL)
+                        state = RAMPING
+                if state == RUNNING:
+                    return snapshot
+        elif values[STOP] and values[REASON] != STOPPING:
+            # A stop during a fault ramp ends the process once the ramp is done, a faulted process ends now
+            values[REASON] = STOPPING
+            if state == FAULTED:
+                values[STATE] = STOPPED
+        if state == RAMPING:
+            self.ramped += 1
+            ramp = values[RAMP]
+            scale = max(0.0, (ramp - self.ramped) / ramp)
+            if self.ramped >= ramp:
+                values[STATE] = STOPPED if values[REASON] == STOPPING else FAULTED
+        else:
+            scale = 0.0
+        snapshot = list(snapshot)
+        for index in self.indices:
+            snapshot[index] *= scale
+        return snapshot
+
+    def close(self, unlink=False):
+        """ Release the shared memory, unlink removes the block once every process has closed it. """
+        self.values.release()
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+if __name__ == '__main__':
+    pass
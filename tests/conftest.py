@@ -0,0 +1,27 @@
+import os
+import sys
+import types
+
+import pytest
+
+# The package is imported as src.RSIRI, with the repository checked out as src
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if "src" not in sys.modules:
+    src = types.ModuleType("src")
+    src.__path__ = [root]
+    sys.modules["src"] = src
+
+from src.RSIRI.benchmark import create_config  # noqa: E402
+from src.RSIRI.config import load_config  # noqa: E402
+from src.RSIRI.state import SharedState  # noqa: E402
+
+
+@pytest.fixture
+def states(tmp_path):
+    """ Send and receive SharedState of a config without tech channels. """
+    config = load_config(create_config(str(tmp_path)))
+    send = SharedState(config.send_values)
+    receive = SharedState(config.receive_values)
+    yield send, receive
+    send.close(unlink=True)
+    receive.close(unlink=True)
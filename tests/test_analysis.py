@@ -0,0 +1,113 @@
+import sys
+
+import pytest
+
+from src.RSIRI.analysis import gap_statistics, ipoc_gaps, load_log, resample
+from src.RSIRI.benchmark import create_config
+from src.RSIRI.config import load_config
+from src.RSIRI.log import LogBuffer, convert_log_to_csv, log_process
+from src.RSIRI.replay import LogReplay
+from src.RSIRI.state import SharedState
+
+# Two cycles are missing after IPOC 40
+IPOCS = [4 * n for n in range(1, 11)] + [4 * n for n in range(13, 21)]
+CORRECTION = 0.25
+
+
+@pytest.fixture
+def session(tmp_path):
+    """ Config file and binary log of a session sending a constant RKorr X. """
+    file = create_config(str(tmp_path))
+    config = load_config(file)
+    send = SharedState(config.send_values)
+    receive = SharedState(config.receive_values)
+    log = LogBuffer(send.layout, receive.layout)
+    send["RKorr"] = {"X": CORRECTION}
+    for n, ipoc in enumerate(IPOCS):
+        receive.update({"IPOC": ipoc, "AIPos": {"A1": float(n)}, "RIst": {"X": 10.0 * n}})
+        log.write(send.snapshot(), receive.snapshot())
+    status = {"State": False}
+    log_process(log, status, str(tmp_path), 0)
+    for shared in (send, receive, log):
+        shared.close(unlink=True)
+    return file, status["Log file"]
+
+
+@pytest.mark.parametrize("mmap", (True, False))
+def test_load_binary_log(session, mmap):
+    _, log_file = session
+    columns = load_log(log_file, ["RKorr.*", "AIPos.A1"], mmap=mmap)
+    assert list(columns) == ["IPOC", "RKorr.X", "RKorr.Y", "RKorr.Z", "RKorr.A", "RKorr.B", "RKorr.C", "AIPos.A1"]
+    assert list(columns["IPOC"]) == IPOCS
+    assert list(columns["RKorr.X"]) == [CORRECTION] * len(IPOCS)
+    assert list(columns["AIPos.A1"]) == [float(n) for n in range(len(IPOCS))]
+
+
+def test_load_csv_log(session, tmp_path):
+    _, log_file = session
+    csv_file = str(tmp_path / "log.csv")
+    convert_log_to_csv(log_file, csv_file)
+    binary = load_log(log_file)
+    columns = load_log(csv_file)
+    assert list(columns) == list(binary)
+    for name in ("IPOC", "RKorr.X", "RIst.X"):
+        assert list(columns[name]) == list(binary[name])
+    assert list(load_log(csv_file, "RIst.X")) == ["IPOC", "RIst.X"]
+
+
+def test_gaps():
+    ipoc = [4, 8, 20, 16, 24, 28]
+    assert ipoc_gaps(ipoc) == [(2, 20, 2), (3, 16, -2), (4, 24, 1)]
+    assert gap_statistics(ipoc) == {"records": 6, "gaps": 2, "missing": 3, "out_of_order": 1, "longest_gap": 2}
+    assert gap_statistics(IPOCS)["missing"] == 2
+
+
+def test_gaps_without_numpy(monkeypatch):
+    ipoc = [4, 8, 20, 16, 24, 28]
+    expected = ipoc_gaps(ipoc)
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    assert ipoc_gaps(ipoc) == expected
+    with pytest.raises(ImportError):
+        resample({"IPOC": ipoc})
+
+
+def test_resample(session):
+    _, log_file = session
+    columns = resample(load_log(log_file, ["RIst.X", "EStr"]))
+    assert list(columns["IPOC"]) == list(range(4, 81, 4))
+    # RIst X grows by 10 per logged cycle, the missing cycles are interpolated
+    assert list(columns["RIst.X"][9:13]) == pytest.approx([90.0, 93.333333, 96.666667, 100.0])
+    assert len(columns["EStr"]) == len(columns["IPOC"])
+
+
+def test_replay(session):
+    file, log_file = session
+    replay = LogReplay(file, log_file)
+    try:
+        statistics = replay.run()
+    finally:
+        replay.close()
+    # Without the correction of the session every reply differs from the log
+    assert statistics["cycles"] == len(IPOCS)
+    assert statistics["mismatched"] == len(IPOCS)
+    assert statistics["difference"]["RKorr.X"] == pytest.approx(CORRECTION)
+    assert statistics["log"]["missing"] == 2
+
+
+def test_replay_control(session):
+    file, log_file = session
+
+    def control(replay):
+        if replay.cycle == 0:
+            replay.send["RKorr"] = {"X": CORRECTION}
+
+    replay = LogReplay(file, log_file, control=control)
+    try:
+        assert len(replay) == len(IPOCS)
+        statistics = replay.run(5)
+        assert statistics["cycles"] == 5
+        statistics = replay.run()
+    finally:
+        replay.close()
+    assert statistics["cycles"] == len(IPOCS)
+    assert statistics["mismatched"] == 0
@@ -0,0 +1,67 @@
+import pytest
+
+from src.RSIRI.benchmark import create_config
+from src.RSIRI.codec import LxmlCodec, codecs, conformance_values
+from src.RSIRI.config import load_config
+from src.RSIRI.state import SharedState, snapshot_to_dict
+from src.RSIRI.tools import add_ipoc, remove_ipoc
+
+IPOCS = (0, 4, 123456, 2 ** 40)
+
+
+@pytest.fixture(params=(0, 6), ids=lambda n: "tech{}".format(n))
+def config(request, tmp_path):
+    return load_config(create_config(str(tmp_path), request.param))
+
+
+@pytest.mark.parametrize("name", list(codecs))
+@pytest.mark.parametrize("direction", ("send", "receive"))
+def test_codec_matches_lxml(name, direction, config):
+    # The client's messages are encoded with IPOC, the robot's as the simulator does
+    if direction == "send":
+        strings = (config.send_string, remove_ipoc(config.send_string))
+    else:
+        strings = (add_ipoc(config.receive_string), config.receive_string)
+    reference = LxmlCodec(*strings, config.precision)
+    candidate = codecs[name](*strings, config.precision)
+    for sample in conformance_values(config)[direction]:
+        for ipoc in IPOCS:
+            expected = reference.encode(sample, ipoc)
+            encoded = candidate.encode(sample, ipoc)
+            assert encoded == expected
+            assert candidate.decode(encoded) == reference.decode(expected)
+
+
+@pytest.mark.parametrize("name", list(codecs))
+def test_codec_numpy_scalars(name, config):
+    numpy = pytest.importorskip("numpy")
+    codec = codecs[name](config.send_string, remove_ipoc(config.send_string), config.precision)
+    sample = conformance_values(config)["send"][3]
+    scalars = {tag: {a: numpy.float64(v) for a, v in value.items()} if isinstance(value, dict) else value
+               for tag, value in sample.items()}
+    encoded = codec.encode(scalars, 4)
+    assert encoded == codec.encode(sample, 4)
+    assert b"np." not in encoded
+
+
+@pytest.mark.parametrize("name", list(codecs))
+def test_codec_renderer(name, config):
+    strings = (config.send_string, remove_ipoc(config.send_string))
+    reference = LxmlCodec(*strings, config.precision)
+    send = SharedState(config.send_values)
+    try:
+        renderer = codecs[name](*strings, config.precision).renderer(send.layout)
+        for sample in conformance_values(config)["send"]:
+            send.update(sample)
+            snapshot = send.snapshot()
+            # Unchanged snapshots are rendered again with the next IPOC
+            for ipoc in IPOCS:
+                expected = reference.encode(snapshot_to_dict(send.layout, snapshot), ipoc)
+                assert renderer.render(snapshot, ipoc) == expected
+        # 0.0 equals -0.0 but is written differently
+        for x in (0.0, -0.0, 0.0):
+            send["RKorr"] = {"X": x}
+            snapshot = send.snapshot()
+            assert renderer.render(snapshot, 4) == reference.encode(snapshot_to_dict(send.layout, snapshot), 4)
+    finally:
+        send.close(unlink=True)
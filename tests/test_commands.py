@@ -0,0 +1,99 @@
+from time import perf_counter
+
+import pytest
+
+from src.RSIRI.base_client import BaseRSIClient
+from src.RSIRI.benchmark import create_config
+from src.RSIRI.commands import CommandBuffer
+from src.RSIRI.trajectory import create_slot_indices
+
+
+@pytest.fixture
+def commands(states):
+    send, _ = states
+    commands = CommandBuffer(send.layout, capacity=8)
+    yield commands
+    commands.close(unlink=True)
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = BaseRSIClient(create_config(str(tmp_path)))
+    yield client
+    client.close()
+
+
+def rkorr(send, snapshot):
+    return [snapshot[slot] for slot in create_slot_indices(send.layout)["RKorr"]]
+
+
+def test_batch_sent_once(commands, states):
+    send, _ = states
+    send["RKorr"] = {"Z": 0.5}
+    assert commands.push("RKorr", {"X": 1.0, "Y": 2.0}) == 2
+    assert rkorr(send, commands.apply(send.snapshot(), 4)) == [1.0, 2.0, 0.5, 0.0, 0.0, 0.0]
+    # The following telegrams send the send values again
+    assert rkorr(send, commands.apply(send.snapshot(), 8)) == [0.0, 0.0, 0.5, 0.0, 0.0, 0.0]
+    assert commands.progress()["queued"] == 0
+
+
+def test_target_ipoc(commands, states):
+    send, _ = states
+    commands.push("RKorr", {"X": 1.0}, ipoc=12)
+    commands.push("RKorr", {"Y": 2.0})
+    # A command with a later target holds back the ones queued after it
+    assert rkorr(send, commands.apply(send.snapshot(), 8)) == [0.0] * 6
+    assert rkorr(send, commands.apply(send.snapshot(), 12)) == [1.0, 2.0, 0.0, 0.0, 0.0, 0.0]
+    assert commands.progress()["last_ipoc"] == 12
+
+
+def test_full_ring_times_out(commands):
+    for n in range(8):
+        commands.push("RKorr", {"X": float(n)})
+    start = perf_counter()
+    with pytest.raises(TimeoutError):
+        commands.push("RKorr", {"X": 8.0}, timeout=0.05)
+    assert perf_counter() - start < 1
+    progress = commands.progress()
+    assert progress["written"] == 8 and progress["waits"] == 1
+
+
+def test_unknown_attribute(commands):
+    with pytest.raises(KeyError):
+        commands.push("RKorr", {"Q": 1.0})
+    assert commands.progress()["written"] == 0
+
+
+def test_setters_latch(client):
+    assert client.set_axis("X", 0.1) == "OK"
+    assert client.set_joint("A2", -0.5) == "OK"
+    assert client.set_values("RKorr", {"Y": 0.2, "Z": 0.3}) == "OK"
+    assert client.send["RKorr"] == {"X": 0.1, "Y": 0.2, "Z": 0.3, "A": 0.0, "B": 0.0, "C": 0.0}
+    assert client.send["AKorr"]["A2"] == -0.5
+    # Every telegram sends the set values until they are changed
+    for ipoc in (4, 8, 12):
+        assert rkorr(client.send, client.commands.apply(client.send.snapshot(), ipoc))[:3] == [0.1, 0.2, 0.3]
+    client.set_axis("X", 0)
+    assert client.send["RKorr"]["X"] == 0.0
+    assert client.set_axis("Q", 1.0) == "RKorr is not present in config file"
+
+
+def test_setters_without_rsi_process(client):
+    # Nothing drains the command ring before start, the latched setters do not use it
+    for n in range(1100):
+        client.set_axis("X", n * 0.001)
+    assert client.send["RKorr"]["X"] == pytest.approx(1.099)
+    assert client.command_progress()["written"] == 0
+
+
+def test_send_once(client):
+    assert client.send_once("RKorr", {"X": 0.5}) == "OK"
+    assert rkorr(client.send, client.commands.apply(client.send.snapshot(), 4))[0] == 0.5
+    assert rkorr(client.send, client.commands.apply(client.send.snapshot(), 8))[0] == 0.0
+    assert client.send_once("RKorr", {"Q": 1.0}) == "RKorr is not present in config file"
+
+
+def test_send_once_full_ring(client):
+    for _ in range(client.commands.capacity):
+        assert client.send_once("RKorr", {"X": 0.5}) == "OK"
+    assert "Command ring is full" in client.send_once("RKorr", {"X": 0.5})
@@ -0,0 +1,48 @@
+import os
+
+from src.RSIRI.benchmark import create_config
+from src.RSIRI.client import RSIClient
+from src.RSIRI.log import LogBuffer, log_process, open_log, session_log_file
+
+
+def test_session_log_names(tmp_path):
+    names = []
+    for _ in range(3):
+        name, log_file = session_log_file(str(tmp_path))
+        log_file.close()
+        names.append(os.path.basename(name))
+    assert names == ["log.npy", "log_1.npy", "log_2.npy"]
+
+
+def test_log_process_keeps_earlier_sessions(states, tmp_path):
+    send, receive = states
+    log = LogBuffer(send.layout, receive.layout)
+    try:
+        files = []
+        for records in (3, 5):
+            for ipoc in range(records):
+                receive["IPOC"] = 4 * (ipoc + 1)
+                log.write(send.snapshot(), receive.snapshot())
+            status = {"State": False}
+            log_process(log, status, str(tmp_path), 0)
+            assert status["Logging"] == "Logging complete"
+            files.append(status["Log file"])
+    finally:
+        log.close(unlink=True)
+    assert [os.path.basename(name) for name in files] == ["log.npy", "log_1.npy"]
+    assert [len(open_log(name)["IPOC"]) for name in files] == [3, 5]
+
+
+def test_client_restart_logs_to_new_file(tmp_path):
+    client = RSIClient(create_config(str(tmp_path), port=49450))
+    client.configure_watchdog(timeout=0.01)
+    client.set_log_location(str(tmp_path))
+    client.enable_logging()
+    try:
+        for _ in range(2):
+            client.start()
+            client.stop(timeout=2)
+    finally:
+        client.close()
+        client.manager.shutdown()
+    assert sorted(name for name in os.listdir(str(tmp_path)) if name.endswith(".npy")) == ["log.npy", "log_1.npy"]
@@ -0,0 +1,65 @@
+import pytest
+
+from src.RSIRI.base_client import POSE_AXES
+from src.RSIRI.motion import MotionBuffer
+from src.RSIRI.trajectory import create_slot_indices
+
+TARGET = {"X": 5.0, "Y": -2.0, "Z": 0.0, "A": 0.5, "B": 0.0, "C": 0.0}
+
+
+@pytest.fixture
+def motion(states):
+    send, receive = states
+    motion = MotionBuffer(send.layout, receive.layout)
+    yield motion
+    motion.close(unlink=True)
+
+
+def run(motion, states, limit=2000):
+    """ Apply the move until it ends, returns the position of each cycle as the sum of the corrections. """
+    send, receive = states
+    slots = create_slot_indices(send.layout)["RKorr"]
+    position = [0.0] * len(slots)
+    positions = []
+    while motion.progress()["active"]:
+        assert len(positions) < limit
+        snapshot = motion.apply(send.snapshot(), receive)
+        position = [p + snapshot[slot] for p, slot in zip(position, slots)]
+        positions.append(position)
+    return positions
+
+
+@pytest.mark.parametrize("profile", ("trapezoidal", "s-curve"))
+def test_move_converges_without_overshoot(motion, states, profile):
+    motion.move("RKorr", TARGET, 0.1, profile=profile)
+    positions = run(motion, states)
+    assert motion.progress()["done"]
+    for n, axis in enumerate(POSE_AXES):
+        target = TARGET[axis]
+        assert positions[-1][n] == pytest.approx(target, abs=1e-9)
+        for position in positions:
+            # Every axis moves monotonically from 0 towards its target
+            assert min(0.0, target) - 1e-9 <= position[n] <= max(0.0, target) + 1e-9
+
+
+@pytest.mark.parametrize("profile", ("trapezoidal", "s-curve"))
+def test_move_respects_velocity(motion, states, profile):
+    motion.move("RKorr", TARGET, 0.1, profile=profile)
+    positions = run(motion, states)
+    previous = [0.0] * len(POSE_AXES)
+    for position in positions:
+        assert max(abs(p - q) for p, q in zip(position, previous)) <= 0.1 + 1e-9
+        previous = position
+
+
+@pytest.mark.parametrize("limits, profile", [((0.1, None, None), "linear"), ((0.0, None, None), "trapezoidal"),
+                                             ((0.1, -1.0, None), "trapezoidal"), ((0.1, None, 0.0), "s-curve")])
+def test_invalid_move_keeps_moves_working(motion, states, limits, profile):
+    with pytest.raises(ValueError):
+        motion.move("RKorr", TARGET, *limits, profile=profile)
+    assert not motion.progress()["active"]
+    # A rejected move must not leave the command half written
+    motion.move("RKorr", TARGET, 0.1)
+    positions = run(motion, states)
+    assert motion.progress()["done"]
+    assert positions[-1][0] == pytest.approx(TARGET["X"], abs=1e-9)
@@ -0,0 +1,104 @@
+import threading
+from socket import socket, AF_INET, SOCK_DGRAM
+from time import sleep
+
+import pytest
+
+from src.RSIRI.benchmark import create_config
+from src.RSIRI.client import RSIClient
+from src.RSIRI.echo_server import RSIEchoServer
+from src.RSIRI.multi_client import RSIMultiClient
+from src.RSIRI.multi_server import MultiRSIServer
+
+PORTS = (49420, 49430)
+CYCLES = 20
+
+
+@pytest.fixture
+def files(tmp_path):
+    files = []
+    for n, port in enumerate(PORTS):
+        location = tmp_path / str(n)
+        location.mkdir()
+        files.append(create_config(str(location), n, port))
+    return files
+
+
+@pytest.fixture
+def echoes(files):
+    echoes = [RSIEchoServer(file, 4) for file in files]
+    for echo in echoes:
+        echo.network.udp_socket.settimeout(2)
+    yield echoes
+    for echo in echoes:
+        echo.network.close()
+
+
+def wait_for_server(port, timeout=5.0):
+    """ Wait until an RSI process bound port. """
+    for _ in range(int(timeout / 0.05)):
+        with socket(AF_INET, SOCK_DGRAM) as probe:
+            try:
+                probe.bind(("", port))
+            except OSError:
+                return
+        sleep(0.05)
+    raise TimeoutError("No RSI server on port {}".format(port))
+
+
+def exchange(echoes, cycles=CYCLES):
+    for _ in range(cycles):
+        for echo in echoes:
+            assert echo.exchange()
+
+
+def check_robots(echoes):
+    # Every reply echoed the IPOC of its telegram, the next telegram advanced by the cycle rate
+    for echo in echoes:
+        assert echo.ipoc == 4 * CYCLES
+    # Values set for one robot are only sent to that robot
+    assert echoes[0].receive_values["RKorr"]["X"] == 0.5
+    assert echoes[1].receive_values["RKorr"]["X"] == 0.0
+    assert echoes[1].receive_values["AKorr"]["A2"] == -1.25
+    assert echoes[0].receive_values["AKorr"]["A2"] == 0.0
+
+
+def test_multi_server(files, echoes):
+    status = {"State": True}
+    robots = [RSIClient(file, status=status) for file in files]
+    server = MultiRSIServer([robot.session for robot in robots], status)
+    thread = threading.Thread(target=server.run, args=(0.05,))
+    thread.start()
+    try:
+        robots[0].send["RKorr"] = {"X": 0.5}
+        robots[1].send["AKorr"] = {"A2": -1.25}
+        exchange(echoes)
+        check_robots(echoes)
+        assert [robot.timing.statistics()["last_ipoc"] for robot in robots] == [4 * (CYCLES - 1)] * 2
+        assert echoes[0].receive_string != echoes[1].receive_string
+    finally:
+        status["State"] = False
+        thread.join(5)
+        for robot in robots:
+            robot.close()
+    assert not thread.is_alive()
+
+
+def test_multi_client(files, echoes):
+    client = RSIMultiClient(files, processes=2, cpus={0})
+    try:
+        client[0].send["RKorr"] = {"X": 0.5}
+        client[1].send["AKorr"] = {"A2": -1.25}
+        client.start()
+        for port in PORTS:
+            wait_for_server(port)
+        exchange(echoes)
+        check_robots(echoes)
+        statistics = client.cycle_statistics()
+        assert sorted(statistics) == sorted(PORTS)
+        assert all(statistics[port]["cycles"] == CYCLES for port in PORTS)
+        # A set of CPUs is spread over the processes
+        assert all("CPUs" in client.status["Realtime {}".format(n)] for n in range(2))
+    finally:
+        client.stop(timeout=2)
+        client.close()
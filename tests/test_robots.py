@@ -0,0 +1,45 @@
+from math import pi
+
+import numpy as np
+import pytest
+
+from src.RSIRI.robots import fk_batch
+
+IDENTITY = [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+# Rotations by 90 degrees about the joint axes -Z, Y and -X
+ROT_MINUS_Z = [[0, 1, 0], [-1, 0, 0], [0, 0, 1]]
+ROT_Y = [[0, 0, 1], [0, 1, 0], [-1, 0, 0]]
+ROT_MINUS_X = [[1, 0, 0], [0, 0, 1], [0, -1, 0]]
+
+# Tool pose of q = 0 and of each joint at 90 degrees, the other joints at 0, summed by hand from the link origins
+POSES = [
+    (None, (0.98, 0, 0.435), IDENTITY),
+    (0, (0, -0.98, 0.435), ROT_MINUS_Z),
+    (1, (0.06, 0, -0.555), ROT_Y),
+    (2, (0.515, 0, -0.1), ROT_Y),
+    (3, (0.98, 0, 0.435), ROT_MINUS_X),
+    (4, (0.9, 0, 0.355), ROT_Y),
+    (5, (0.98, 0, 0.435), ROT_MINUS_X),
+]
+
+
+@pytest.mark.parametrize("joint, position, rotation", POSES)
+def test_fk_batch_poses(joint, position, rotation):
+    q = [0.0] * 6
+    if joint is not None:
+        q[joint] = pi / 2
+    matrix = fk_batch([q])[0]
+    assert np.allclose(matrix[:3, 3], position)
+    assert np.allclose(matrix[:3, :3], rotation)
+    assert np.allclose(matrix[3], (0, 0, 0, 1))
+
+
+def test_fk_batch_rows():
+    q = np.zeros((len(POSES), 6))
+    for n, (joint, _, _) in enumerate(POSES):
+        if joint is not None:
+            q[n, joint] = pi / 2
+    matrices = fk_batch(q)
+    assert matrices.shape == (len(POSES), 4, 4)
+    for matrix, (_, position, _) in zip(matrices, POSES):
+        assert np.allclose(matrix[:3, 3], position)
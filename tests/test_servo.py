@@ -0,0 +1,47 @@
+from math import radians
+
+import pytest
+
+from src.RSIRI.servo import GENERATION, ServoBuffer
+from src.RSIRI.trajectory import create_slot_indices
+
+PyKDL = pytest.importorskip("PyKDL")
+
+JOINTS = {"A1": 10.0, "A2": -80.0, "A3": 90.0, "A4": 10.0, "A5": 30.0, "A6": 5.0}
+
+
+@pytest.fixture
+def servo(states):
+    send, receive = states
+    receive["AIPos"] = JOINTS
+    servo = ServoBuffer(send.layout, receive.layout)
+    yield servo
+    servo.close(unlink=True)
+
+
+def test_unknown_mode_keeps_servo_working(servo):
+    with pytest.raises(ValueError):
+        servo.write("velocity", [0.0] * 6)
+    assert servo.values[GENERATION] % 2 == 0
+    servo.write("twist", [0.0] * 6)
+    assert servo.values[GENERATION] % 2 == 0
+    assert servo.progress()["active"]
+
+
+@pytest.mark.parametrize("axis, rotation", [(3, 2), (4, 1), (5, 0)])
+def test_twist_rotations_about_z_y_x(servo, states, axis, rotation):
+    from src.RSIRI.robots import fk, jntarray
+
+    send, receive = states
+    target = [0.0] * 6
+    target[axis] = 0.05
+    servo.write("twist", target, angular=1.0, joint=1.0)
+    snapshot = servo.apply(send.snapshot(), receive)
+    step = [snapshot[slot] for slot in create_slot_indices(send.layout)["AKorr"]]
+    start = [radians(q) for q in JOINTS.values()]
+    moved = [q + radians(s) for q, s in zip(start, step)]
+    turned = PyKDL.diff(fk(jntarray(start)), fk(jntarray(moved))).rot
+    # A is a rotation about Z, B about Y and C about X
+    expected = [0.0, 0.0, 0.0]
+    expected[rotation] = radians(0.05)
+    assert [turned[i] for i in range(3)] == pytest.approx(expected, abs=1e-5)
@@ -0,0 +1,45 @@
+import threading
+from math import radians
+
+import pytest
+
+from src.RSIRI.benchmark import create_config
+from src.RSIRI.client import RSIClient
+from src.RSIRI.multi_server import MultiRSIServer
+from src.RSIRI.robots import fk_batch
+from src.RSIRI.simulator import RSISimulator, matrix_to_pose
+
+PORT = 49440
+JOINTS = (10.0, -20.0, 30.0, 5.0, 45.0, -15.0)
+
+
+@pytest.fixture
+def client(tmp_path):
+    status = {"State": True}
+    client = RSIClient(create_config(str(tmp_path), port=PORT), status=status)
+    server = MultiRSIServer([client.session], status)
+    thread = threading.Thread(target=server.run, args=(0.05,))
+    thread.start()
+    yield client
+    status["State"] = False
+    thread.join(5)
+    client.close()
+
+
+def test_matrix_to_pose_floats():
+    pose = matrix_to_pose(fk_batch([[radians(q) for q in JOINTS]])[0])
+    assert all(type(value) is float for value in pose)
+
+
+def test_client_receives_simulated_robot(client):
+    simulator = RSISimulator(client.config, speed=0, joints=JOINTS)
+    try:
+        statistics = simulator.run(20)
+    finally:
+        simulator.network.close()
+    assert statistics["cycles"] == 20
+    expected = matrix_to_pose(fk_batch([[radians(q) for q in JOINTS]])[0])
+    assert list(client.receive["AIPos"].values()) == pytest.approx(JOINTS)
+    assert list(client.receive["RIst"].values()) == pytest.approx(expected)
+    # The pose of these joints is away from the origin, a zero RIst means it was not decoded
+    assert abs(client.receive["RIst"]["X"]) > 100
@@ -0,0 +1,86 @@
+import threading
+from multiprocessing import Process
+from time import sleep
+
+import pytest
+
+from src.RSIRI.state import sequence_struct
+from src.RSIRI.trajectory import create_slot_indices
+
+AXES = ("X", "Y", "Z", "A", "B", "C")
+WRITES = 20000
+
+
+def sequence(state):
+    return sequence_struct.unpack_from(state.buffer, 0)[0]
+
+
+def write_rows(send, count):
+    for n in range(count):
+        send["RKorr"] = {a: float(n) for a in AXES}
+
+
+def test_values(states):
+    send, _ = states
+    send["RKorr"] = {"X": 0.5, "C": -1.25}
+    send["EStr"] = "Grüße"
+    send.update({"IPOC": 123456, "AKorr": {"A2": 2.0}, "Unknown": 1, "RKorr": {"Y": 3.0, "Q": 4.0}})
+    assert send["RKorr"] == {"X": 0.5, "Y": 3.0, "Z": 0.0, "A": 0.0, "B": 0.0, "C": -1.25}
+    assert send["AKorr"]["A2"] == 2.0
+    assert send["EStr"] == "Grüße"
+    assert send["IPOC"] == 123456
+    assert send.copy()["RKorr"] == send["RKorr"]
+
+
+def test_sequence_even_after_writes(states):
+    send, _ = states
+    start = sequence(send)
+    assert start % 2 == 0
+    send["RKorr"] = {"X": 1.0}
+    send.update({"AKorr": {"A1": 1.0}})
+    assert sequence(send) == start + 4
+
+
+def test_failed_write_keeps_sequence_even(states):
+    send, _ = states
+    start = sequence(send)
+    with pytest.raises(KeyError):
+        send["RKorr"] = {"Q": 1.0}
+    # Unknown attributes are rejected before the sequence is touched
+    assert sequence(send) == start
+    with pytest.raises(AttributeError):
+        send.update({"RKorr": 1.0})
+    assert sequence(send) % 2 == 0
+    assert send["RKorr"]["X"] == 0.0
+
+
+def test_reader_waits_for_writer(states):
+    send, _ = states
+    start = sequence(send)
+    # A writer in the middle of its write leaves the sequence odd
+    sequence_struct.pack_into(send.buffer, 0, start | 1)
+    result = []
+    reader = threading.Thread(target=lambda: result.append(send["RKorr"]["X"]))
+    reader.start()
+    sleep(0.05)
+    assert reader.is_alive()
+    send["RKorr"] = {"X": 2.0}
+    reader.join(1)
+    assert result == [2.0]
+    assert sequence(send) % 2 == 0
+
+
+def test_snapshots_do_not_tear(states):
+    send, _ = states
+    slots = create_slot_indices(send.layout)["RKorr"]
+    writer = Process(target=write_rows, args=(send, WRITES))
+    writer.start()
+    reads = 0
+    while writer.is_alive() or reads == 0:
+        values = send["RKorr"]
+        assert len(set(values.values())) == 1
+        data = send.snapshot()
+        assert len({data[slot] for slot in slots}) == 1
+        reads += 1
+    writer.join()
+    assert send["RKorr"]["X"] == WRITES - 1
@@ -0,0 +1,89 @@
+import pytest
+
+from src.RSIRI.trajectory import TrajectoryBuffer, create_slot_indices
+
+ROWS = [[float(n), 0.0, 0.0, 0.0, 0.0, -float(n)] for n in range(1, 6)]
+
+
+@pytest.fixture
+def trajectory(states):
+    send, _ = states
+    trajectory = TrajectoryBuffer(send.layout, capacity=16)
+    yield trajectory
+    trajectory.close(unlink=True)
+
+
+def apply(trajectory, states, cycles):
+    """ RKorr of the next cycles, IPOC advancing by 4 ms. """
+    send, _ = states
+    slots = create_slot_indices(send.layout)["RKorr"]
+    result = []
+    for _ in range(cycles):
+        ipoc = 4 * (trajectory.progress()["applied"] + 1)
+        snapshot = trajectory.apply(send.snapshot(), ipoc)
+        result.append([snapshot[slot] for slot in slots])
+    return result
+
+
+def test_one_row_per_cycle_then_done(trajectory, states):
+    send, _ = states
+    send["RKorr"] = {"X": 0.25}
+    assert trajectory.push("RKorr", ROWS) == len(ROWS)
+    assert apply(trajectory, states, len(ROWS)) == ROWS
+    progress = trajectory.progress()
+    assert progress["queued"] == 0 and progress["active"]
+    # The drained trajectory ends, the send values are used again
+    assert apply(trajectory, states, 3) == [[0.25, 0.0, 0.0, 0.0, 0.0, 0.0]] * 3
+    progress = trajectory.progress()
+    assert progress["done"] and not progress["active"]
+    assert progress["underruns"] == 0
+    assert progress["last_ipoc"] == 4 * len(ROWS)
+
+
+@pytest.mark.parametrize("policy", ("hold", "zero"))
+def test_underrun_before_end(trajectory, states, policy):
+    trajectory.push("RKorr", ROWS[:2], end=False, policy=policy)
+    result = apply(trajectory, states, 4)
+    expected = ROWS[1] if policy == "hold" else [0.0] * 6
+    assert result == ROWS[:2] + [expected] * 2
+    assert trajectory.progress()["underruns"] == 2
+    # Ending the trajectory later sends the remaining rows, then it is done without more underruns
+    trajectory.push("RKorr", ROWS[2:3])
+    assert apply(trajectory, states, 2) == [ROWS[2], [0.0] * 6]
+    progress = trajectory.progress()
+    assert progress["done"] and progress["underruns"] == 2
+
+
+def test_restart_after_done(trajectory, states):
+    trajectory.push("RKorr", ROWS[:1])
+    apply(trajectory, states, 2)
+    assert trajectory.progress()["done"]
+    trajectory.push("RKorr", ROWS[1:3])
+    assert not trajectory.progress()["done"]
+    assert apply(trajectory, states, 3) == ROWS[1:3] + [[0.0] * 6]
+    assert trajectory.progress()["done"]
+
+
+def test_queue_wraps_around(trajectory, states):
+    rows = [[float(n)] + [0.0] * 5 for n in range(40)]
+    sent = []
+    for start in range(0, len(rows), 10):
+        trajectory.push("RKorr", rows[start:start + 10], end=start + 10 >= len(rows))
+        sent += apply(trajectory, states, 10)
+    assert sent == rows
+    apply(trajectory, states, 1)
+    assert trajectory.progress()["done"]
+
+
+def test_stop_discards_rows(trajectory, states):
+    trajectory.push("RKorr", ROWS)
+    apply(trajectory, states, 2)
+    trajectory.stop()
+    assert apply(trajectory, states, 1) == [[0.0] * 6]
+    progress = trajectory.progress()
+    assert progress["queued"] == 0 and not progress["active"]
+
+
+def test_row_width(trajectory):
+    with pytest.raises(ValueError):
+        trajectory.push("RKorr", [[1.0, 2.0]])
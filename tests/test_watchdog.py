@@ -0,0 +1,79 @@
+import pytest
+
+from src.RSIRI.trajectory import create_slot_indices
+from src.RSIRI.watchdog import Watchdog
+
+RAMP = 4
+
+
+@pytest.fixture
+def watchdog(states):
+    send, _ = states
+    send["RKorr"] = {"X": 1.0}
+    send["AKorr"] = {"A1": -2.0}
+    watchdog = Watchdog(send.layout, ramp=RAMP, stall=5)
+    watchdog.start()
+    yield watchdog
+    watchdog.close(unlink=True)
+
+
+def corrections(watchdog, states, cycles):
+    """ RKorr X and AKorr A1 sent in the next cycles. """
+    send, _ = states
+    slots = create_slot_indices(send.layout)
+    result = []
+    for _ in range(cycles):
+        snapshot = watchdog.apply(send.snapshot())
+        result.append((snapshot[slots["RKorr"][0]], snapshot[slots["AKorr"][0]]))
+    return result
+
+
+def test_running(watchdog, states):
+    assert corrections(watchdog, states, 3) == [(1.0, -2.0)] * 3
+    assert watchdog.status()["state"] == "running"
+
+
+def test_stop_ramps_to_zero(watchdog, states):
+    watchdog.request_stop()
+    assert corrections(watchdog, states, RAMP + 1) == [(0.75, -1.5), (0.5, -1.0), (0.25, -0.5), (0.0, 0.0), (0.0, 0.0)]
+    status = watchdog.status()
+    assert status["state"] == "stopped" and status["reason"] == "stop"
+    assert watchdog.finished
+
+
+def test_client_stall_faults_until_reset(watchdog, states):
+    # Stall detection starts with the first heartbeat
+    corrections(watchdog, states, 10)
+    assert watchdog.status()["state"] == "running"
+    watchdog.send_heartbeat()
+    # The heartbeat is seen in the first cycle, the stall starts after 5 more
+    corrections(watchdog, states, 6)
+    assert watchdog.status()["state"] == "running"
+    corrections(watchdog, states, 1)
+    assert watchdog.status()["reason"] == "client stall"
+    corrections(watchdog, states, RAMP)
+    assert watchdog.status()["state"] == "faulted"
+    assert corrections(watchdog, states, 2) == [(0.0, 0.0)] * 2
+    watchdog.reset()
+    assert corrections(watchdog, states, 1) == [(1.0, -2.0)]
+    status = watchdog.status()
+    assert status["state"] == "running" and status["stalls"] == 1
+
+
+def test_ipoc_gaps(watchdog, states):
+    for ipoc in (4, 8, 20):
+        watchdog.received(ipoc)
+    status = watchdog.status()
+    assert status["gaps"] == 1 and status["missing"] == 2 and status["state"] == "running"
+    watchdog.configure(gap=1)
+    watchdog.received(36)
+    assert watchdog.status()["reason"] == "IPOC gap"
+
+
+def test_timeout_ends_after_stop_request(watchdog):
+    watchdog.received(4)
+    assert not watchdog.timed_out()
+    watchdog.request_stop()
+    assert watchdog.timed_out()
+    status = watchdog.status()
+    assert status["state"] == "stopped" and status["timeouts"] == 1